@@ -3,6 +3,8 @@ from flask_login import LoginManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from models import db, User
+from models.database import engine_options, apply_sqlite_pragmas
+from config.database import resolve_database_url
 import os
 import logging
 from logging.handlers import RotatingFileHandler
@@ -11,19 +13,41 @@ from datetime import datetime
 def create_app(config_name='default'):
     """Factory Pattern per creare l'applicazione Flask"""
     
-    app = Flask(__name__)
+    app = Flask(__name__, instance_relative_config=True)
     
     # Configurazione
     app.config['SECRET_KEY'] = 'dev-key-12345-not-for-production'  # Hardcoded per preview
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///appointments.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['WTF_CSRF_ENABLED'] = True
     app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'uploads')
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['BACKUP_DIR'] = os.getenv('BACKUP_DIR', 'backups')
+    
+    # Configurazione di istanza opzionale (instance/config.py), ha la precedenza sui valori sopra
+    app.config.from_pyfile('config.py', silent=True)
+    
+    # Database: DATABASE_URL, poi instance/config.py, poi SQLite locale (in memoria per 'testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = resolve_database_url(config_name, app.config.get('SQLALCHEMY_DATABASE_URI'))
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    
+    # Cache statistiche: 'memory' (singolo processo), 'sqlite' (condivisa tra worker) o 'null'
+    app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'memory')
+    app.config['CACHE_DEFAULT_TTL'] = int(os.getenv('CACHE_DEFAULT_TTL', 60))
+    
+    # Rate limiting condiviso tra i worker in produzione (es. redis://localhost:6379/1)
+    app.config['RATELIMIT_STORAGE_URI'] = os.getenv('RATELIMIT_STORAGE_URI', 'memory://')
+    app.config['RATELIMIT_ENABLED'] = os.getenv('RATELIMIT_ENABLED', '1') != '0'
     
     # Inizializza estensioni
     db.init_app(app)
     
+    # WAL, busy_timeout, synchronous=NORMAL e mmap su ogni connessione SQLite
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, app.config.get('SQLITE_PRAGMAS'))
+    
+    from utils.cache import init_cache
+    init_cache(app)
+    
     # Login Manager
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -105,13 +129,31 @@ def create_app(config_name='default'):
     from routes.api import bp as api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
-    from routes.ai import bp as ai_bp
+    from routes.ai import bp as ai_bp, ai_service
     app.register_blueprint(ai_bp, url_prefix='/ai')
     
+    # Modelli AI caricati subito in background con AI_PRELOAD=1 (altrimenti al primo utilizzo).
+    # Sotto gunicorn il caricamento avviene nei worker (post_fork in gunicorn.conf.py), non nel master
+    served_by_gunicorn = 'gunicorn' in os.getenv('SERVER_SOFTWARE', '')
+    if os.getenv('AI_PRELOAD', '0') == '1' and ai_service and not served_by_gunicorn:
+        ai_service.warmup()
+    
     # Inizializza database
     with app.app_context():
         db.create_all()
         
+        # Indici full-text clienti e ricerca globale (solo SQLite con FTS5)
+        from models.search import ensure_search_indexes
+        ensure_search_indexes()
+        
+        # Aggregato giornaliero per i report (popolato al primo avvio)
+        from models.daily_stats import ensure_daily_stats
+        ensure_daily_stats()
+        
+        # Contatori di versione per gli ETag delle API
+        from models.table_version import ensure_table_versions
+        ensure_table_versions()
+        
         # Crea utente admin se non esiste
         admin_user = User.query.filter_by(username='admin').first()
         if not admin_user:
@@ -137,17 +179,11 @@ if __name__ == '__main__':
     # Socket.IO per funzionalità real-time (se necessario)
     try:
         from flask_socketio import SocketIO
-        socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
-        
-        @socketio.on('connect')
-        def handle_connect():
-            """Gestisce connessione Socket.IO"""
-            pass
+        socketio = SocketIO(app, cors_allowed_origins="*", async_mode=os.getenv('SOCKETIO_ASYNC_MODE'),
+                            message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE'))
         
-        @socketio.on('disconnect')
-        def handle_disconnect():
-            """Gestisce disconnessione Socket.IO"""
-            pass
+        from services.realtime_service import RealtimeService
+        RealtimeService.init_socketio(socketio)
         
         if __name__ == '__main__':
             socketio.run(app, debug=True, host='0.0.0.0', port=5000)
@@ -3,43 +3,22 @@
 
 import os
 import logging
+import importlib.util
 
 logger = logging.getLogger(__name__)
 
+def _module_available(name: str) -> bool:
+    """True se il modulo è installato, senza importarlo (l'import avviene al caricamento dei modelli)"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
 # Flag per moduli disponibili
-SPEECH_RECOGNITION_AVAILABLE = False
-TEXT_TO_SPEECH_AVAILABLE = False
-OLLAMA_AVAILABLE = False
-REQUESTS_AVAILABLE = False
-
-# Test disponibilità moduli
-try:
-    import speech_recognition as sr
-    SPEECH_RECOGNITION_AVAILABLE = True
-    print("✅ Speech Recognition disponibile")
-except ImportError:
-    print("⚠️ Speech Recognition non disponibile - funzionalità vocali disabilitate")
-
-try:
-    import pyttsx3
-    TEXT_TO_SPEECH_AVAILABLE = True
-    print("✅ Text-to-Speech disponibile")
-except ImportError:
-    print("⚠️ Text-to-Speech non disponibile - sintesi vocale disabilitata")
-
-try:
-    import ollama
-    OLLAMA_AVAILABLE = True
-    print("✅ Ollama client disponibile")
-except ImportError:
-    print("⚠️ Ollama client non disponibile - AI locale disabilitata")
-
-try:
-    import requests
-    REQUESTS_AVAILABLE = True
-    print("✅ Requests disponibile per API calls")
-except ImportError:
-    print("⚠️ Requests non disponibile - API calls disabilitate")
+SPEECH_RECOGNITION_AVAILABLE = _module_available('speech_recognition')
+TEXT_TO_SPEECH_AVAILABLE = _module_available('pyttsx3')
+OLLAMA_AVAILABLE = _module_available('ollama')
+REQUESTS_AVAILABLE = _module_available('requests')
 
 # Configurazione Ollama
 OLLAMA_CONFIG = {
@@ -48,6 +27,7 @@ OLLAMA_CONFIG = {
     'timeout': int(os.getenv('OLLAMA_TIMEOUT', '120')),  # 2 minuti
     'max_tokens': int(os.getenv('OLLAMA_MAX_TOKENS', '2048')),
     'temperature': float(os.getenv('OLLAMA_TEMPERATURE', '0.7')),
+    'keep_alive': os.getenv('OLLAMA_KEEP_ALIVE', '30m'),  # permanenza del modello in memoria
     'stream': True
 }
 
@@ -81,6 +61,10 @@ FALLBACK_RESPONSES = {
         'Problema temporaneo rilevato. Riprovo con un approccio diverso.',
         'Errore nell\'elaborazione. Tentativo di correzione automatica in corso...'
     ],
+    'loading': [
+        'L\'assistente IA si sta avviando: riprova tra qualche istante.',
+        'Sto caricando il modello IA, tra pochi secondi potrò risponderti.'
+    ],
     'unknown': [
         'Non ho compreso completamente. Puoi riformulare la richiesta?',
         'Potresti essere più specifico? Non sono sicuro di cosa intendi.',
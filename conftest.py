@@ -0,0 +1,61 @@
+"""
+Fixture condivise dei test: applicazione Flask minima con database SQLite
+"""
+
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.database import engine_options
+from models.user import db
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Crea l'applicazione minima con il contesto applicativo attivo per tutto il test
+
+    - file_db: SQLite su un file temporaneo invece che in memoria (letture da altri thread o connessioni)
+    - uri: database esplicito (es. il PostgreSQL di prova), prevale su file_db
+    - search: indici full-text FTS5 (test saltato se SQLite ne è privo)
+    - table_versions: tabella delle versioni per tabella
+    - config: altre chiavi di configurazione dell'applicazione
+    """
+    contexts = []
+
+    def factory(file_db=False, uri=None, search=False, table_versions=False, **config):
+        from models.search import ensure_search_indexes
+        from models.table_version import ensure_table_versions
+
+        uri = uri or (f"sqlite:///{tmp_path / 'crm.db'}" if file_db else 'sqlite://')
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = uri
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri)
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        app.config.update(config)
+        db.init_app(app)
+
+        context = app.app_context()
+        context.push()
+        contexts.append(context)
+
+        db.create_all()
+        if table_versions:
+            ensure_table_versions()
+        if search and not ensure_search_indexes():
+            pytest.skip('SQLite senza FTS5')
+        return app
+
+    yield factory
+
+    for context in reversed(contexts):
+        db.session.remove()
+        db.drop_all()
+        context.pop()
+
+@pytest.fixture
+def app(make_app):
+    """Applicazione minima con database SQLite in memoria"""
+    return make_app()
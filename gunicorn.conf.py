@@ -0,0 +1,77 @@
+"""
+Configurazione gunicorn per la produzione
+
+Avvio: python run.py --production [--workers N] [--threads N]
+oppure: gunicorn -c gunicorn.conf.py run:app
+
+Le scelte che dipendono dal profilo (modalità Socket.IO, worker unico senza coda Socket.IO, cache
+condivisa) sono fatte qui e passate all'app tramite variabili d'ambiente: valgono per entrambi gli
+avvii perché l'app viene creata nei worker, dopo la lettura di questo file.
+
+Obiettivo di throughput (verificato con loadtest.py): vedi la sezione Produzione del README.
+"""
+
+import importlib.util
+import multiprocessing
+import os
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+
+# Processi: 2 × CPU + 1, al massimo 8 (con SQLite le scritture restano serializzate)
+workers = int(os.getenv('WEB_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+
+# Thread per processo: le richieste attendono soprattutto il database.
+# Il worker segue SOCKETIO_ASYNC_MODE (eventlet/gevent), altrimenti gthread con Socket.IO in modalità threading
+worker_class = os.getenv('WEB_WORKER_CLASS') or {'eventlet': 'eventlet', 'gevent': 'gevent'}.get(
+    os.getenv('SOCKETIO_ASYNC_MODE'), 'gthread')
+threads = int(os.getenv('WEB_THREADS', 4))
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', {'eventlet': 'eventlet', 'gevent': 'gevent'}.get(worker_class, 'threading'))
+
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Riciclo periodico dei worker contro la crescita della memoria (modelli AI, cache)
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = os.getenv('WEB_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+
+_profile_warnings = []
+
+# Socket.IO con più processi: gli eventi devono passare da una coda condivisa (e il proxy usare sessioni sticky)
+_socketio_enabled = (os.getenv('SOCKETIO_ENABLED', '1') != '0'
+                     and importlib.util.find_spec('flask_socketio') is not None)
+if _socketio_enabled and workers > 1 and not os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+    _profile_warnings.append('Socket.IO con più worker richiede SOCKETIO_MESSAGE_QUEUE '
+                             '(o SOCKETIO_ENABLED=0): uso 1 worker')
+    workers = 1
+
+# Cache statistiche condivisa: l'invalidazione al commit deve raggiungere tutti i worker
+if workers > 1:
+    os.environ.setdefault('CACHE_BACKEND', 'sqlite')
+
+def on_starting(server):
+    """Riepilogo del profilo di produzione all'avvio del master"""
+    for warning in _profile_warnings:
+        server.log.warning(warning)
+
+    socketio_mode = os.environ['SOCKETIO_ASYNC_MODE'] if _socketio_enabled else 'disattivato'
+    server.log.info(f"Produzione: {server.cfg.workers} worker {server.cfg.worker_class_str} × {server.cfg.threads} thread, "
+                    f"Socket.IO {socketio_mode}, cache {os.getenv('CACHE_BACKEND', 'memory')}")
+
+def post_fork(server, worker):
+    """Connessioni al database nuove per ogni worker (non condivise con il master dopo il fork)"""
+    from models.user import db
+
+    flask_app = worker.app.wsgi()
+    with flask_app.app_context():
+        db.engine.dispose(close=False)
+
+    # Modelli AI caricati in ogni worker (create_app non li carica sotto gunicorn, per non farlo nel master)
+    if os.getenv('AI_PRELOAD', '0') == '1':
+        from routes.ai import ai_service
+        if ai_service:
+            ai_service.warmup()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Load test delle API in lettura (dashboard, appuntamenti, consulenti, ricerca)
+
+Uso:
+    RATELIMIT_ENABLED=0 SOCKETIO_ENABLED=0 python run.py --production --workers 4 --threads 4
+    python loadtest.py --url http://127.0.0.1:5000 --concurrency 32 --duration 30
+
+Esce con codice 1 se l'obiettivo (--target-rps, --target-p95) non viene raggiunto.
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Obiettivo documentato nel README (4 worker gthread × 4 thread, SQLite WAL, 4 vCPU)
+TARGET_RPS = 300
+TARGET_P95_MS = 200
+
+# Mix di richieste (percorso, peso): simula dashboard admin/dealer e app mobile
+REQUEST_MIX = [
+    ('/api/stats/dashboard', 4),
+    ('/admin/dashboard/metrics', 3),
+    ('/api/appointments?limit=50', 4),
+    ('/api/consultants', 1),
+    ('/api/search?q=ros&limit=10', 2),
+]
+
+def login(url, username, password):
+    """Sessione autenticata tramite il form di login"""
+    session = requests.Session()
+    response = session.post(f'{url}/auth/login', data={'username': username, 'password': password},
+                            allow_redirects=False, timeout=10)
+    if response.status_code != 302 or 'session' not in session.cookies:
+        raise RuntimeError(f"Login fallito per {username} (HTTP {response.status_code})")
+    return session
+
+def run_worker(url, cookies, paths, deadline, revalidate, results, lock):
+    """Esegue richieste in sequenza fino alla scadenza, registrando (latenza ms, stato)"""
+    session = requests.Session()
+    session.cookies.update(cookies)
+    etags = {}
+    local = []
+    index = 0
+
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+
+        headers = {}
+        if revalidate and path in etags:
+            headers['If-None-Match'] = etags[path]
+
+        started = time.perf_counter()
+        try:
+            response = session.get(url + path, headers=headers, timeout=30)
+            status = response.status_code
+            if response.headers.get('ETag'):
+                etags[path] = response.headers['ETag']
+        except requests.RequestException:
+            status = 0
+        local.append(((time.perf_counter() - started) * 1000, status))
+
+    with lock:
+        results.extend(local)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test API Smart Control')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='URL base del server')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--concurrency', type=int, default=32, help='Client simultanei')
+    parser.add_argument('--duration', type=int, default=30, help='Durata in secondi')
+    parser.add_argument('--revalidate', action='store_true', help='Invia If-None-Match (client con cache)')
+    parser.add_argument('--target-rps', type=float, default=TARGET_RPS)
+    parser.add_argument('--target-p95', type=float, default=TARGET_P95_MS, help='p95 massimo in ms')
+    args = parser.parse_args()
+
+    url = args.url.rstrip('/')
+    session = login(url, args.username, args.password)
+    paths = [path for path, weight in REQUEST_MIX for _ in range(weight)]
+
+    results = []
+    lock = threading.Lock()
+    print(f"🔥 {args.concurrency} client per {args.duration}s su {url}...")
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for worker in range(args.concurrency):
+            # Ogni client parte da un punto diverso del mix
+            rotated = paths[worker % len(paths):] + paths[:worker % len(paths)]
+            executor.submit(run_worker, url, session.cookies, rotated, deadline, args.revalidate, results, lock)
+    elapsed = time.perf_counter() - started
+
+    if not results:
+        print("❌ Nessuna richiesta completata")
+        return 1
+
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, status in results if status not in (200, 304))
+    rps = len(results) / elapsed
+    p50 = statistics.median(latencies)
+    p95 = percentile(latencies, 0.95)
+    p99 = percentile(latencies, 0.99)
+
+    print(f"📊 Richieste: {len(results)} in {elapsed:.1f}s → {rps:.1f} req/s")
+    print(f"⏱️  Latenza: p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms")
+    print(f"❗ Errori (non 200/304): {errors}")
+
+    passed = rps >= args.target_rps and p95 <= args.target_p95 and errors == 0
+    if passed:
+        print(f"✅ Obiettivo raggiunto (≥ {args.target_rps:.0f} req/s, p95 ≤ {args.target_p95:.0f} ms)")
+        return 0
+
+    print(f"❌ Obiettivo non raggiunto (≥ {args.target_rps:.0f} req/s, p95 ≤ {args.target_p95:.0f} ms)")
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Script di migrazione per collegare gli appuntamenti ai clienti (client_id)
+e popolare i campi has_purchases / last_purchase_at della tabella client
+
+Telefono e nome vengono confrontati normalizzati (colonne telefono_normalizzato / nome_normalizzato),
+come fa il collegamento automatico a ogni salvataggio.
+"""
+
+import sys
+from pathlib import Path
+
+# Aggiungi il percorso root del progetto al sys.path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from models.database import db, create_missing_indexes
+from models.appointment import Appointment, OtherAppointment
+from models.client import Client, normalize_phone, normalize_name, refresh_purchase_flags
+from app import create_app
+
+BATCH_SIZE = 1000
+
+NEW_COLUMNS = [
+    ('client', 'has_purchases', 'BOOLEAN NOT NULL DEFAULT 0'),
+    ('client', 'last_purchase_at', 'DATETIME'),
+    ('appointment', 'client_id', 'INTEGER REFERENCES client (id)'),
+    ('other_appointment', 'client_id', 'INTEGER REFERENCES client (id)'),
+    ('client', 'telefono_normalizzato', 'VARCHAR(20)'),
+    ('client', 'nome_normalizzato', 'VARCHAR(100)'),
+    ('appointment', 'telefono_normalizzato', 'VARCHAR(20)'),
+    ('appointment', 'nome_normalizzato', 'VARCHAR(100)'),
+    ('other_appointment', 'telefono_normalizzato', 'VARCHAR(20)'),
+    ('other_appointment', 'nome_normalizzato', 'VARCHAR(100)'),
+]
+
+def add_missing_columns(conn):
+    """Aggiunge le colonne mancanti, ritorna quelle create"""
+    inspector = db.inspect(conn)
+    added = []
+
+    for table, column, ddl in NEW_COLUMNS:
+        columns = [col['name'] for col in inspector.get_columns(table)]
+        if column not in columns:
+            conn.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+            added.append(f'{table}.{column}')
+
+    return added
+
+def fill_match_keys(conn, table, name_column):
+    """Popola telefono_normalizzato / nome_normalizzato di tutte le righe, ritorna il numero aggiornato"""
+    rows = conn.execute(
+        db.select(table.c.id, table.c[name_column], table.c.numero_telefono,
+                  table.c.nome_normalizzato, table.c.telefono_normalizzato)
+    ).all()
+
+    updates = []
+    for row_id, nome, telefono, nome_key, telefono_key in rows:
+        keys = (normalize_name(nome) or None, normalize_phone(telefono) or None)
+        if keys != (nome_key, telefono_key):
+            updates.append({'row_id': row_id, 'nome_key': keys[0], 'telefono_key': keys[1]})
+
+    statement = (table.update()
+                 .where(table.c.id == db.bindparam('row_id'))
+                 .values(nome_normalizzato=db.bindparam('nome_key'),
+                         telefono_normalizzato=db.bindparam('telefono_key')))
+    for start in range(0, len(updates), BATCH_SIZE):
+        conn.execute(statement, updates[start:start + BATCH_SIZE])
+
+    return len(updates)
+
+def link_appointments(conn, model):
+    """Collega gli appuntamenti senza cliente per telefono normalizzato o nome, ritorna il numero collegato"""
+    by_phone = {}
+    by_name = {}
+    for client_id, nome, telefono in conn.execute(
+            db.select(Client.id, Client.nome_normalizzato, Client.telefono_normalizzato).order_by(Client.id)):
+        if telefono:
+            by_phone.setdefault(telefono, client_id)
+        if nome:
+            by_name.setdefault(nome, client_id)
+
+    table = model.__table__
+    rows = conn.execute(
+        db.select(table.c.id, table.c.nome_normalizzato, table.c.telefono_normalizzato)
+        .where(table.c.client_id.is_(None))
+    ).all()
+
+    updates = []
+    for appointment_id, nome, telefono in rows:
+        client_id = by_phone.get(telefono) or by_name.get(nome)
+        if client_id:
+            updates.append({'appointment_id': appointment_id, 'client_id': client_id})
+
+    statement = (table.update()
+                 .where(table.c.id == db.bindparam('appointment_id'))
+                 .values(client_id=db.bindparam('client_id')))
+    for start in range(0, len(updates), BATCH_SIZE):
+        conn.execute(statement, updates[start:start + BATCH_SIZE])
+
+    return len(updates)
+
+def migrate_database():
+    """Esegue la migrazione del database"""
+    app = create_app()
+
+    with app.app_context():
+        try:
+            with db.engine.begin() as conn:
+                added = add_missing_columns(conn)
+                if added:
+                    print(f"✓ Colonne aggiunte: {', '.join(added)}")
+                else:
+                    print("✓ Le colonne esistono già.")
+
+            created = create_missing_indexes()
+            if created:
+                print(f"✓ Indici creati: {', '.join(created)}")
+
+            with db.engine.begin() as conn:
+                filled = sum(fill_match_keys(conn, model.__table__, name_column) for model, name_column in
+                             ((Client, 'nome'), (Appointment, 'nome_cliente'), (OtherAppointment, 'nome_cliente')))
+                print(f"✓ Chiavi di confronto normalizzate: {filled} righe")
+
+                linked = link_appointments(conn, Appointment)
+                linked_other = link_appointments(conn, OtherAppointment)
+                print(f"✓ Appuntamenti collegati: {linked} (altri appuntamenti: {linked_other})")
+
+                client_ids = conn.execute(db.select(Client.id)).scalars().all()
+                purchases = 0
+                for start in range(0, len(client_ids), BATCH_SIZE):
+                    flags = refresh_purchase_flags(conn, client_ids[start:start + BATCH_SIZE])
+                    purchases += sum(1 for purchased_at in flags.values() if purchased_at)
+                print(f"✓ Clienti con acquisti: {purchases} su {len(client_ids)}")
+
+        except Exception as e:
+            print(f"❌ Errore durante la migrazione: {e}")
+            return False
+
+    return True
+
+if __name__ == "__main__":
+    print("=== Migrazione Database: Collegamento appuntamenti-clienti ===")
+    success = migrate_database()
+
+    if success:
+        print("\n🎉 Migrazione completata con successo!")
+        print("\nI nuovi appuntamenti vengono collegati automaticamente al cliente")
+        print("e i flag acquisti vengono aggiornati a ogni salvataggio.")
+    else:
+        print("\n❌ Migrazione fallita!")
+        sys.exit(1)
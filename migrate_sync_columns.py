@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Script di migrazione per la sincronizzazione incrementale della dashboard mobile:
+aggiunge updated_at ad appuntamenti, follow-up, clienti ed eventi e crea la tabella delle tracce
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Aggiungi il percorso root del progetto al sys.path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from models.database import db, create_missing_indexes
+from models.sync import SYNC_TABLES
+from app import create_app
+
+def add_missing_columns(conn):
+    """Aggiunge updated_at dove manca e lo valorizza con l'istante della migrazione"""
+    inspector = db.inspect(conn)
+    added = []
+    now = datetime.utcnow()
+    # DATETIME su SQLite, TIMESTAMP WITHOUT TIME ZONE su PostgreSQL
+    datetime_type = db.DateTime().compile(dialect=conn.dialect)
+
+    for table in SYNC_TABLES:
+        columns = [col['name'] for col in inspector.get_columns(table)]
+        if 'updated_at' not in columns:
+            conn.execute(db.text(f'ALTER TABLE {table} ADD COLUMN updated_at {datetime_type}'))
+            conn.execute(db.text(f'UPDATE {table} SET updated_at = :now'), {'now': now})
+            added.append(f'{table}.updated_at')
+
+    return added
+
+def migrate_database():
+    """Esegue la migrazione del database"""
+    app = create_app()
+
+    with app.app_context():
+        try:
+            with db.engine.begin() as conn:
+                added = add_missing_columns(conn)
+                if added:
+                    print(f"✓ Colonne aggiunte: {', '.join(added)}")
+                else:
+                    print("✓ Le colonne esistono già.")
+
+            # Tabella sync_tombstone
+            db.create_all()
+
+            created = create_missing_indexes()
+            if created:
+                print(f"✓ Indici creati: {', '.join(created)}")
+
+        except Exception as e:
+            print(f"❌ Errore durante la migrazione: {e}")
+            return False
+
+    return True
+
+if __name__ == "__main__":
+    print("=== Migrazione Database: Sincronizzazione mobile ===")
+    success = migrate_database()
+
+    if success:
+        print("\n🎉 Migrazione completata con successo!")
+        print("\nLa dashboard mobile può usare /dealer/api/sync?since=<token>")
+        print("per scaricare solo le modifiche dall'ultima sincronizzazione.")
+    else:
+        print("\n❌ Migrazione fallita!")
+        sys.exit(1)
@@ -8,6 +8,10 @@ from .appointment import Appointment, OtherAppointment
 from .client import Client
 from .followup import FollowUp
 from .note_event import note_event
+from .daily_stats import DailyStats
+from .job import Job
+from .table_version import TableVersion
+from .sync import SyncTombstone
 
 # Esporta tutti i modelli
 __all__ = [
@@ -20,5 +24,9 @@ __all__ = [
     'appointment_consultant',
     'Client',
     'FollowUp',
-    'note_event'
+    'note_event',
+    'DailyStats',
+    'Job',
+    'TableVersion',
+    'SyncTombstone'
 ]
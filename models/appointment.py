@@ -3,6 +3,18 @@ from .database import db, appointment_consultant
 
 class Appointment(db.Model):
     __tablename__ = 'appointment'
+    __table_args__ = (
+        db.Index('ix_appointment_data', 'data_appuntamento'),
+        db.Index('ix_appointment_stato_data', 'stato', 'data_appuntamento'),
+        db.Index('ix_appointment_venduto_data', 'venduto', 'data_appuntamento'),
+        db.Index('ix_appointment_stato_richiamo', 'stato', 'data_richiamo'),
+        db.Index('ix_appointment_nome_cliente', 'nome_cliente', 'venduto'),
+        db.Index('ix_appointment_telefono', 'numero_telefono', 'data_appuntamento'),
+        db.Index('ix_appointment_client', 'client_id', 'venduto', 'data_appuntamento'),
+        db.Index('ix_appointment_updated', 'updated_at'),
+        db.Index('ix_appointment_telefono_normalizzato', 'telefono_normalizzato'),
+        db.Index('ix_appointment_nome_normalizzato', 'nome_normalizzato'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nome_cliente = db.Column(db.String(100), nullable=False)
@@ -17,10 +29,15 @@ class Appointment(db.Model):
     venduto = db.Column(db.Boolean, default=False)
     data_appuntamento = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     data_richiamo = db.Column(db.DateTime, nullable=True)  # Data di richiamo se "da richiamare"
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=True)  # Collegato automaticamente per telefono/nome
+    telefono_normalizzato = db.Column(db.String(20), nullable=True)  # Chiavi di collegamento al cliente
+    nome_normalizzato = db.Column(db.String(100), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Sincronizzazione mobile
     
     # Relazioni
     consultants = db.relationship('Consultant', secondary=appointment_consultant, lazy='subquery',
                                   backref=db.backref('appointments', lazy=True))
+    client = db.relationship('Client', backref=db.backref('appointments', lazy='dynamic'))
 
     def __repr__(self):
         return f"<Appointment {self.nome_cliente} - {self.stato}>"
@@ -41,11 +58,20 @@ class Appointment(db.Model):
             'venduto': self.venduto,
             'data_appuntamento': self.data_appuntamento.isoformat() if self.data_appuntamento else None,
             'data_richiamo': self.data_richiamo.isoformat() if self.data_richiamo else None,
-            'consultants': [c.id for c in self.consultants]
+            'consultants': [c.id for c in self.consultants],
+            'client_id': self.client_id,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class OtherAppointment(db.Model):
     __tablename__ = 'other_appointment'
+    __table_args__ = (
+        db.Index('ix_other_appointment_data', 'data_appuntamento'),
+        db.Index('ix_other_appointment_nome_cliente', 'nome_cliente', 'venduto'),
+        db.Index('ix_other_appointment_client', 'client_id', 'venduto', 'data_appuntamento'),
+        db.Index('ix_other_appointment_telefono_normalizzato', 'telefono_normalizzato'),
+        db.Index('ix_other_appointment_nome_normalizzato', 'nome_normalizzato'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nome_cliente = db.Column(db.String(100), nullable=False)
@@ -59,6 +85,9 @@ class OtherAppointment(db.Model):
     venduto = db.Column(db.Boolean, default=False)
     data_appuntamento = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     data_richiamo = db.Column(db.DateTime, nullable=True)  # Data di richiamo se "da richiamare"
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=True)  # Collegato automaticamente per telefono/nome
+    telefono_normalizzato = db.Column(db.String(20), nullable=True)  # Chiavi di collegamento al cliente
+    nome_normalizzato = db.Column(db.String(100), nullable=True)
 
     def __repr__(self):
         return f"<OtherAppointment {self.nome_cliente} - {self.stato}>"
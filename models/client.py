@@ -1,9 +1,55 @@
 from datetime import datetime
+import re
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
 from .database import db
+from .table_version import mark_tables_written
+
+def normalize_phone(phone):
+    """Normalizza numero di telefono (formato +39 per i numeri italiani)"""
+    if not phone:
+        return ''
+
+    # Rimuovi spazi, trattini e altri caratteri
+    normalized = re.sub(r'[^\d+]', '', phone.strip())
+
+    # Gestisci prefisso italiano
+    if normalized.startswith('00393'):
+        normalized = '+39' + normalized[5:]
+    elif normalized.startswith('0039'):
+        normalized = '+39' + normalized[4:]
+    elif normalized.startswith('393'):
+        normalized = '+39' + normalized[3:]
+    elif normalized.startswith('39') and len(normalized) > 5:
+        normalized = '+39' + normalized[2:]
+    elif normalized.startswith('3') and len(normalized) == 10:
+        normalized = '+39' + normalized
+
+    return normalized
+
+def normalize_name(name):
+    """Normalizza nome cliente per il confronto (minuscolo, spazi singoli)"""
+    return ' '.join((name or '').lower().split())
+
+def set_match_keys(obj, nome, numero_telefono):
+    """Aggiorna le colonne normalizzate usate per collegare appuntamenti e clienti"""
+    keys = {'nome_normalizzato': normalize_name(nome) or None,
+            'telefono_normalizzato': normalize_phone(numero_telefono) or None}
+    for attr, value in keys.items():
+        if getattr(obj, attr) != value:
+            setattr(obj, attr, value)
 
 class Client(db.Model):
     __tablename__ = 'client'
-    
+    __table_args__ = (
+        db.Index('ix_client_numero_telefono', 'numero_telefono'),
+        db.Index('ix_client_nome', 'nome'),
+        db.Index('ix_client_has_purchases', 'has_purchases', 'nome'),
+        db.Index('ix_client_updated', 'updated_at'),
+        db.Index('ix_client_telefono_normalizzato', 'telefono_normalizzato'),
+        db.Index('ix_client_nome_normalizzato', 'nome_normalizzato'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
     indirizzo = db.Column(db.String(200), nullable=True)
@@ -12,31 +58,36 @@ class Client(db.Model):
     data_registrazione = db.Column(db.DateTime, default=datetime.utcnow)
     note = db.Column(db.Text, nullable=True)
 
+    # Denormalizzati, aggiornati a ogni scrittura di un appuntamento collegato
+    has_purchases = db.Column(db.Boolean, default=False, nullable=False)
+    last_purchase_at = db.Column(db.DateTime, nullable=True)
+
+    # Chiavi di confronto con gli appuntamenti (normalize_phone / normalize_name), aggiornate al flush
+    telefono_normalizzato = db.Column(db.String(20), nullable=True)
+    nome_normalizzato = db.Column(db.String(100), nullable=True)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Sincronizzazione mobile
+
     def __repr__(self):
         return f"<Client {self.nome}>"
-    
+
     def get_appointments(self):
         """Ottieni tutti gli appuntamenti del cliente"""
-        from .appointment import Appointment, OtherAppointment
-        
-        appointments = Appointment.query.filter_by(nome_cliente=self.nome).all()
-        other_appointments = OtherAppointment.query.filter_by(nome_cliente=self.nome).all()
-        
+        from .appointment import OtherAppointment
+
+        appointments = self.appointments.all()
+        other_appointments = OtherAppointment.query.filter_by(client_id=self.id).all()
+
         return {
             'appointments': appointments,
             'other_appointments': other_appointments,
             'total': len(appointments) + len(other_appointments)
         }
-    
+
     def has_sold_appointment(self):
         """Controlla se il cliente ha almeno un appuntamento venduto"""
-        from .appointment import Appointment, OtherAppointment
-        
-        sold_regular = Appointment.query.filter_by(nome_cliente=self.nome, venduto=True).first()
-        sold_other = OtherAppointment.query.filter_by(nome_cliente=self.nome, venduto=True).first()
-        
-        return sold_regular is not None or sold_other is not None
-    
+        return bool(self.has_purchases)
+
     def to_dict(self):
         """Serializza il cliente per API JSON"""
         return {
@@ -47,5 +98,133 @@ class Client(db.Model):
             'email': self.email,
             'data_registrazione': self.data_registrazione.isoformat() if self.data_registrazione else None,
             'note': self.note,
-            'has_purchases': self.has_sold_appointment()
+            'has_purchases': self.has_sold_appointment(),
+            'last_purchase_at': self.last_purchase_at.isoformat() if self.last_purchase_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+
+def find_client_id(session, nome, numero_telefono):
+    """Id del cliente corrispondente per telefono normalizzato o, in mancanza, per nome"""
+    phone = normalize_phone(numero_telefono)
+    if phone:
+        client_id = session.query(Client.id).filter(Client.telefono_normalizzato == phone).limit(1).scalar()
+        if client_id:
+            return client_id
+
+    name = normalize_name(nome)
+    if name:
+        return session.query(Client.id).filter(Client.nome_normalizzato == name).limit(1).scalar()
+
+    return None
+
+def refresh_purchase_flags(connection, client_ids):
+    """Ricalcola has_purchases/last_purchase_at per i clienti indicati, ritorna {id: last_purchase_at}"""
+    from .appointment import Appointment, OtherAppointment
+
+    client_ids = [cid for cid in set(client_ids) if cid]
+    if not client_ids:
+        return {}
+
+    last_purchase = dict.fromkeys(client_ids)
+    for model in (Appointment, OtherAppointment):
+        rows = connection.execute(
+            db.select(model.client_id, db.func.max(model.data_appuntamento))
+            .where(model.client_id.in_(client_ids), model.venduto == True)
+            .group_by(model.client_id)
+        )
+        for client_id, purchased_at in rows:
+            if purchased_at and (last_purchase[client_id] is None or purchased_at > last_purchase[client_id]):
+                last_purchase[client_id] = purchased_at
+
+    connection.execute(
+        Client.__table__.update()
+        .where(Client.__table__.c.id == db.bindparam('client_id'))
+        .values(has_purchases=db.bindparam('has_purchases'),
+                last_purchase_at=db.bindparam('last_purchase_at')),
+        [{'client_id': cid, 'has_purchases': at is not None, 'last_purchase_at': at}
+         for cid, at in last_purchase.items()]
+    )
+    return last_purchase
+
+def _link_unassigned_appointments(connection, client):
+    """Collega al nuovo cliente gli appuntamenti senza cliente con stesso telefono o nome (normalizzati)"""
+    from .appointment import Appointment, OtherAppointment
+
+    for model in (Appointment, OtherAppointment):
+        table = model.__table__
+        matches = [column == value for column, value in ((table.c.telefono_normalizzato, client.telefono_normalizzato),
+                                                          (table.c.nome_normalizzato, client.nome_normalizzato)) if value]
+        if matches:
+            connection.execute(
+                table.update()
+                .where(table.c.client_id.is_(None))
+                .where(db.or_(*matches))
+                .values(client_id=client.id)
+            )
+
+# Mantenimento collegamento appuntamento → cliente e flag acquisti
+
+@event.listens_for(Session, 'before_flush')
+def _collect_client_changes(session, flush_context, instances):
+    """Collega i nuovi appuntamenti al cliente e annota i clienti da ricalcolare"""
+    from .appointment import Appointment, OtherAppointment
+
+    pending = session.info.setdefault('clients_to_refresh', set())
+    new_clients = session.info.setdefault('new_clients', [])
+
+    with session.no_autoflush:
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Client):
+                if obj not in session.deleted:
+                    set_match_keys(obj, obj.nome, obj.numero_telefono)
+                if obj in session.new:
+                    new_clients.append(obj)
+                continue
+            if not isinstance(obj, (Appointment, OtherAppointment)):
+                continue
+            if obj not in session.deleted:
+                set_match_keys(obj, obj.nome_cliente, obj.numero_telefono)
+
+            linked = getattr(obj, 'client', None)
+            if obj not in session.deleted and obj.client_id is None and linked is None:
+                obj.client_id = find_client_id(session, obj.nome_cliente, obj.numero_telefono)
+
+            history = attributes.get_history(obj, 'client_id')
+            pending.update(history.deleted or ())
+            pending.add(linked.id if linked is not None else obj.client_id)
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _refresh_client_flags(session, flush_context):
+    """Aggiorna i flag acquisti dei clienti toccati dal flush"""
+    from .appointment import Appointment, OtherAppointment
+
+    pending = session.info.pop('clients_to_refresh', set())
+    new_clients = session.info.pop('new_clients', [])
+    connection = session.connection()
+
+    for client in new_clients:
+        _link_unassigned_appointments(connection, client)
+        pending.add(client.id)
+
+    if new_clients:
+        mark_tables_written(session, {Appointment.__tablename__, OtherAppointment.__tablename__})
+        # Allinea gli appuntamenti già in sessione collegati via SQL
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, (Appointment, OtherAppointment)) and obj.__dict__.get('client_id', 0) is None:
+                session.expire(obj, ['client_id'])
+
+    refreshed = refresh_purchase_flags(connection, pending)
+    if refreshed:
+        mark_tables_written(session, {Client.__tablename__})
+
+    for client_id, purchased_at in refreshed.items():
+        client = session.identity_map.get(db.inspect(Client).identity_key_from_primary_key((client_id,)))
+        if client is not None:
+            attributes.set_committed_value(client, 'has_purchases', purchased_at is not None)
+            attributes.set_committed_value(client, 'last_purchase_at', purchased_at)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_client_changes(session, previous_transaction):
+    """Scarta le modifiche annotate se il flush viene annullato"""
+    session.info.pop('clients_to_refresh', None)
+    session.info.pop('new_clients', None)
@@ -0,0 +1,153 @@
+from datetime import datetime, date, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+from .database import db, appointment_consultant
+from .table_version import mark_tables_written
+
+# consultant_id delle righe che contano ogni appuntamento una sola volta
+# (un appuntamento con più consulenti compare una volta per consulente nelle altre righe)
+ALL_CONSULTANTS = 0
+
+class DailyStats(db.Model):
+    """Aggregato giornaliero degli appuntamenti, mantenuto a ogni scrittura (vedi hook in fondo)"""
+    __tablename__ = 'daily_stats'
+    __table_args__ = (
+        db.Index('ix_daily_stats_consultant_day', 'consultant_id', 'day'),
+        db.Index('ix_daily_stats_day', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    consultant_id = db.Column(db.Integer, nullable=False, default=ALL_CONSULTANTS)
+    tipologia = db.Column(db.String(20))
+    stato = db.Column(db.String(20))
+    venduto = db.Column(db.Boolean)
+    include_in_reports = db.Column(db.Boolean)
+    appointments = db.Column(db.Integer, nullable=False, default=0)
+    nominativi_raccolti = db.Column(db.Integer, nullable=False, default=0)
+    appuntamenti_personali = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DailyStats {self.day} consulente={self.consultant_id} ({self.appointments})>"
+
+def _rollup_selects(condition=None):
+    """SELECT aggregati (totali e per consulente) nel formato della tabella daily_stats"""
+    from .appointment import Appointment
+
+    day = db.func.date(Appointment.data_appuntamento)
+    dimensions = [Appointment.tipologia, Appointment.stato, Appointment.venduto, Appointment.include_in_reports]
+    measures = [
+        db.func.count(Appointment.id),
+        db.func.sum(db.func.coalesce(Appointment.nominativi_raccolti, 0)),
+        db.func.sum(db.func.coalesce(Appointment.appuntamenti_personali, 0))
+    ]
+
+    totals = db.select(day, db.literal(ALL_CONSULTANTS), *dimensions, *measures)
+    per_consultant = (db.select(day, appointment_consultant.c.consultant_id, *dimensions, *measures)
+                      .join(appointment_consultant, appointment_consultant.c.appointment_id == Appointment.id))
+
+    if condition is not None:
+        totals = totals.where(condition)
+        per_consultant = per_consultant.where(condition)
+
+    return [
+        totals.group_by(day, *dimensions),
+        per_consultant.group_by(day, appointment_consultant.c.consultant_id, *dimensions)
+    ]
+
+def _insert_rollup(connection, condition=None):
+    """Inserisce in daily_stats gli aggregati degli appuntamenti che soddisfano condition"""
+    table = DailyStats.__table__
+    columns = ['day', 'consultant_id', 'tipologia', 'stato', 'venduto', 'include_in_reports',
+               'appointments', 'nominativi_raccolti', 'appuntamenti_personali']
+
+    for select in _rollup_selects(condition):
+        connection.execute(table.insert().from_select(columns, select))
+
+def refresh_daily_stats(connection, days):
+    """Ricalcola l'aggregato dei giorni indicati (date), ritorna i giorni aggiornati"""
+    from .appointment import Appointment
+
+    days = sorted({d for d in days if d})
+    if not days:
+        return []
+
+    connection.execute(DailyStats.__table__.delete().where(DailyStats.__table__.c.day.in_(days)))
+
+    # Intervalli semiaperti sulla colonna indicizzata, un giorno per condizione
+    ranges = [db.and_(Appointment.data_appuntamento >= datetime.combine(d, datetime.min.time()),
+                      Appointment.data_appuntamento < datetime.combine(d + timedelta(days=1), datetime.min.time()))
+              for d in days]
+    _insert_rollup(connection, db.or_(*ranges))
+    return days
+
+def rebuild_daily_stats(connection):
+    """Ricostruisce da zero l'intera tabella daily_stats, ritorna il numero di righe"""
+    connection.execute(DailyStats.__table__.delete())
+    _insert_rollup(connection)
+    return connection.execute(db.select(db.func.count()).select_from(DailyStats.__table__)).scalar()
+
+def ensure_daily_stats(engine=None):
+    """Popola daily_stats se è vuota ma esistono appuntamenti (primo avvio dopo l'aggiornamento)"""
+    from .appointment import Appointment
+
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        has_stats = conn.execute(db.select(DailyStats.id).limit(1)).first()
+        has_appointments = conn.execute(db.select(Appointment.id).limit(1)).first()
+        if has_appointments and not has_stats:
+            return rebuild_daily_stats(conn)
+    return 0
+
+def _as_day(value):
+    """Giorno di una data/datetime"""
+    if isinstance(value, datetime):
+        return value.date()
+    return value if isinstance(value, date) else None
+
+def _consultant_appointment_changes(session, consultant):
+    """Appuntamenti aggiunti o rimossi dal lato del consulente (tutti, se il consulente viene eliminato)"""
+    if consultant in session.deleted:
+        return list(consultant.appointments)  # Le righe di appointment_consultant vengono eliminate con lui
+
+    history = attributes.get_history(consultant, 'appointments', passive=attributes.PASSIVE_NO_INITIALIZE)
+    return list(history.added or ()) + list(history.deleted or ())
+
+# Mantenimento incrementale: a ogni flush si ricalcolano solo i giorni toccati
+
+@event.listens_for(Session, 'before_flush')
+def _collect_stats_days(session, flush_context, instances):
+    """Annota i giorni (vecchi e nuovi) degli appuntamenti modificati o collegati/scollegati da un consulente"""
+    from .appointment import Appointment
+    from .consultant import Consultant
+
+    days = session.info.setdefault('stats_days', set())
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Consultant):
+            with session.no_autoflush:
+                days.update(_as_day(appointment.data_appuntamento)
+                            for appointment in _consultant_appointment_changes(session, obj))
+            continue
+        if not isinstance(obj, Appointment):
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+
+        if obj in session.new and obj.data_appuntamento is None:
+            days.add(datetime.utcnow().date())  # Default della colonna applicato al flush
+
+        history = attributes.get_history(obj, 'data_appuntamento')
+        days.update(_as_day(value) for value in history.sum())
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _refresh_stats_days(session, flush_context):
+    """Ricalcola l'aggregato dei giorni toccati dal flush"""
+    days = session.info.pop('stats_days', set())
+    if refresh_daily_stats(session.connection(), days):
+        mark_tables_written(session, {DailyStats.__tablename__})
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_stats_days(session, previous_transaction):
+    """Scarta i giorni annotati se il flush viene annullato"""
+    session.info.pop('stats_days', None)
@@ -3,7 +3,9 @@ Database instance for AppointmentCRM
 Separato per evitare import circolari
 """
 
+import os
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 
 # Istanza SQLAlchemy condivisa
 db = SQLAlchemy()
@@ -11,5 +13,74 @@ db = SQLAlchemy()
 # Tabella di associazione many-to-many per appointment-consultant
 appointment_consultant = db.Table('appointment_consultant',
     db.Column('appointment_id', db.Integer, db.ForeignKey('appointment.id'), primary_key=True),
-    db.Column('consultant_id', db.Integer, db.ForeignKey('consultant.id'), primary_key=True)
+    db.Column('consultant_id', db.Integer, db.ForeignKey('consultant.id'), primary_key=True),
+    # La PK copre (appointment_id, consultant_id); serve l'ordine inverso per i filtri per consulente
+    db.Index('ix_appointment_consultant_consultant', 'consultant_id', 'appointment_id')
 )
+
+# PRAGMA applicati a ogni nuova connessione SQLite (sovrascrivibili con SQLITE_PRAGMAS)
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',      # Letture concorrenti alle scritture, anche tra processi
+    'busy_timeout': 5000,       # ms di attesa sul lock invece di "database is locked"
+    'synchronous': 'NORMAL',    # Sicuro con WAL, fsync solo ai checkpoint
+    'mmap_size': 268435456,     # 256 MB letti tramite memory map
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,       # ~20 MB di cache pagine per connessione
+}
+
+def engine_options(database_uri: str) -> dict:
+    """Opzioni del pool di connessioni (dimensioni configurabili con DB_POOL_SIZE e DB_MAX_OVERFLOW)"""
+    if database_uri.startswith('sqlite'):
+        if ':memory:' in database_uri or database_uri in ('sqlite://', 'sqlite:///'):
+            return {}
+        return {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+            'connect_args': {'timeout': 30, 'check_same_thread': False}
+        }
+
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': 1800,
+        'pool_pre_ping': True
+    }
+
+def apply_sqlite_pragmas(engine, pragmas=None) -> bool:
+    """Registra i PRAGMA da eseguire a ogni connessione del motore SQLite indicato"""
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    settings = dict(DEFAULT_SQLITE_PRAGMAS, **(pragmas or {}))
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in settings.items():
+                if value is not None:
+                    cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    return True
+
+def create_missing_indexes(engine=None):
+    """Crea sul database esistente gli indici dichiarati nei modelli (idempotente)"""
+    engine = engine or db.engine
+    inspector = db.inspect(engine)
+    created = []
+    
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+    
+    return created
@@ -4,6 +4,11 @@ from .database import db
 
 class FollowUp(db.Model):
     __tablename__ = 'follow_up'
+    __table_args__ = (
+        db.Index('ix_follow_up_done_data', 'done', 'data_prevista'),
+        db.Index('ix_follow_up_appointment', 'appointment_id', 'numero'),
+        db.Index('ix_follow_up_updated', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id'), nullable=False)
@@ -11,6 +16,7 @@ class FollowUp(db.Model):
     data_prevista = db.Column(db.DateTime, nullable=False)
     done = db.Column(db.Boolean, default=False)
     note = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Sincronizzazione mobile
     
     # Relazioni
     appointment = db.relationship('Appointment', backref=db.backref('followups', lazy=True, cascade="all, delete-orphan"))
@@ -46,49 +52,89 @@ class FollowUp(db.Model):
             'note': self.note,
             'is_overdue': self.is_overdue(),
             'days_until_due': self.days_until_due(),
-            'client_name': self.appointment.nome_cliente if self.appointment else None
+            'client_name': self.appointment.nome_cliente if self.appointment else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
-def schedule_followups(appointment):
+# Finestre temporali dei follow-up (numero, intervallo dalla vendita):
+# - 1° dopo 2 giorni dalla vendita
+# - 2° dopo 21 giorni dalla vendita
+# - 3°-13° ogni 3 mesi dopo la vendita
+# - 14° 14 giorni prima dei 3 anni (fine garanzia)
+FOLLOWUP_WINDOWS = [
+    (1, timedelta(days=2)),
+    (2, timedelta(days=21))
+] + [
+    (i, relativedelta(months=3 * (i - 2))) for i in range(3, 14)
+] + [
+    (14, relativedelta(years=3, days=-14))
+]
+
+# Appuntamenti per singola query di esistenza (limite parametri SQLite)
+BULK_CHUNK_SIZE = 500
+
+def bulk_schedule_followups(appointments, windows=None, note_for=None, not_before=None):
     """
-    Pianifica automaticamente i follow-up per un appuntamento venduto
+    Pianifica in blocco i follow-up mancanti per più appuntamenti venduti
     
-    Schema follow-up:
-    - 1° dopo 2 giorni dalla vendita
-    - 2° dopo 21 giorni dalla vendita  
-    - 3°-13° ogni 3 mesi dopo la vendita
-    - 14° 14 giorni prima dei 3 anni (fine garanzia)
-    """
-    if not appointment.venduto:
-        return
-        
-    base = appointment.data_appuntamento
+    Per ogni blocco di appuntamenti: una query per le coppie (appointment_id, numero)
+    già presenti e un solo INSERT executemany per quelle mancanti. Non esegue commit.
+    
+    Args:
+        appointments: appuntamenti (solo quelli venduti e già salvati vengono considerati)
+        windows: lista (numero, intervallo); default FOLLOWUP_WINDOWS
+        note_for: funzione opzionale appointment -> nota del follow-up
+        not_before: salta i follow-up con data prevista precedente
     
-    # Definisce le finestre temporali per i follow-up
-    windows = [
-        (1, timedelta(days=2)),
-        (2, timedelta(days=21))
-    ] + [
-        (i, relativedelta(months=3 * (i - 2))) for i in range(3, 14)
-    ] + [
-        (14, relativedelta(years=3, days=-14))
-    ]
+    Returns:
+        lista di dict (id, appointment_id, numero, data_prevista, done, note) inseriti
+    """
+    windows = windows or FOLLOWUP_WINDOWS
+    sold = [a for a in appointments if a.venduto and a.id is not None]
+    inserted = []
     
-    # Crea i follow-up
-    for num, delta in windows:
-        existing = FollowUp.query.filter_by(
-            appointment_id=appointment.id, 
-            numero=num
-        ).first()
+    for start in range(0, len(sold), BULK_CHUNK_SIZE):
+        chunk = sold[start:start + BULK_CHUNK_SIZE]
+        
+        existing = set(db.session.execute(
+            db.select(FollowUp.appointment_id, FollowUp.numero)
+            .where(FollowUp.appointment_id.in_([a.id for a in chunk]))
+        ).all())
         
-        if not existing:  # Evita duplicati
-            fu = FollowUp(
-                appointment_id=appointment.id, 
-                numero=num, 
-                data_prevista=base + delta
-            )
-            db.session.add(fu)
+        rows = []
+        for appointment in chunk:
+            note = note_for(appointment) if note_for else None
+            for num, delta in windows:
+                due_date = appointment.data_appuntamento + delta
+                if (appointment.id, num) in existing or (not_before and due_date < not_before):
+                    continue
+                rows.append({
+                    'appointment_id': appointment.id,
+                    'numero': num,
+                    'data_prevista': due_date,
+                    'done': False,
+                    'note': note
+                })
+        
+        if rows:
+            ids = db.session.execute(
+                db.insert(FollowUp).returning(FollowUp.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+            for row, followup_id in zip(rows, ids):
+                row['id'] = followup_id
+            
+            # Nessun oggetto nel flush: le righe sono annotate per gli eventi real-time dopo il commit
+            db.session.info.setdefault('bulk_inserted_followups', []).extend(rows)
+            inserted.extend(rows)
+    
+    return inserted
+
+def schedule_followups(appointment):
+    """Pianifica automaticamente i follow-up per un appuntamento venduto (vedi FOLLOWUP_WINDOWS)"""
+    if not appointment.venduto:
+        return
     
+    bulk_schedule_followups([appointment])
     db.session.commit()
 
 def get_pending_followups(limit=None):
@@ -0,0 +1,60 @@
+from datetime import datetime
+from .database import db
+
+# Stati di un job in background
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+JOB_ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING)
+
+class Job(db.Model):
+    """Job in background (report, esportazioni) eseguito da services.job_service"""
+    __tablename__ = 'job'
+    __table_args__ = (
+        db.Index('ix_job_created_by', 'created_by', 'created_at'),
+        db.Index('ix_job_status', 'status', 'created_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid hex, non indovinabile
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.JSON, default=lambda: {})
+    status = db.Column(db.String(20), nullable=False, default=JOB_QUEUED)
+    progress = db.Column(db.Integer, nullable=False, default=0)  # Percentuale 0-100
+    message = db.Column(db.String(200), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    # Risultato salvato su disco (instance/jobs)
+    result_path = db.Column(db.String(500), nullable=True)
+    result_name = db.Column(db.String(200), nullable=True)
+    result_mimetype = db.Column(db.String(100), nullable=True)
+
+    owner_pid = db.Column(db.Integer, nullable=True)  # Processo che esegue il job
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} {self.status}>"
+
+    def is_active(self):
+        """True se il job è in coda o in esecuzione"""
+        return self.status in JOB_ACTIVE_STATES
+
+    def to_dict(self):
+        """Serializza il job per API JSON"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'result_name': self.result_name,
+            'has_result': bool(self.result_path) and self.status == JOB_COMPLETED,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -3,6 +3,10 @@ from .database import db
 
 class note_event(db.Model):
     __tablename__ = 'note_event'
+    __table_args__ = (
+        db.Index('ix_note_event_data', 'data'),
+        db.Index('ix_note_event_updated', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     note = db.Column(db.Text, nullable=False)
@@ -15,6 +19,8 @@ class note_event(db.Model):
     
     # Associazione utente (opzionale)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Sincronizzazione mobile
 
     def __repr__(self):
         return f"<Note {self.note[:50]}{'...' if len(self.note) > 50 else ''}>"
@@ -47,12 +53,16 @@ class note_event(db.Model):
             'completato': self.completato,
             'is_today': self.is_today(),
             'is_overdue': self.is_overdue(),
-            'user_id': self.user_id
+            'user_id': self.user_id,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 def get_events_for_date(date):
     """Ottieni tutti gli eventi per una data specifica"""
-    return note_event.query.filter(db.func.date(note_event.data) == date).all()
+    from utils import DateUtils
+    
+    start, end = DateUtils.day_range(date)
+    return note_event.query.filter(*DateUtils.range_filter(note_event.data, start, end)).all()
 
 def get_upcoming_events(days=7):
     """Ottieni eventi dei prossimi N giorni"""
@@ -0,0 +1,207 @@
+"""
+Indici full-text SQLite FTS5 mantenuti sincronizzati con trigger
+"""
+
+import re
+import weakref
+from .database import db
+
+CLIENT_FTS = 'client_fts'
+
+# Pesi bm25 per colonna: nome, indirizzo, telefono, email, note
+CLIENT_FTS_WEIGHTS = (10.0, 2.0, 5.0, 3.0, 1.0)
+
+# Il telefono viene indicizzato anche senza prefisso +39 per la ricerca per prefisso
+_CLIENT_FTS_VALUES = """
+    {row}.id, {row}.nome, {row}.indirizzo,
+    coalesce({row}.numero_telefono, '') || ' ' || replace(coalesce({row}.numero_telefono, ''), '+39', ''),
+    {row}.email, {row}.note
+"""
+
+CLIENT_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {CLIENT_FTS} USING fts5(
+        nome, indirizzo, numero_telefono, email, note,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {CLIENT_FTS}_ai AFTER INSERT ON client BEGIN
+        INSERT INTO {CLIENT_FTS}(rowid, nome, indirizzo, numero_telefono, email, note)
+        VALUES ({_CLIENT_FTS_VALUES.format(row='new')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {CLIENT_FTS}_ad AFTER DELETE ON client BEGIN
+        DELETE FROM {CLIENT_FTS} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {CLIENT_FTS}_au
+        AFTER UPDATE OF nome, indirizzo, numero_telefono, email, note ON client BEGIN
+        DELETE FROM {CLIENT_FTS} WHERE rowid = old.id;
+        INSERT INTO {CLIENT_FTS}(rowid, nome, indirizzo, numero_telefono, email, note)
+        VALUES ({_CLIENT_FTS_VALUES.format(row='new')});
+    END""",
+]
+
+CLIENT_FTS_REBUILD = f"""
+    INSERT INTO {CLIENT_FTS}(rowid, nome, indirizzo, numero_telefono, email, note)
+    SELECT {_CLIENT_FTS_VALUES.format(row='client')} FROM client
+"""
+
+# Indice globale: una riga per appuntamento, cliente, nota o follow-up con nota.
+# Il rowid codifica sorgente e id (id * 4 + codice), così i trigger aggiornano per rowid.
+SEARCH_FTS = 'search_index'
+
+SEARCH_KIND_CODES = {
+    'appointment': 0,
+    'client': 1,
+    'note': 2,
+    'followup': 3
+}
+
+# Prefissi pre-indicizzati fino a questa lunghezza (type-ahead veloce sui prefissi corti);
+# i prefissi più lunghi restano cercabili sull'indice dei termini
+SEARCH_PREFIX_LENGTH = 6
+
+_PHONE_TERMS = "coalesce({col}, '') || ' ' || replace(coalesce({col}, ''), '+39', '')"
+
+_APPOINTMENT_SEARCH_VALUES = """
+    {row}.id * 4, {row}.nome_cliente,
+    coalesce({row}.indirizzo, '') || ' ' || coalesce({row}.note, '') || ' ' || """ + _PHONE_TERMS.format(col='{row}.numero_telefono')
+
+_CLIENT_SEARCH_VALUES = """
+    {row}.id * 4 + 1, {row}.nome,
+    coalesce({row}.indirizzo, '') || ' ' || coalesce({row}.email, '') || ' ' || coalesce({row}.note, '') || ' ' || """ + _PHONE_TERMS.format(col='{row}.numero_telefono')
+
+_NOTE_SEARCH_VALUES = "{row}.id * 4 + 2, {row}.note, ''"
+
+_FOLLOWUP_SEARCH_VALUES = """
+    {row}.id * 4 + 3,
+    coalesce((SELECT nome_cliente FROM appointment WHERE appointment.id = {row}.appointment_id), ''),
+    {row}.note"""
+
+def _sync_triggers(table, code, values, columns, condition='1'):
+    """Trigger insert/update/delete che mantengono l'indice globale per una tabella sorgente"""
+    insert = f"""INSERT INTO {SEARCH_FTS}(rowid, title, body)
+        SELECT {values.format(row='new')} WHERE {condition.format(row='new')};"""
+    delete = f"DELETE FROM {SEARCH_FTS} WHERE rowid = old.id * 4 + {code};"
+
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_FTS}_{table}_ai AFTER INSERT ON {table} BEGIN
+            {insert}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_FTS}_{table}_ad AFTER DELETE ON {table} BEGIN
+            {delete}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_FTS}_{table}_au AFTER UPDATE OF {columns} ON {table} BEGIN
+            {delete}
+            {insert}
+        END""",
+    ]
+
+SEARCH_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_FTS} USING fts5(
+        title, body,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '{' '.join(str(n) for n in range(2, SEARCH_PREFIX_LENGTH + 1))}'
+    )""",
+    *_sync_triggers('appointment', SEARCH_KIND_CODES['appointment'], _APPOINTMENT_SEARCH_VALUES,
+                    'nome_cliente, indirizzo, note, numero_telefono'),
+    *_sync_triggers('client', SEARCH_KIND_CODES['client'], _CLIENT_SEARCH_VALUES,
+                    'nome, indirizzo, numero_telefono, email, note'),
+    *_sync_triggers('note_event', SEARCH_KIND_CODES['note'], _NOTE_SEARCH_VALUES, 'note'),
+    *_sync_triggers('follow_up', SEARCH_KIND_CODES['followup'], _FOLLOWUP_SEARCH_VALUES,
+                    'note, appointment_id', condition="coalesce({row}.note, '') != ''"),
+    # Il titolo dei follow-up è il nome cliente dell'appuntamento
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_FTS}_appointment_name_au
+        AFTER UPDATE OF nome_cliente ON appointment BEGIN
+        UPDATE {SEARCH_FTS} SET title = new.nome_cliente
+        WHERE rowid IN (SELECT id * 4 + 3 FROM follow_up
+                        WHERE appointment_id = new.id AND coalesce(note, '') != '');
+    END""",
+]
+
+SEARCH_FTS_REBUILD = [
+    f"INSERT INTO {SEARCH_FTS}(rowid, title, body) SELECT {_APPOINTMENT_SEARCH_VALUES.format(row='appointment')} FROM appointment",
+    f"INSERT INTO {SEARCH_FTS}(rowid, title, body) SELECT {_CLIENT_SEARCH_VALUES.format(row='client')} FROM client",
+    f"INSERT INTO {SEARCH_FTS}(rowid, title, body) SELECT {_NOTE_SEARCH_VALUES.format(row='note_event')} FROM note_event",
+    f"""INSERT INTO {SEARCH_FTS}(rowid, title, body) SELECT {_FOLLOWUP_SEARCH_VALUES.format(row='follow_up')}
+        FROM follow_up WHERE coalesce(follow_up.note, '') != ''""",
+]
+
+# Massimo numero di termini considerati in una ricerca
+MAX_TERMS = 8
+
+# Indici già verificati per engine (evita di interrogare sqlite_master a ogni ricerca)
+_ready_indexes = weakref.WeakKeyDictionary()
+
+def fts_available(engine=None) -> bool:
+    """True se il database è SQLite compilato con FTS5"""
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    with engine.connect() as conn:
+        return bool(conn.execute(db.text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+def _ensure_index(engine, name, ddl, rebuild) -> None:
+    """Crea tabella FTS5 e trigger se mancano, popolando la tabella alla prima creazione"""
+    with engine.begin() as conn:
+        exists = conn.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': name}
+        ).first()
+
+        for statement in ddl:
+            conn.execute(db.text(statement))
+
+        if not exists:
+            for statement in rebuild:
+                conn.execute(db.text(statement))
+
+    _ready_indexes.setdefault(engine, set()).add(name)
+
+def ensure_client_search_index(engine=None) -> bool:
+    """Crea (se mancano) tabella FTS5 e trigger dei clienti, popolandola alla prima creazione"""
+    engine = engine or db.engine
+    if not fts_available(engine):
+        return False
+
+    _ensure_index(engine, CLIENT_FTS, CLIENT_FTS_DDL, [CLIENT_FTS_REBUILD])
+    return True
+
+def ensure_search_indexes(engine=None) -> bool:
+    """Crea (se mancano) l'indice clienti e l'indice globale di ricerca"""
+    engine = engine or db.engine
+    if not fts_available(engine):
+        return False
+
+    _ensure_index(engine, CLIENT_FTS, CLIENT_FTS_DDL, [CLIENT_FTS_REBUILD])
+    _ensure_index(engine, SEARCH_FTS, SEARCH_FTS_DDL, SEARCH_FTS_REBUILD)
+    return True
+
+def has_search_index(name: str, engine=None) -> bool:
+    """True se l'indice full-text indicato esiste nel database corrente"""
+    engine = engine or db.engine
+    if name in _ready_indexes.get(engine, ()):
+        return True
+
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    with engine.connect() as conn:
+        exists = conn.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': name}
+        ).first()
+
+    if exists:
+        _ready_indexes.setdefault(engine, set()).add(name)
+    return bool(exists)
+
+def is_phone_query(text: str) -> bool:
+    """True se il testo contiene solo cifre e separatori di un numero di telefono (es. '333 1234', '+39')"""
+    return bool(text) and bool(re.search(r'\d', text)) and re.fullmatch(r'[\d\s+\-/.()]+', text.strip()) is not None
+
+def build_match_query(text: str):
+    """Espressione MATCH FTS5 con ricerca per prefisso su ogni termine (AND implicito)"""
+    terms = re.findall(r'\w+', text or '', re.UNICODE)[:MAX_TERMS]
+    if not terms:
+        return None
+
+    return ' '.join(f'"{term}"*' for term in terms)
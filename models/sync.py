@@ -0,0 +1,76 @@
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+from .database import db
+from .table_version import mark_tables_written
+
+# Tabelle sincronizzate con la dashboard mobile dei dealer
+SYNC_TABLES = ('appointment', 'follow_up', 'client', 'note_event')
+
+class SyncTombstone(db.Model):
+    """Traccia di una riga eliminata (o uscita dal perimetro di un consulente) per la sincronizzazione"""
+    __tablename__ = 'sync_tombstone'
+    __table_args__ = (
+        db.Index('ix_sync_tombstone_deleted', 'deleted_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    consultant_id = db.Column(db.Integer, nullable=True)  # None = eliminata per tutti
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SyncTombstone {self.table_name}#{self.row_id}>"
+
+    def to_dict(self):
+        """Serializza la traccia per l'API di sincronizzazione"""
+        return {
+            'table': self.table_name,
+            'id': self.row_id,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
+def purge_tombstones(connection, before):
+    """Elimina le tracce più vecchie di before, ritorna il numero eliminato"""
+    table = SyncTombstone.__table__
+    return connection.execute(table.delete().where(table.c.deleted_at < before)).rowcount
+
+# Tracciamento: updated_at anche per modifiche alle sole relazioni, tracce per le eliminazioni
+
+@event.listens_for(Session, 'before_flush')
+def _track_sync_changes(session, flush_context, instances):
+    """Aggiorna updated_at degli oggetti modificati e annota le tracce delle eliminazioni"""
+    now = datetime.utcnow()
+    tombstones = session.info.setdefault('sync_tombstones', [])
+
+    for obj in list(session.dirty):
+        if getattr(obj, '__tablename__', None) not in SYNC_TABLES or not session.is_modified(obj):
+            continue
+
+        # onupdate non scatta se cambia solo la tabella associativa appointment_consultant
+        obj.updated_at = now
+
+        if obj.__tablename__ == 'appointment':
+            removed = attributes.get_history(obj, 'consultants').deleted or ()
+            tombstones.extend({'table_name': 'appointment', 'row_id': obj.id,
+                               'consultant_id': consultant.id, 'deleted_at': now}
+                              for consultant in removed)
+
+    for obj in list(session.deleted):
+        if getattr(obj, '__tablename__', None) in SYNC_TABLES:
+            tombstones.append({'table_name': obj.__tablename__, 'row_id': obj.id,
+                               'consultant_id': None, 'deleted_at': now})
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _write_tombstones(session, flush_context):
+    """Scrive le tracce annotate nella transazione del flush"""
+    tombstones = session.info.pop('sync_tombstones', [])
+    if tombstones:
+        session.connection().execute(SyncTombstone.__table__.insert(), tombstones)
+        mark_tables_written(session, {SyncTombstone.__tablename__})
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_tombstones(session, previous_transaction):
+    """Scarta le tracce annotate se il flush viene annullato"""
+    session.info.pop('sync_tombstones', None)
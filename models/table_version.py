@@ -0,0 +1,133 @@
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .database import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TableVersion(db.Model):
+    """Contatore di modifiche per tabella, incrementato nella stessa transazione delle scritture"""
+    __tablename__ = 'table_version'
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<TableVersion {self.table_name} v{self.version}>"
+
+# Funzioni chiamate dopo il commit con l'insieme delle tabelle scritte (cache, notifiche)
+_commit_listeners = []
+
+def on_tables_committed(listener):
+    """Registra una funzione chiamata con le tabelle scritte da ogni transazione confermata"""
+    if listener not in _commit_listeners:
+        _commit_listeners.append(listener)
+    return listener
+
+def ensure_table_versions(engine=None):
+    """Crea le righe mancanti per tutte le tabelle del modello (versione 0)"""
+    engine = engine or db.engine
+    table = TableVersion.__table__
+
+    with engine.begin() as conn:
+        existing = set(conn.execute(db.select(table.c.table_name)).scalars())
+        missing = [name for name in db.metadata.tables if name not in existing and name != table.name]
+        if missing:
+            conn.execute(table.insert(), [{'table_name': name, 'version': 0} for name in missing])
+    return len(missing)
+
+def bump_table_versions(connection, tables):
+    """Incrementa la versione delle tabelle indicate sulla connessione della transazione"""
+    table = TableVersion.__table__
+    now = datetime.utcnow()
+
+    for name in sorted(tables):
+        result = connection.execute(
+            table.update()
+            .where(table.c.table_name == name)
+            .values(version=table.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(table_name=name, version=1, updated_at=now))
+
+def get_table_versions(tables):
+    """{tabella: versione} per le tabelle indicate, con una sola query"""
+    table = TableVersion.__table__
+    tables = sorted(set(tables))
+
+    rows = db.session.execute(
+        db.select(table.c.table_name, table.c.version).where(table.c.table_name.in_(tables))
+    )
+    versions = dict.fromkeys(tables, 0)
+    versions.update(rows.all())
+    return versions
+
+# Versionamento: le tabelle scritte si annotano a ogni flush o scrittura bulk e si incrementano
+# una sola volta, subito prima del commit, così il lock sulle righe dei contatori dura il meno possibile
+
+def _written_tables(session):
+    return session.info.setdefault('written_tables', set())
+
+def mark_tables_written(session, tables):
+    """Annota le tabelle scritte con SQL Core sulla connessione della sessione (es. negli hook di flush)"""
+    _written_tables(session).update(name for name in tables if name != TableVersion.__tablename__)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_tables(session, flush_context):
+    """Tabelle degli oggetti inseriti, modificati o eliminati nel flush"""
+    tables = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table:
+            tables.add(table)
+            if table in ('appointment', 'consultant'):
+                tables.add('appointment_consultant')  # Consulenti collegati (tabella associativa)
+
+    if tables:
+        mark_tables_written(session, tables)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_tables(orm_execute_state):
+    """Tabelle scritte con INSERT/UPDATE/DELETE eseguiti tramite la sessione"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        name = getattr(table, 'name', None)
+        if name:
+            mark_tables_written(orm_execute_state.session, {name})
+
+@event.listens_for(Session, 'before_commit')
+def _bump_written_tables(session):
+    """Incrementa le versioni delle tabelle scritte nella transazione, una volta per tabella"""
+    if session.in_nested_transaction():
+        return
+
+    # Il flush finale del commit avverrebbe dopo questo hook: lo si anticipa per annotarne le tabelle
+    session.flush()
+
+    tables = session.info.get('written_tables')
+    if tables:
+        bump_table_versions(session.connection(), tables)
+
+@event.listens_for(Session, 'after_commit')
+def _notify_committed(session):
+    """Notifica ai listener le tabelle scritte dalla transazione confermata"""
+    if session.in_nested_transaction():
+        return  # Savepoint: si notifica al commit della transazione esterna
+
+    tables = session.info.pop('written_tables', None)
+    if not tables:
+        return
+
+    for listener in list(_commit_listeners):
+        try:
+            listener(frozenset(tables))
+        except Exception as e:
+            logger.error(f"Listener commit {listener.__name__} fallito: {e}")
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_written_tables(session):
+    """Nessuna notifica se la transazione viene annullata"""
+    if not session.in_nested_transaction():
+        session.info.pop('written_tables', None)
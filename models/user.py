@@ -85,16 +85,14 @@ class User(UserMixin, db.Model):
     
     def _get_admin_dashboard_data(self):
         from models.appointment import Appointment
-        from models.consultant import Consultant
-        
-        all_appointments = Appointment.query.all()
-        sold_appointments = [a for a in all_appointments if a.venduto]
+        from services.stats_service import StatsService
         
+        counts = StatsService.global_counts()
         return {
-            'total_appointments': len(all_appointments),
-            'total_consultants': Consultant.query.count(),
-            'total_users': User.query.count(),
-            'sold_appointments': len(sold_appointments),
+            'total_appointments': counts['total_appointments'],
+            'total_consultants': counts['total_consultants'],
+            'total_users': counts['total_users'],
+            'sold_appointments': counts['sold_appointments'],
             'recent_appointments': Appointment.query.order_by(Appointment.data_appuntamento.desc()).limit(8).all()
         }
     
@@ -102,68 +100,66 @@ class User(UserMixin, db.Model):
         if not self.consultant:
             return {}
         
-        appointments = self.consultant.appointments
+        from models.appointment import Appointment
+        from models.database import appointment_consultant
+        from services.stats_service import StatsService
+        
+        totals = StatsService.period_stats(self.consultant.id)
+        recent_appointments = Appointment.query.join(
+            appointment_consultant,
+            appointment_consultant.c.appointment_id == Appointment.id
+        ).filter(
+            appointment_consultant.c.consultant_id == self.consultant.id
+        ).order_by(Appointment.data_appuntamento.desc()).limit(5).all()
+        
         return {
-            'total_appointments': len(appointments),
-            'sold_appointments': len([a for a in appointments if a.venduto]),
-            'monthly_stats': self._calculate_monthly_stats(appointments),
-            'recent_appointments': sorted(appointments, key=lambda x: x.data_appuntamento, reverse=True)[:5]
+            'total_appointments': totals['total'],
+            'sold_appointments': totals['sold'],
+            'monthly_stats': self._calculate_monthly_stats(),
+            'recent_appointments': recent_appointments
         }
     
-    def _calculate_monthly_stats(self, appointments):
-        """Calcola statistiche mensili per dealer"""
-        from datetime import datetime, timedelta
-        from calendar import monthrange
+    def _calculate_monthly_stats(self):
+        """Calcola statistiche mensili per dealer (una query aggregata per gli ultimi 3 mesi)"""
+        from dateutil.relativedelta import relativedelta
+        from services.stats_service import StatsService
         import calendar
         
         now = datetime.now()
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        window_start = month_start - relativedelta(months=2)
         
-        # Statistiche per questo mese
-        month_start = now.replace(day=1, hour=0, minute=0, second=0)
-        monthly_appointments = [a for a in appointments if a.data_appuntamento >= month_start]
+        window_end = month_start + relativedelta(months=1)
+        
+        buckets = StatsService.bucketed_stats(self.consultant.id, window_start, window_end, 'month')
         
         # Statistiche per gli ultimi 3 mesi
         months_data = []
         for i in range(3):
-            if i == 0:
-                # Mese corrente
-                start_date = month_start
-                end_date = now
-                month_name = calendar.month_name[now.month]
-            else:
-                # Mesi precedenti
-                year = now.year
-                month = now.month - i
-                if month <= 0:
-                    month += 12
-                    year -= 1
-                
-                start_date = datetime(year, month, 1)
-                _, last_day = monthrange(year, month)
-                end_date = datetime(year, month, last_day, 23, 59, 59)
-                month_name = calendar.month_name[month]
-            
-            month_appointments = [a for a in appointments if start_date <= a.data_appuntamento <= end_date]
+            start_date = month_start - relativedelta(months=i)
+            stats = buckets.get(StatsService.bucket_key(start_date, 'month'), StatsService.empty_bucket())
             
             months_data.append({
-                'month': month_name,
-                'total': len(month_appointments),
-                'sold': len([a for a in month_appointments if a.venduto]),
-                'assistenza': len([a for a in month_appointments if a.tipologia == 'Assistenza']),
-                'dimostrazione': len([a for a in month_appointments if a.tipologia == 'Dimostrazione']),
-                'consumabili': len([a for a in month_appointments if a.tipologia == 'Consumabili'])
+                'month': calendar.month_name[start_date.month],
+                'total': stats['total'],
+                'sold': stats['sold'],
+                'assistenza': stats['assistenza'],
+                'dimostrazione': stats['dimostrazione'],
+                'consumabili': stats['consumabili']
             })
         
+        current = buckets.get(StatsService.bucket_key(month_start, 'month'), StatsService.empty_bucket())
+        
         # Target mensile (esempio: 20 appuntamenti al mese)
         monthly_target = 20
-        current_progress = (len(monthly_appointments) / monthly_target * 100) if monthly_target > 0 else 0
+        current_progress = (current['total'] / monthly_target * 100) if monthly_target > 0 else 0
         
         return {
-            'total_this_month': len(monthly_appointments),
-            'sold_this_month': len([a for a in monthly_appointments if a.venduto]),
-            'assistenza_count': len([a for a in monthly_appointments if a.tipologia == 'Assistenza']),
-            'dimostrazione_count': len([a for a in monthly_appointments if a.tipologia == 'Dimostrazione']),
-            'consumabili_count': len([a for a in monthly_appointments if a.tipologia == 'Consumabili']),
+            'total_this_month': current['total'],
+            'sold_this_month': current['sold'],
+            'assistenza_count': current['assistenza'],
+            'dimostrazione_count': current['dimostrazione'],
+            'consumabili_count': current['consumabili'],
             'monthly_target': monthly_target,
             'progress_percentage': min(100, current_progress),
             'months_comparison': months_data
@@ -1,9 +1,15 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, Response, stream_with_context, send_file
 from flask_login import login_required, current_user
 from models.user import db, User
 from models.appointment import Appointment
 from models.consultant import Consultant
-from datetime import datetime
+from sqlalchemy.orm import selectinload
+from services.job_service import JobService
+from services.stats_service import StatsService
+from services.backup_service import BackupService
+from utils import DateUtils
+from utils.etag import conditional_get
+from datetime import datetime, timedelta
 import subprocess
 import os
 from functools import wraps
@@ -59,7 +65,7 @@ def dashboard():
         data.update({
             'recent_activity': recent_activity,
             'system_health': system_health,
-            'total_appointments': Appointment.query.count(),
+            'total_appointments': StatsService.global_counts()['total_appointments'],
             'recent_appointments': Appointment.query.order_by(Appointment.data_appuntamento.desc()).limit(10).all(),
             'overdue_followups': overdue_followups
         })
@@ -81,6 +87,19 @@ def dashboard():
         }
         return render_template('admin/dashboard.html', data=data)
 
+@bp.route('/dashboard/metrics')
+@login_required
+@admin_required
+@conditional_get('dashboard')
+def dashboard_metrics():
+    """Metriche della dashboard per l'aggiornamento periodico (contatori in cache)"""
+    counts = StatsService.global_counts()
+    return jsonify({
+        'success': True,
+        'metrics': {key: counts[key] for key in
+                    ('total_appointments', 'total_consultants', 'total_users', 'sold_appointments')}
+    })
+
 @bp.route('/users')
 @login_required
 @admin_required
@@ -574,7 +593,9 @@ def appointments():
     if date_filter:
         try:
             filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            query = query.filter(db.func.date(Appointment.data_appuntamento) == filter_date)
+            query = query.filter(
+                *DateUtils.range_filter(Appointment.data_appuntamento, *DateUtils.day_range(filter_date))
+            )
         except ValueError:
             flash('Formato data non valido', 'error')
     
@@ -615,82 +636,221 @@ def reports():
     """Generazione report"""
     return render_template('admin/reports.html')
 
+# Righe di dettaglio restituite inline da generate_report (l'elenco completo si esporta)
+REPORT_PREVIEW_LIMIT = 200
+
+def _report_params(source):
+    """(report_type, inizio, fine esclusa, include_excluded) dai parametri del report"""
+    report_type = source.get('report_type')
+    start_date = source.get('start_date')
+    end_date = source.get('end_date')
+    include_excluded = source.get('include_excluded') in ('on', 'true', '1')
+    
+    if not all([report_type, start_date, end_date]):
+        raise ValueError('Tutti i campi sono obbligatori')
+    
+    try:
+        start_date = datetime.strptime(start_date, '%Y-%m-%d')
+        end_date = datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError('Formato data non valido, usare YYYY-MM-DD')
+    
+    # Giorno finale incluso: intervallo semiaperto [start_date, end_date + 1 giorno)
+    return report_type, start_date, end_date + timedelta(days=1), include_excluded
+
+def _job_params(source, *keys):
+    """Parametri del report da salvare nel job (senza token CSRF)"""
+    return {key: source.get(key) for key in keys if source.get(key) is not None}
+
+def _build_report_data(report_type, start_date, range_end, include_excluded, limit=REPORT_PREVIEW_LIMIT):
+    """Dati del report (appuntamenti o performance); ValueError se il tipo non è valido"""
+    end_date = range_end - timedelta(days=1)
+    period = f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}"
+    
+    if report_type == 'appointments':
+        # Totali dall'aggregato giornaliero
+        by_status = StatsService.status_counts(start_date, range_end, include_excluded=include_excluded)
+        
+        # Anteprima dell'elenco con consulenti caricati in blocco
+        query = (Appointment.query
+                 .options(selectinload(Appointment.consultants))
+                 .filter(*DateUtils.range_filter(Appointment.data_appuntamento, start_date, range_end))
+                 .order_by(Appointment.data_appuntamento))
+        
+        # Applica filtro include_in_reports solo se non si vogliono includere gli esclusi
+        if not include_excluded:
+            query = query.filter(Appointment.include_in_reports == True)
+        
+        if limit:
+            query = query.limit(limit)
+        
+        appointments = query.all()
+        total_appointments = sum(c['total'] for c in by_status.values())
+        
+        return {
+            'period': period,
+            'total_appointments': total_appointments,
+            'truncated': total_appointments > len(appointments),
+            'sold_appointments': sum(c['sold'] for c in by_status.values()),
+            'concluded_appointments': sum(by_status.get(s, {}).get('total', 0) for s in ['concluso', 'completato']),
+            'pending_callbacks': by_status.get('da richiamare', {}).get('total', 0),
+            'appointments': [{
+                'nome_cliente': a.nome_cliente,
+                'data_appuntamento': a.data_appuntamento.strftime('%d/%m/%Y %H:%M'),
+                'stato': a.stato,
+                'venduto': 'Sì' if a.venduto else 'No',
+                'consultants': ', '.join([c.nome for c in a.consultants])
+            } for a in appointments]
+        }
+    
+    elif report_type == 'performance':
+        # Classifica consulenti con una sola query aggregata
+        return {
+            'period': period,
+            'consultant_stats': StatsService.consultant_ranking(start_date, range_end, include_excluded=include_excluded)
+        }
+    
+    raise ValueError('Tipo di report non valido')
+
+def _export_filename(report_type, start_date, range_end, export_format):
+    """Nome del file esportato"""
+    end_date = range_end - timedelta(days=1)
+    return f"report_{report_type}_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.{export_format}"
+
+def _job_response(job, endpoint='admin.job_status'):
+    """Risposta 202 per un job accodato"""
+    return jsonify({
+        'success': True,
+        'job': job.to_dict(),
+        'status_url': url_for(endpoint, job_id=job.id)
+    }), 202
+
 @bp.route('/reports/generate', methods=['POST'])
 @login_required
 @admin_required
 def generate_report():
-    """Genera report basato sui parametri"""
+    """Genera report basato sui parametri (in background con background=on)"""
     try:
-        report_type = request.form.get('report_type')
-        start_date = request.form.get('start_date')
-        end_date = request.form.get('end_date')
-        include_excluded = request.form.get('include_excluded') == 'on'
-        
-        if not all([report_type, start_date, end_date]):
-            return jsonify({'error': 'Tutti i campi sono obbligatori'}), 400
-        
-        start_date = datetime.strptime(start_date, '%Y-%m-%d')
-        end_date = datetime.strptime(end_date, '%Y-%m-%d')
-        
-        if report_type == 'appointments':
-            # Costruisci query base
-            query = Appointment.query.filter(
-                Appointment.data_appuntamento.between(start_date, end_date)
-            )
-            
-            # Applica filtro include_in_reports solo se non si vogliono includere gli esclusi
-            if not include_excluded:
-                query = query.filter(Appointment.include_in_reports == True)
-                
-            appointments = query.all()
-            
-            data = {
-                'period': f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}",
-                'total_appointments': len(appointments),
-                'sold_appointments': sum(1 for a in appointments if a.venduto),
-                'concluded_appointments': sum(1 for a in appointments if a.stato in ['concluso', 'completato']),
-                'pending_callbacks': sum(1 for a in appointments if a.stato == 'da richiamare'),
-                'appointments': [{
-                    'nome_cliente': a.nome_cliente,
-                    'data_appuntamento': a.data_appuntamento.strftime('%d/%m/%Y %H:%M'),
-                    'stato': a.stato,
-                    'venduto': 'Sì' if a.venduto else 'No',
-                    'consultants': ', '.join([c.nome for c in a.consultants])
-                } for a in appointments]
-            }
-            
-            return jsonify({'success': True, 'data': data})
+        try:
+            report_type, start_date, range_end, include_excluded = _report_params(request.form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        elif report_type == 'performance':
-            # Report performance consulenti
-            consultants = Consultant.query.all()
-            consultant_stats = []
-            
-            for consultant in consultants:
-                # Filtra appuntamenti per data e include_in_reports se necessario
-                consultant_appointments = [a for a in consultant.appointments 
-                                        if start_date <= a.data_appuntamento <= end_date
-                                        and (include_excluded or a.include_in_reports)]
-                
-                consultant_stats.append({
-                    'nome': consultant.nome,
-                    'total_appointments': len(consultant_appointments),
-                    'sold_appointments': sum(1 for a in consultant_appointments if a.venduto),
-                    'conversion_rate': round((sum(1 for a in consultant_appointments if a.venduto) / len(consultant_appointments) * 100) if consultant_appointments else 0, 2)
-                })
-            
-            data = {
-                'period': f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}",
-                'consultant_stats': consultant_stats
-            }
-            
-            return jsonify({'success': True, 'data': data})
+        if request.form.get('background') == 'on':
+            params = _job_params(request.form, 'report_type', 'start_date', 'end_date', 'include_excluded')
+            return _job_response(JobService.submit('admin_report', params, current_user.id))
         
-        return jsonify({'error': 'Tipo di report non valido'}), 400
+        data = _build_report_data(report_type, start_date, range_end, include_excluded)
+        return jsonify({'success': True, 'data': data})
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/reports/export')
+@login_required
+@admin_required
+def export_report():
+    """Esporta il report in CSV o XLSX in streaming (CSV compresso gzip se accettato)"""
+    from services.export_service import ExportService, EXPORT_MIMETYPES
+    
+    export_format = request.args.get('format', 'csv')
+    
+    try:
+        report_type, start_date, range_end, include_excluded = _report_params(request.args)
+        
+        if request.args.get('background') in ('on', 'true', '1'):
+            params = _job_params(request.args, 'report_type', 'start_date', 'end_date', 'include_excluded', 'format')
+            return _job_response(JobService.submit('report_export', params, current_user.id))
+        
+        chunks = ExportService.export_report(report_type, export_format, start_date, range_end, include_excluded)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    filename = _export_filename(report_type, start_date, range_end, export_format)
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    
+    # Lo XLSX è già compresso (zip)
+    if export_format == 'csv' and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        chunks = ExportService.gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    
+    return Response(stream_with_context(chunks), content_type=EXPORT_MIMETYPES[export_format], headers=headers)
+
+# === JOB IN BACKGROUND ===
+
+def _admin_report_job(params, job):
+    """Job: report completo (senza limite di righe) salvato come JSON"""
+    report_type, start_date, range_end, include_excluded = _report_params(params)
+    job.progress(10, message='Calcolo report', force=True)
+    
+    data = _build_report_data(report_type, start_date, range_end, include_excluded, limit=None)
+    filename = _export_filename(report_type, start_date, range_end, 'json')
+    return job.write_json({'success': True, 'data': data}, filename)
+
+def _report_export_job(params, job):
+    """Job: esportazione CSV/XLSX scritta su disco con progresso per riga"""
+    from services.export_service import ExportService, EXPORT_MIMETYPES
+    
+    report_type, start_date, range_end, include_excluded = _report_params(params)
+    export_format = params.get('format', 'csv')
+    
+    total = None
+    if report_type == 'appointments':
+        total = StatsService.period_stats(date_from=start_date, date_to=range_end,
+                                          include_excluded=include_excluded)['total']
+    
+    chunks = ExportService.export_report(
+        report_type, export_format, start_date, range_end, include_excluded,
+        on_row=lambda count: job.progress(count, total, f'{count} righe esportate')
+    )
+    
+    path = job.result_path(export_format)
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    
+    return {
+        'path': path,
+        'filename': _export_filename(report_type, start_date, range_end, export_format),
+        'mimetype': EXPORT_MIMETYPES[export_format]
+    }
+
+JobService.register('admin_report', _admin_report_job)
+JobService.register('report_export', _report_export_job)
+
+@bp.route('/jobs/<job_id>')
+@login_required
+@admin_required
+def job_status(job_id):
+    """Stato e progresso di un job"""
+    job = JobService.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job non trovato'}), 404
+    
+    data = job.to_dict()
+    if data['has_result']:
+        data['download_url'] = url_for('admin.job_download', job_id=job.id)
+    return jsonify(data)
+
+@bp.route('/jobs/<job_id>/download')
+@login_required
+@admin_required
+def job_download(job_id):
+    """Scarica il risultato di un job completato"""
+    job = JobService.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job non trovato'}), 404
+    if not job.to_dict()['has_result'] or not os.path.exists(job.result_path):
+        return jsonify({'error': 'Risultato non disponibile'}), 409
+    
+    return send_file(job.result_path, mimetype=job.result_mimetype,
+                     as_attachment=True, download_name=job.result_name)
+
 # === IMPOSTAZIONI SISTEMA ===
 
 @bp.route('/settings')
@@ -822,11 +982,15 @@ def _get_system_info():
 def _get_database_stats():
     """Statistiche database"""
     try:
+        counts = StatsService.global_counts()
+        database = BackupService.database_stats()
         return {
-            'total_users': User.query.count(),
-            'total_consultants': Consultant.query.count(), 
-            'total_appointments': Appointment.query.count(),
-            'db_size': 'N/A'
+            'total_users': counts['total_users'],
+            'total_consultants': counts['total_consultants'],
+            'total_appointments': counts['total_appointments'],
+            'db_backend': database['backend'],
+            'db_version': database['version'],
+            'db_size': database['size']
         }
     except Exception:
         return {'error': 'Impossibile recuperare stats database'}
@@ -846,14 +1010,7 @@ def _get_vpn_status():
 
 def _get_backup_info():
     """Informazioni backup"""
-    import glob
-    
-    backup_dir = 'backups'
-    if not os.path.exists(backup_dir):
-        return {'last_backup': None, 'backup_count': 0}
-    
-    backups = glob.glob(os.path.join(backup_dir, '*.db'))
-    backups.sort(key=os.path.getmtime, reverse=True)
+    backups = BackupService.list_backups()
     
     return {
         'last_backup': os.path.basename(backups[0]) if backups else None,
@@ -861,23 +1018,8 @@ def _get_backup_info():
     }
 
 def _create_database_backup():
-    """Crea backup database"""
-    import shutil
-    from datetime import datetime
-    
-    backup_dir = 'backups'
-    os.makedirs(backup_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_filename = f'backup_{timestamp}.db'
-    backup_path = os.path.join(backup_dir, backup_filename)
-    
-    db_path = 'instance/appointments.db'
-    if os.path.exists(db_path):
-        shutil.copy2(db_path, backup_path)
-        return backup_filename
-    else:
-        raise Exception('Database non trovato')
+    """Crea backup database (SQLite o PostgreSQL)"""
+    return BackupService.create_backup()
 
 def _clear_application_logs():
     """Pulisce i log dell'applicazione"""
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, render_template, Response
+from flask import Blueprint, request, jsonify, render_template, Response, stream_with_context
 from flask_login import login_required, current_user
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -27,6 +27,27 @@ bp = Blueprint('ai', __name__, url_prefix='/ai')
 # Rate limiting per API AI
 limiter = Limiter(key_func=get_remote_address)
 
+# Streaming SSE: i token vengono raggruppati in parole/frasi, un evento per blocco
+SSE_MIN_CHUNK_CHARS = 24
+SENTENCE_END = ('.', '!', '?', ':', '\n')
+
+def _coalesce_chunks(chunks, min_chars: int = SSE_MIN_CHUNK_CHARS):
+    """Raggruppa i frammenti generati in blocchi che terminano a fine frase o a fine parola"""
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        if buffer.rstrip(' ').endswith(SENTENCE_END):
+            yield buffer
+            buffer = ''
+        elif len(buffer) >= min_chars:
+            # Invia fino all'ultima parola completa, il resto attende i token successivi
+            cut = max(buffer.rfind(' '), buffer.rfind('\n')) + 1
+            if cut:
+                yield buffer[:cut]
+                buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
 @bp.route('/chat', methods=['POST'])
 @login_required
 @limiter.limit("30 per minute")
@@ -83,7 +104,10 @@ def chat():
 @login_required
 @limiter.limit("20 per minute")
 def stream_chat():
-    """Endpoint per chat streaming"""
+    """Endpoint per chat streaming (Server-Sent Events)"""
+    
+    if not ai_service:
+        return jsonify({'error': 'Servizio AI non disponibile'}), 503
     
     def generate():
         try:
@@ -101,8 +125,8 @@ def stream_chat():
             # Inizia streaming
             yield f"data: {json.dumps({'type': 'start', 'message': 'Sto pensando...'})}\n\n"
             
-            # Stream risposta carattere per carattere
-            for chunk in ai_service.generate_response_stream(message, context):
+            # Stream risposta per parole/frasi, appena generate
+            for chunk in _coalesce_chunks(ai_service.generate_response_stream(message, context)):
                 yield f"data: {json.dumps({'type': 'chunk', 'content': chunk})}\n\n"
             
             # Fine stream
@@ -112,7 +136,10 @@ def stream_chat():
             logger.error(f"Errore AI streaming: {e}")
             yield f"data: {json.dumps({'type': 'error', 'message': 'Errore servizio AI'})}\n\n"
     
-    return Response(generate(), mimetype='text/event-stream')
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: eventi inoltrati senza buffering
+    return response
 
 @bp.route('/voice-input', methods=['POST'])
 @login_required
@@ -188,6 +215,30 @@ def text_to_speech():
         logger.error(f"Errore TTS: {e}")
         return jsonify({'error': 'Errore sintesi vocale'}), 500
 
+@bp.route('/status')
+@login_required
+def status():
+    """Stato di prontezza del modello AI (le chat usano il fallback finché non è pronto)"""
+    
+    if not ai_service:
+        return jsonify({'ready': False, 'state': 'unavailable', 'error': 'Servizio AI non disponibile'}), 503
+    
+    return jsonify(ai_service.get_status())
+
+@bp.route('/warmup', methods=['POST'])
+@login_required
+def warmup():
+    """Avvia il caricamento del modello AI in background (solo admin)"""
+    
+    if not current_user.is_admin():
+        return jsonify({'error': 'Accesso negato'}), 403
+    
+    if not ai_service:
+        return jsonify({'error': 'Servizio AI non disponibile'}), 503
+    
+    result = ai_service.warmup()
+    return jsonify(result), 200 if result['ready'] else 202
+
 @bp.route('/context-data')
 @login_required
 @limiter.limit("60 per minute")
@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from flask_login import login_required, current_user
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -6,7 +6,15 @@ from models.appointment import Appointment, OtherAppointment
 from models.consultant import Consultant
 from models.client import Client
 from models.user import db
-from datetime import datetime
+from sqlalchemy.orm import joinedload
+from services.appointment_service import AppointmentService
+from services.search_service import SearchService, DEFAULT_LIMIT
+from services.stats_service import StatsService
+from models.search import SEARCH_KIND_CODES
+from utils import CursorPaginationHelper
+from utils.etag import conditional_get
+from datetime import datetime, timedelta
+import json
 
 bp = Blueprint('api', __name__)
 
@@ -16,20 +24,51 @@ limiter = Limiter(key_func=get_remote_address)
 @bp.route('/appointments', methods=['GET', 'POST'])
 @login_required
 @limiter.limit("100 per minute")
+@conditional_get('appointments')
 def api_appointments():
     """API per gestione appuntamenti"""
     
     if request.method == 'GET':
         # Filtra per permessi utente
         if current_user.is_admin():
-            appointments = Appointment.query.all()
+            scope_consultant_id = None
         elif current_user.is_dealer() and current_user.consultant:
-            appointments = current_user.consultant.appointments
+            scope_consultant_id = current_user.consultant.id
         else:
             return jsonify({'error': 'Accesso negato'}), 403
         
+        try:
+            filters = _parse_appointment_filters(request.args)
+            cursor = CursorPaginationHelper.decode(request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = AppointmentService.build_filtered_query(filters, scope_consultant_id)
+        query = AppointmentService.apply_keyset(query, cursor)
+        
+        # Modalità streaming NDJSON: una riga JSON per appuntamento
+        if request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', ''):
+            return Response(
+                stream_with_context(_stream_appointments_ndjson(query)),
+                mimetype='application/x-ndjson'
+            )
+        
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        appointments = query.limit(limit + 1).all()
+        has_more = len(appointments) > limit
+        appointments = appointments[:limit]
+        
+        next_cursor = None
+        if has_more:
+            last = appointments[-1]
+            next_cursor = CursorPaginationHelper.encode(last.data_appuntamento, last.id)
+        
         result = [appointment.to_dict() for appointment in appointments]
-        return jsonify({'appointments': result})
+        return jsonify({
+            'appointments': result,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        })
     
     elif request.method == 'POST':
         if not current_user.has_permission('manage_appointments'):
@@ -155,12 +194,13 @@ def api_appointment_detail(id):
 @bp.route('/consultants', methods=['GET', 'POST'])
 @login_required
 @limiter.limit("100 per minute")
+@conditional_get('consultants')
 def api_consultants():
     """API per gestione consulenti"""
     
     if request.method == 'GET':
         if current_user.is_admin():
-            consultants = Consultant.query.all()
+            consultants = Consultant.query.options(joinedload(Consultant.posizione)).all()
         elif current_user.is_dealer() and current_user.consultant:
             consultants = [current_user.consultant]
         else:
@@ -179,7 +219,7 @@ def api_consultants():
                 'phone': consultant.phone,
                 'email': consultant.email,
                 'CF': consultant.CF,
-                'stats': consultant.get_appointments_stats()
+                'stats': StatsService.consultant_summary(consultant.id)  # Aggregato in cache
             }
             result.append(data)
         
@@ -225,40 +265,100 @@ def api_consultants():
 @bp.route('/clients', methods=['GET'])
 @login_required
 @limiter.limit("100 per minute")
+@conditional_get('clients')
 def api_clients():
     """API per clienti"""
     
-    clients = Client.query.all()
+    clients = Client.query.order_by(Client.nome).all()
     result = [client.to_dict() for client in clients]
     
     return jsonify({'clients': result})
 
+@bp.route('/search', methods=['GET'])
+@login_required
+@limiter.limit("300 per minute")
+def api_search():
+    """Ricerca globale type-ahead su appuntamenti, clienti, note e follow-up"""
+    
+    if current_user.is_admin():
+        scope_consultant_id = None
+    elif current_user.is_dealer() and current_user.consultant:
+        scope_consultant_id = current_user.consultant.id
+    else:
+        return jsonify({'error': 'Accesso negato'}), 403
+    
+    text = request.args.get('q', '').strip()
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    
+    types = [t for t in request.args.get('types', '').split(',') if t]
+    invalid = [t for t in types if t not in SEARCH_KIND_CODES]
+    if invalid:
+        return jsonify({'error': f"Tipi non validi: {', '.join(invalid)}"}), 400
+    
+    try:
+        results = SearchService.search(text, types or None, scope_consultant_id, limit)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({'query': text, 'results': results})
+
 @bp.route('/stats/dashboard')
 @login_required
 @limiter.limit("50 per minute")
+@conditional_get('dashboard')
 def api_dashboard_stats():
     """API per statistiche dashboard"""
     
+    # Contatori in cache, invalidati al commit di appuntamenti/consulenti/clienti
     if current_user.is_admin():
-        data = {
-            'total_appointments': Appointment.query.count(),
-            'total_consultants': Consultant.query.count(),
-            'total_clients': Client.query.count(),
-            'sold_appointments': Appointment.query.filter_by(venduto=True).count()
-        }
+        counts = StatsService.global_counts()
+        data = {key: counts[key] for key in
+                ('total_appointments', 'total_consultants', 'total_clients', 'sold_appointments')}
     elif current_user.is_dealer() and current_user.consultant:
-        appointments = current_user.consultant.appointments
+        stats = StatsService.consultant_summary(current_user.consultant.id)
         data = {
-            'total_appointments': len(appointments),
-            'sold_appointments': len([a for a in appointments if a.venduto]),
+            'total_appointments': stats['total'],
+            'sold_appointments': stats['sold'],
             'consultant_name': current_user.consultant.nome,
-            'stats': current_user.consultant.get_appointments_stats()
+            'stats': stats
         }
     else:
         return jsonify({'error': 'Accesso negato'}), 403
     
     return jsonify(data)
 
+def _parse_appointment_filters(args):
+    """Estrae i filtri appuntamenti dalla query string (date come intervallo [da, a])"""
+    filters = {}
+    
+    try:
+        if args.get('date_from'):
+            filters['date_from'] = datetime.strptime(args['date_from'], '%Y-%m-%d')
+        if args.get('date_to'):
+            filters['date_to'] = datetime.strptime(args['date_to'], '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        raise ValueError('Formato data non valido. Usare YYYY-MM-DD')
+    
+    filters['stato'] = args.get('stato')
+    filters['tipologia'] = args.get('tipologia')
+    filters['consultant_id'] = args.get('consultant_id', type=int)
+    
+    venduto = args.get('venduto')
+    if venduto is not None and venduto != '':
+        if venduto.lower() in ('true', '1', 'si', 'sì'):
+            filters['venduto'] = True
+        elif venduto.lower() in ('false', '0', 'no'):
+            filters['venduto'] = False
+        else:
+            raise ValueError('Valore venduto non valido. Usare true/false')
+    
+    return filters
+
+def _stream_appointments_ndjson(query):
+    """Genera le righe NDJSON leggendo gli appuntamenti a blocchi"""
+    for appointment in AppointmentService.iter_appointments(query):
+        yield json.dumps(appointment.to_dict(), ensure_ascii=False) + '\n'
+
 # Error handlers per API
 @bp.errorhandler(429)
 def ratelimit_handler(e):
@@ -1,8 +1,15 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, send_file
 from flask_login import login_required, current_user
 from models.user import db
+from models.consultant import Consultant
+from services.appointment_service import AppointmentService
+from services.job_service import JobService
+from services.stats_service import StatsService
+from services.sync_service import SyncService
 from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
 import calendar
+import os
 
 bp = Blueprint('dealer', __name__)
 
@@ -47,13 +54,13 @@ def dashboard():
     
     # Aggiunge dati per grafici mobile
     if current_user.consultant:
-        appointments = current_user.consultant.appointments
+        consultant_id = current_user.consultant.id
         
         # Statistiche settimanali per grafico mobile
-        weekly_stats = _get_weekly_stats(appointments)
+        weekly_stats = _get_weekly_stats(consultant_id)
         
         # Performance mensile
-        monthly_performance = _get_monthly_performance(appointments)
+        monthly_performance = _get_monthly_performance(consultant_id)
         
         data.update({
             'weekly_stats': weekly_stats,
@@ -82,11 +89,9 @@ def stats():
         flash('Nessun consulente associato al tuo account.', 'warning')
         return redirect(url_for('dealer.dashboard'))
     
-    appointments = current_user.consultant.appointments
-    
     # Filtri per periodo
     period = request.args.get('period', 'month')  # month, quarter, year
-    stats_data = _calculate_period_stats(appointments, period)
+    stats_data = _calculate_period_stats(current_user.consultant.id, period)
     
     return render_template('dealer/stats.html', 
                          stats=stats_data, 
@@ -191,11 +196,25 @@ def api_weekly_chart():
     if not current_user.consultant:
         return jsonify({'error': 'No consultant'}), 400
     
-    appointments = current_user.consultant.appointments
-    weekly_data = _get_weekly_stats(appointments)
+    weekly_data = _get_weekly_stats(current_user.consultant.id)
     
     return jsonify(weekly_data)
 
+@bp.route('/api/sync')
+@login_required
+def api_sync():
+    """Sincronizzazione incrementale per l'app mobile: righe cambiate dopo il token 'since'"""
+    if not current_user.consultant:
+        return jsonify({'error': 'No consultant'}), 400
+    
+    consultant_id = current_user.consultant.id
+    try:
+        since = SyncService.decode_token(request.args.get('since'), consultant_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(SyncService.changes(consultant_id, current_user.id, since))
+
 @bp.route('/reports')
 @login_required
 def reports():
@@ -205,39 +224,25 @@ def reports():
         return redirect(url_for('dealer.dashboard'))
     
     # Dati di base per i report
-    appointments = current_user.consultant.appointments
+    consultant_id = current_user.consultant.id
     now = datetime.now()
     
     # Statistiche generali
-    total_appointments = len(appointments)
-    sold_appointments = len([a for a in appointments if a.venduto])
-    conversion_rate = (sold_appointments / total_appointments * 100) if total_appointments > 0 else 0
+    overall = StatsService.period_stats(consultant_id)
     
     # Statistiche per periodo
-    current_month = now.replace(day=1)
-    current_year = now.replace(month=1, day=1)
+    current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    current_year = current_month.replace(month=1)
     
-    monthly_appointments = [a for a in appointments if a.data_appuntamento >= current_month]
-    yearly_appointments = [a for a in appointments if a.data_appuntamento >= current_year]
+    monthly = StatsService.period_stats(consultant_id, date_from=current_month)
+    yearly = StatsService.period_stats(consultant_id, date_from=current_year)
     
     stats = {
-        'total_appointments': total_appointments,
-        'sold_appointments': sold_appointments,
-        'conversion_rate': round(conversion_rate, 2),
-        'monthly': {
-            'total': len(monthly_appointments),
-            'sold': len([a for a in monthly_appointments if a.venduto]),
-            'assistenza': len([a for a in monthly_appointments if a.tipologia == 'Assistenza']),
-            'dimostrazione': len([a for a in monthly_appointments if a.tipologia == 'Dimostrazione']),
-            'consumabili': len([a for a in monthly_appointments if a.tipologia == 'Consumabili'])
-        },
-        'yearly': {
-            'total': len(yearly_appointments),
-            'sold': len([a for a in yearly_appointments if a.venduto]),
-            'assistenza': len([a for a in yearly_appointments if a.tipologia == 'Assistenza']),
-            'dimostrazione': len([a for a in yearly_appointments if a.tipologia == 'Dimostrazione']),
-            'consumabili': len([a for a in yearly_appointments if a.tipologia == 'Consumabili'])
-        }
+        'total_appointments': overall['total'],
+        'sold_appointments': overall['sold'],
+        'conversion_rate': round(overall['conversion_rate'], 2),
+        'monthly': _summary_counts(monthly),
+        'yearly': _summary_counts(yearly)
     }
     
     return render_template('dealer/reports.html', 
@@ -245,17 +250,9 @@ def reports():
                          consultant=current_user.consultant,
                          current_date=now.strftime('%d/%m/%Y'))
 
-@bp.route('/reports/generate', methods=['POST'])
-@login_required
-def generate_report():
-    """Genera report specifico per dealer"""
-    if not current_user.consultant:
-        return jsonify({'error': 'Nessun consulente associato'}), 400
-    
-    report_type = request.form.get('report_type')
-    period = request.form.get('period', 'month')
-    
-    appointments = current_user.consultant.appointments
+def _build_dealer_report(consultant, report_type, period):
+    """Dati del report personale del consulente; ValueError se il tipo non è valido"""
+    consultant_id = consultant.id
     now = datetime.now()
     
     # Determina il periodo
@@ -273,37 +270,25 @@ def generate_report():
         start_date = now.replace(month=1, day=1)
         period_name = f"Anno {now.year}"
     
-    # Filtra appuntamenti per periodo
-    period_appointments = [a for a in appointments if a.data_appuntamento >= start_date]
-    
     if report_type == 'performance':
         # Report performance personale
-        data = {
+        stats = StatsService.period_stats(consultant_id, date_from=start_date)
+        return {
             'period': period_name,
-            'consultant_name': current_user.consultant.nome,
-            'total_appointments': len(period_appointments),
-            'sold_appointments': len([a for a in period_appointments if a.venduto]),
-            'conversion_rate': round((len([a for a in period_appointments if a.venduto]) / len(period_appointments) * 100) if period_appointments else 0, 2),
-            'by_type': {
-                'assistenza': {
-                    'total': len([a for a in period_appointments if a.tipologia == 'Assistenza']),
-                    'sold': len([a for a in period_appointments if a.tipologia == 'Assistenza' and a.venduto])
-                },
-                'dimostrazione': {
-                    'total': len([a for a in period_appointments if a.tipologia == 'Dimostrazione']),
-                    'sold': len([a for a in period_appointments if a.tipologia == 'Dimostrazione' and a.venduto])
-                },
-                'consumabili': {
-                    'total': len([a for a in period_appointments if a.tipologia == 'Consumabili']),
-                    'sold': len([a for a in period_appointments if a.tipologia == 'Consumabili' and a.venduto])
-                }
-            },
-            'nominativi_raccolti': sum([a.nominativi_raccolti or 0 for a in period_appointments]),
-            'appuntamenti_personali': sum([a.appuntamenti_personali or 0 for a in period_appointments])
+            'consultant_name': consultant.nome,
+            'total_appointments': stats['total'],
+            'sold_appointments': stats['sold'],
+            'conversion_rate': round(stats['conversion_rate'], 2),
+            'by_type': stats['by_type'],
+            'nominativi_raccolti': stats['nominativi_raccolti'],
+            'appuntamenti_personali': stats['appuntamenti_personali']
         }
         
     elif report_type == 'activity':
         # Report attività dettagliato
+        period_appointments = AppointmentService.build_filtered_query(
+            {'date_from': start_date}, consultant_id
+        ).all()
         appointments_list = []
         for appointment in period_appointments:
             appointments_list.append({
@@ -317,85 +302,154 @@ def generate_report():
                 'appuntamenti_personali': appointment.appuntamenti_personali or 0
             })
         
-        data = {
+        return {
             'period': period_name,
-            'consultant_name': current_user.consultant.nome,
+            'consultant_name': consultant.nome,
             'appointments': appointments_list
         }
     
-    else:
-        return jsonify({'error': 'Tipo di report non valido'}), 400
+    raise ValueError('Tipo di report non valido')
+
+@bp.route('/reports/generate', methods=['POST'])
+@login_required
+def generate_report():
+    """Genera report specifico per dealer (in background con background=on)"""
+    if not current_user.consultant:
+        return jsonify({'error': 'Nessun consulente associato'}), 400
+    
+    report_type = request.form.get('report_type')
+    period = request.form.get('period', 'month')
+    
+    if request.form.get('background') == 'on':
+        if report_type not in ('performance', 'activity'):
+            return jsonify({'error': 'Tipo di report non valido'}), 400
+        
+        params = {'report_type': report_type, 'period': period, 'consultant_id': current_user.consultant.id}
+        job = JobService.submit('dealer_report', params, current_user.id)
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(),
+            'status_url': url_for('dealer.job_status', job_id=job.id)
+        }), 202
+    
+    try:
+        data = _build_dealer_report(current_user.consultant, report_type, period)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({'success': True, 'data': data})
 
+def _dealer_report_job(params, job):
+    """Job: report personale del consulente salvato come JSON"""
+    consultant = db.session.get(Consultant, params['consultant_id'])
+    if not consultant:
+        raise ValueError('Consulente non trovato')
+    
+    job.progress(10, message='Calcolo report', force=True)
+    data = _build_dealer_report(consultant, params['report_type'], params.get('period', 'month'))
+    return job.write_json({'success': True, 'data': data}, f"report_{params['report_type']}_{params.get('period', 'month')}.json")
+
+JobService.register('dealer_report', _dealer_report_job)
+
+def _own_job(job_id):
+    """Job dell'utente corrente (None se non esiste o appartiene ad altri)"""
+    job = JobService.get_job(job_id)
+    if not job or job.created_by != current_user.id:
+        return None
+    return job
+
+@bp.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Stato e progresso di un proprio job"""
+    job = _own_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job non trovato'}), 404
+    
+    data = job.to_dict()
+    if data['has_result']:
+        data['download_url'] = url_for('dealer.job_download', job_id=job.id)
+    return jsonify(data)
+
+@bp.route('/jobs/<job_id>/download')
+@login_required
+def job_download(job_id):
+    """Scarica il risultato di un proprio job completato"""
+    job = _own_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job non trovato'}), 404
+    if not job.to_dict()['has_result'] or not os.path.exists(job.result_path):
+        return jsonify({'error': 'Risultato non disponibile'}), 409
+    
+    return send_file(job.result_path, mimetype=job.result_mimetype,
+                     as_attachment=True, download_name=job.result_name)
+
 # Utility functions
-def _get_weekly_stats(appointments):
+def _summary_counts(stats):
+    """Contatori sintetici (totale, venduti, per tipologia) da un bucket di StatsService"""
+    return {
+        'total': stats['total'],
+        'sold': stats['sold'],
+        'assistenza': stats['assistenza'],
+        'dimostrazione': stats['dimostrazione'],
+        'consumabili': stats['consumabili']
+    }
+
+def _get_weekly_stats(consultant_id):
     """Calcola statistiche settimanali"""
     now = datetime.now()
-    week_start = now - timedelta(days=now.weekday())
+    week_start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    week_end = week_start + timedelta(days=7)
+    
+    buckets = StatsService.bucketed_stats(consultant_id, week_start, week_end, 'day')
     
     daily_stats = {}
     for i in range(7):
         day = week_start + timedelta(days=i)
-        day_appointments = [a for a in appointments 
-                          if a.data_appuntamento.date() == day.date()]
-        
-        daily_stats[day.strftime('%A')] = {
-            'total': len(day_appointments),
-            'sold': len([a for a in day_appointments if a.venduto]),
-            'assistenza': len([a for a in day_appointments if a.tipologia == 'Assistenza']),
-            'dimostrazione': len([a for a in day_appointments if a.tipologia == 'Dimostrazione']),
-            'consumabili': len([a for a in day_appointments if a.tipologia == 'Consumabili'])
-        }
+        stats = buckets.get(StatsService.bucket_key(day, 'day'), StatsService.empty_bucket())
+        daily_stats[day.strftime('%A')] = _summary_counts(stats)
     
     return daily_stats
 
-def _get_monthly_performance(appointments):
+def _get_monthly_performance(consultant_id):
     """Performance mensile per grafico"""
     now = datetime.now()
-    months_data = []
+    current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    window_start = current_month - relativedelta(months=5)
+    window_end = current_month + relativedelta(months=1)
     
-    for i in range(6):  # Ultimi 6 mesi
-        month_date = now.replace(day=1) - timedelta(days=i*30)
-        month_start = month_date.replace(day=1)
-        
-        if month_date.month == 12:
-            month_end = month_date.replace(year=month_date.year+1, month=1, day=1) - timedelta(days=1)
-        else:
-            month_end = month_date.replace(month=month_date.month+1, day=1) - timedelta(days=1)
-        
-        month_appointments = [a for a in appointments 
-                            if month_start <= a.data_appuntamento <= month_end]
+    buckets = StatsService.bucketed_stats(consultant_id, window_start, window_end, 'month')
+    
+    months_data = []
+    for i in range(6):  # Ultimi 6 mesi, in ordine cronologico
+        month_date = window_start + relativedelta(months=i)
+        stats = buckets.get(StatsService.bucket_key(month_date, 'month'), StatsService.empty_bucket())
         
         months_data.append({
             'month': calendar.month_name[month_date.month],
             'year': month_date.year,
-            'total': len(month_appointments),
-            'sold': len([a for a in month_appointments if a.venduto]),
-            'revenue': sum([1000 for a in month_appointments if a.venduto])  # Mock revenue
+            'total': stats['total'],
+            'sold': stats['sold'],
+            'revenue': stats['sold'] * 1000  # Mock revenue
         })
     
-    return list(reversed(months_data))
+    return months_data
 
-def _calculate_period_stats(appointments, period):
+def _calculate_period_stats(consultant_id, period):
     """Calcola statistiche per periodo specificato"""
     now = datetime.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     
     if period == 'month':
-        start_date = now.replace(day=1)
+        start_date = month_start
     elif period == 'quarter':
         quarter_month = ((now.month - 1) // 3) * 3 + 1
-        start_date = now.replace(month=quarter_month, day=1)
+        start_date = month_start.replace(month=quarter_month)
     else:  # year
-        start_date = now.replace(month=1, day=1)
+        start_date = month_start.replace(month=1)
     
-    period_appointments = [a for a in appointments if a.data_appuntamento >= start_date]
+    stats = StatsService.period_stats(consultant_id, date_from=start_date)
     
-    return {
-        'total': len(period_appointments),
-        'sold': len([a for a in period_appointments if a.venduto]),
-        'assistenza': len([a for a in period_appointments if a.tipologia == 'Assistenza']),
-        'dimostrazione': len([a for a in period_appointments if a.tipologia == 'Dimostrazione']),
-        'consumabili': len([a for a in period_appointments if a.tipologia == 'Consumabili']),
-        'conversion_rate': (len([a for a in period_appointments if a.venduto]) / len(period_appointments) * 100) if period_appointments else 0
-    }
+    result = _summary_counts(stats)
+    result['conversion_rate'] = stats['conversion_rate']
+    return result
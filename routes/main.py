@@ -6,6 +6,9 @@ from models.consultant import Consultant
 from models.client import Client
 from models.note_event import note_event
 from services.appointment_service import AppointmentService
+from services.calendar_service import CalendarService
+from services.client_service import ClientService
+from utils import DateUtils
 from datetime import datetime
 import json
 
@@ -31,7 +34,7 @@ def index():
     today = datetime.today().date()
     recall_appointments = Appointment.query.filter(
         Appointment.stato.ilike('da richiamare'),
-        db.func.date(Appointment.data_richiamo) == today
+        *DateUtils.range_filter(Appointment.data_richiamo, *DateUtils.day_range(today))
     ).all()
     
     current_date = today.strftime('%d/%m/%Y')
@@ -43,6 +46,9 @@ def index():
 @bp.route('/calendar', methods=['GET', 'POST'])
 @login_required
 def calendar():
+    # Gli eventi vengono caricati dal feed per la sola finestra visibile
+    default_date = None
+    
     if request.method == 'POST':
         month = request.form.get('month')
         year = request.form.get('year')
@@ -55,32 +61,27 @@ def calendar():
             except ValueError:
                 flash("Data non valida")
                 return redirect(url_for('main.calendar'))
-                
-            appointments = Appointment.query.filter(
-                db.func.extract('month', Appointment.data_appuntamento) == month,
-                db.func.extract('year', Appointment.data_appuntamento) == year
-            ).all()
             
-            oapps = OtherAppointment.query.filter(
-                db.func.extract('month', OtherAppointment.data_appuntamento) == month,
-                db.func.extract('year', OtherAppointment.data_appuntamento) == year
-            ).all()
-            
-            if not appointments and not oapps:
-                flash("Nessun appuntamento trovato per questa data.")
-                return redirect(url_for('main.calendar'))
-        else:
-            appointments = Appointment.query.all()
-            oapps = OtherAppointment.query.all()
-    else:
-        appointments = Appointment.query.all()
-        oapps = OtherAppointment.query.all()
-        
-    if not appointments and not oapps:
-        flash("Nessun appuntamento trovato.")
-        return render_template('calendar.html', appointments=[], oapps=[], datetime=datetime)
-        
-    return render_template('calendar.html', appointments=appointments, oapps=oapps, datetime=datetime)
+            default_date = DateUtils.month_range(year, month)[0].strftime('%Y-%m-%d')
+    
+    return render_template('calendar.html', default_date=default_date, datetime=datetime)
+
+@bp.route('/calendar/feed')
+@login_required
+def calendar_feed():
+    """Eventi (appuntamenti, altri appuntamenti, note, follow-up) della finestra [start, end)"""
+    try:
+        start = datetime.strptime(request.args.get('start', '')[:10], '%Y-%m-%d')
+        end = datetime.strptime(request.args.get('end', '')[:10], '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'Formato data non valido, usare YYYY-MM-DD'}), 400
+    
+    try:
+        events = CalendarService.get_feed(start, end)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(events)
 
 @bp.route('/service')
 @login_required
@@ -100,97 +101,31 @@ def events():
     except ValueError:
         return jsonify(events=[])
     
-    # Eventi da diverse fonti
-    events = []
-    
-    # Appuntamenti
-    appointments = Appointment.query.filter(db.func.date(Appointment.data_appuntamento) == selected_date).all()
-    for appointment in appointments:
-        events.append({
-            'id': appointment.id,
-            'title': appointment.nome_cliente,
-            'start': appointment.data_appuntamento.strftime('%Y-%m-%d'),
-            'type': appointment.tipologia,
-            'note': appointment.note
-        })
-    
-    # Altri appuntamenti
-    for oapp in OtherAppointment.query.filter(db.func.date(OtherAppointment.data_appuntamento) == selected_date).all():
-        events.append({
-            'id': oapp.id,
-            'title': oapp.nome_cliente,
-            'start': oapp.data_appuntamento.strftime('%Y-%m-%d'),
-            'type': oapp.tipologia,
-            'note': oapp.note
-        })
-    
-    # Note eventi
-    for note in note_event.query.filter(db.func.date(note_event.data) == selected_date).all():
-        events.append({
-            'id': note.id,
-            'title': note.note,
-            'start': note.data.strftime('%Y-%m-%d'),
-            'type': 'note',
-            'note': note.note
-        })
-    
-    # Follow-up
-    from models.followup import FollowUp
-    for fu in FollowUp.query.filter(db.func.date(FollowUp.data_prevista) == selected_date, FollowUp.done == False).all():
-        events.append({
-            'id': f'f{fu.id}',
-            'title': f"Follow-up {fu.numero} - {fu.appointment.nome_cliente}",
-            'start': fu.data_prevista.strftime('%Y-%m-%d'),
-            'type': 'followup'
-        })
-    
-    return jsonify(events=events)
+    return jsonify(events=CalendarService.get_day_events(*DateUtils.day_range(selected_date)))
 
 @bp.route('/clients', methods=['GET'])
 @login_required
 def clients():
-    all_clients = Client.query.all()
-    
-    # Clienti con vendite
-    sold_appts = Appointment.query.filter_by(venduto=True).with_entities(Appointment.nome_cliente).all()
-    sold_other = OtherAppointment.query.filter_by(venduto=True).with_entities(OtherAppointment.nome_cliente).all()
-    sold_names = set([name for (name,) in sold_appts] + [name for (name,) in sold_other])
-    
     # Filtri
-    search = request.args.get('search', '').strip().lower()
+    search = request.args.get('search', '').strip()
     venduto_arg = request.args.get('venduto')
+    page = request.args.get('page', 1, type=int)
+    per_page = 25
     
-    filtered = []
-    for client in all_clients:
-        # Ricerca
-        fields = [
-            client.nome,
-            client.indirizzo or '', 
-            client.numero_telefono or '', 
-            client.email or '',
-            client.data_registrazione.strftime('%d/%m/%Y'),
-            client.note or ''
-        ]
-        text = ' '.join(fields).lower()
-        
-        if search and search not in text:
-            continue
-            
-        # Filtro venduto
-        if venduto_arg == 'true' and client.nome not in sold_names:
-            continue
-        if venduto_arg == 'false' and client.nome in sold_names:
-            continue
-            
-        filtered.append(client)
+    venduto = {'true': True, 'false': False}.get(venduto_arg)
+    
+    # Ricerca full-text ordinata per rilevanza, paginata in SQL
+    pagination = ClientService.build_search_query(search, venduto).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
     
-    clients = filtered
+    clients = pagination.items
     if not clients:
         flash("Nessun cliente trovato.")
     
     return render_template('clients.html', 
                          clients=clients, 
-                         sold_names=sold_names, 
+                         pagination=pagination,
                          datetime=datetime,
                          search=search, 
                          venduto=venduto_arg)
@@ -307,7 +242,7 @@ def appointments():
         try:
             day_date = datetime.strptime(day, '%Y-%m-%d').date()
             apps = Appointment.query.filter(
-                db.func.date(Appointment.data_appuntamento) == day_date
+                *DateUtils.range_filter(Appointment.data_appuntamento, *DateUtils.day_range(day_date))
             ).all()
         except ValueError:
             flash("Formato data non valido, usare YYYY-MM-DD", 'error')
@@ -14,8 +14,10 @@ Caratteristiche:
 Avvio: python run.py
 """
 
+import importlib.util
 import os
 import sys
+import click
 from flask import Flask, request, render_template
 from flask_migrate import Migrate
 
@@ -25,10 +27,10 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from app import create_app
 from models.user import db
 
-# Socket.IO per funzionalità real-time
+# Socket.IO per funzionalità real-time (SOCKETIO_ENABLED=0 per disattivarlo)
 try:
     from flask_socketio import SocketIO
-    SOCKETIO_AVAILABLE = True
+    SOCKETIO_AVAILABLE = os.getenv('SOCKETIO_ENABLED', '1') != '0'
 except ImportError:
     SOCKETIO_AVAILABLE = False
 
@@ -40,17 +42,14 @@ migrate = Migrate(app, db)
 
 # Inizializza SocketIO se disponibile
 if SOCKETIO_AVAILABLE:
-    socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
+    # Con più processi gli eventi passano da una coda condivisa (es. redis://localhost:6379/0)
+    # async_mode: eventlet se installato, altrimenti threading (SOCKETIO_ASYNC_MODE per forzarlo)
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode=os.getenv('SOCKETIO_ASYNC_MODE'),
+                        message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE'))
     
-    @socketio.on('connect')
-    def handle_connect():
-        """Gestisce connessione Socket.IO"""
-        pass
-    
-    @socketio.on('disconnect')
-    def handle_disconnect():
-        """Gestisce disconnessione Socket.IO"""
-        pass
+    # Eventi real-time su appuntamenti, follow-up e contatori dashboard
+    from services.realtime_service import RealtimeService
+    RealtimeService.init_socketio(socketio)
 else:
     socketio = None
 
@@ -220,6 +219,161 @@ def init_demo_data():
         username = consultant.nome.lower().replace(' ', '.')
         print(f"- {username}/demo123 (Dealer - {consultant.nome})")
 
+# Query più frequenti, usate per confrontare i piani di esecuzione prima/dopo gli indici
+HOT_QUERIES = [
+    ('Appuntamenti per intervallo date',
+     "SELECT id FROM appointment WHERE data_appuntamento >= :start AND data_appuntamento < :end"),
+    ('Pagina keyset appuntamenti',
+     "SELECT id FROM appointment WHERE data_appuntamento > :start ORDER BY data_appuntamento, id LIMIT 100"),
+    ('Appuntamenti per stato',
+     "SELECT id FROM appointment WHERE stato = 'da richiamare' AND data_richiamo >= :start AND data_richiamo < :end"),
+    ('Conteggio venduti',
+     "SELECT COUNT(*) FROM appointment WHERE venduto = 1"),
+    ('Vendite per nome cliente',
+     "SELECT 1 FROM appointment WHERE nome_cliente = :name AND venduto = 1 LIMIT 1"),
+    ('Storico per telefono',
+     "SELECT id FROM appointment WHERE numero_telefono = :phone ORDER BY data_appuntamento DESC"),
+    ('Appuntamenti per consulente',
+     "SELECT appointment_id FROM appointment_consultant WHERE consultant_id = :id"),
+    ('Follow-up pendenti',
+     "SELECT id FROM follow_up WHERE done = 0 AND data_prevista < :end ORDER BY data_prevista"),
+    ('Follow-up per appuntamento',
+     "SELECT id FROM follow_up WHERE appointment_id = :id AND numero = 1"),
+    ('Eventi per giorno',
+     "SELECT id FROM note_event WHERE data >= :start AND data < :end"),
+    ('Cliente per telefono',
+     "SELECT id FROM client WHERE numero_telefono = :phone"),
+]
+
+def _explain_hot_queries():
+    """Piani EXPLAIN QUERY PLAN (solo SQLite) per le query più frequenti"""
+    from datetime import datetime, timedelta
+    
+    params = {
+        'start': datetime.now() - timedelta(days=30),
+        'end': datetime.now(),
+        'name': '',
+        'phone': '',
+        'id': 0
+    }
+    
+    plans = {}
+    with db.engine.connect() as conn:
+        for label, sql in HOT_QUERIES:
+            rows = conn.execute(db.text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+            plans[label] = ' | '.join(row[-1] for row in rows)
+    return plans
+
+@app.cli.command()
+def create_indexes():
+    """Crea gli indici mancanti e confronta i piani delle query principali"""
+    from models.database import create_missing_indexes
+    
+    is_sqlite = db.engine.dialect.name == 'sqlite'
+    before = _explain_hot_queries() if is_sqlite else {}
+    
+    print("🗂️  Creazione indici mancanti...")
+    created = create_missing_indexes()
+    
+    if created:
+        for name in created:
+            print(f"   + {name}")
+        if is_sqlite:
+            with db.engine.begin() as conn:
+                conn.execute(db.text("ANALYZE"))
+    else:
+        print("✅ Tutti gli indici sono già presenti")
+    
+    if not is_sqlite:
+        return
+    
+    after = _explain_hot_queries()
+    print("\n📊 EXPLAIN QUERY PLAN (prima → dopo):")
+    for label, _ in HOT_QUERIES:
+        print(f"\n• {label}")
+        print(f"   prima: {before[label]}")
+        print(f"   dopo:  {after[label]}")
+
+@app.cli.command()
+@click.option('--chunk-size', default=1000, show_default=True, help='Appuntamenti per blocco')
+@click.option('--only-future', is_flag=True, help='Solo follow-up con data prevista futura')
+def backfill_followups(chunk_size, only_future):
+    """Pianifica i follow-up mancanti per le vendite storiche, a blocchi"""
+    from datetime import datetime
+    from models.appointment import Appointment
+    from models.followup import bulk_schedule_followups
+    
+    not_before = datetime.now() if only_future else None
+    last_id = 0
+    processed = 0
+    created = 0
+    
+    print("📅 Backfill follow-up per le vendite storiche...")
+    while True:
+        chunk = (Appointment.query
+                 .filter(Appointment.venduto == True, Appointment.id > last_id)
+                 .order_by(Appointment.id)
+                 .limit(chunk_size)
+                 .all())
+        if not chunk:
+            break
+        
+        inserted = bulk_schedule_followups(chunk, not_before=not_before)
+        db.session.commit()
+        
+        last_id = chunk[-1].id
+        processed += len(chunk)
+        created += len(inserted)
+        print(f"   {processed} vendite elaborate, {created} follow-up creati")
+        db.session.expunge_all()
+    
+    print(f"✅ Backfill completato: {created} follow-up creati per {processed} vendite")
+
+@app.cli.command()
+def rebuild_daily_stats():
+    """Ricostruisce da zero l'aggregato giornaliero dei report"""
+    from models.daily_stats import rebuild_daily_stats as rebuild
+    
+    print("📊 Ricostruzione aggregato giornaliero...")
+    with db.engine.begin() as conn:
+        rows = rebuild(conn)
+    print(f"✅ daily_stats ricostruita: {rows} righe")
+
+@app.cli.command()
+@click.option('--days', default=90, show_default=True, help='Giorni di conservazione (minimo 90)')
+def purge_sync_tombstones(days):
+    """Elimina le tracce di eliminazione della sincronizzazione mobile più vecchie di --days"""
+    from services.sync_service import SyncService
+    
+    try:
+        removed = SyncService.purge_expired_tombstones(days)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"🧹 Tracce di sincronizzazione eliminate: {removed}")
+
+def serve_production(host, port, workers=None, threads=None):
+    """Avvio di produzione con gunicorn multi-processo, configurato da gunicorn.conf.py
+
+    Il processo viene sostituito da gunicorn: l'app viene creata in ogni worker dopo la lettura
+    della configurazione, come con `gunicorn -c gunicorn.conf.py run:app`.
+    """
+    if importlib.util.find_spec('gunicorn') is None:
+        print("❌ gunicorn non installato: pip install gunicorn")
+        sys.exit(1)
+    
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    os.environ['WEB_BIND'] = f'{host}:{port}'
+    if workers:
+        os.environ['WEB_WORKERS'] = str(workers)
+    if threads:
+        os.environ['WEB_THREADS'] = str(threads)
+    
+    sys.stdout.flush()
+    os.execv(sys.executable, [sys.executable, '-m', 'gunicorn',
+                              '--config', os.path.join(project_dir, 'gunicorn.conf.py'),
+                              '--chdir', project_dir, 'run:app'])
+
 if __name__ == '__main__':
     import argparse
     
@@ -228,6 +382,9 @@ if __name__ == '__main__':
     parser.add_argument('--port', type=int, default=5000, help='Port number')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
     parser.add_argument('--demo', action='store_true', help='Initialize with demo data')
+    parser.add_argument('--production', action='store_true', help='Production server (gunicorn, multi-worker)')
+    parser.add_argument('--workers', type=int, help='Worker processes in production mode (default: gunicorn.conf.py)')
+    parser.add_argument('--threads', type=int, help='Threads per worker in production mode')
     
     args = parser.parse_args()
     
@@ -260,7 +417,9 @@ if __name__ == '__main__':
 """)
     
     # Avvia l'applicazione
-    if SOCKETIO_AVAILABLE and socketio:
+    if args.production:
+        serve_production(args.host, args.port, args.workers, args.threads)
+    elif SOCKETIO_AVAILABLE and socketio:
         socketio.run(
             app,
             host=args.host,
@@ -9,6 +9,7 @@ from models.consultant import Consultant
 from models.client import Client
 from models.followup import FollowUp
 from models.user import db
+from sqlalchemy.orm import selectinload
 import logging
 
 logger = logging.getLogger(__name__)
@@ -186,81 +187,46 @@ class ReportService:
                               months: int = 6) -> Dict:
         """Report performance mensili"""
         
-        result = []
-        today = datetime.now()
+        from dateutil.relativedelta import relativedelta
+        from services.stats_service import StatsService
+        
+        # Un'unica lettura dell'aggregato giornaliero per tutti i mesi
+        current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        window_start = current_month - relativedelta(months=months - 1)
+        buckets = StatsService.bucketed_stats(consultant_id, window_start,
+                                              current_month + relativedelta(months=1), 'month')
         
+        result = []
         for i in range(months):
-            month_start = today.replace(day=1) - timedelta(days=i*30)
-            month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            query = Appointment.query.filter(
-                Appointment.data_appuntamento >= month_start,
-                Appointment.data_appuntamento <= month_end
-            )
+            month_start = window_start + relativedelta(months=i)
+            stats = buckets.get(StatsService.bucket_key(month_start, 'month'), StatsService.empty_bucket())
             
-            if consultant_id:
-                query = query.join(Appointment.consultants).filter(Consultant.id == consultant_id)
-            
-            appointments = query.all()
-            
-            month_data = {
+            result.append({
                 'month': month_start.strftime('%Y-%m'),
                 'month_name': month_start.strftime('%B %Y'),
-                'total_appointments': len(appointments),
-                'sold_appointments': len([a for a in appointments if a.venduto]),
-                'total_nominativi': sum(a.nominativi_raccolti for a in appointments),
-                'total_personali': sum(a.appuntamenti_personali for a in appointments)
-            }
-            
-            month_data['conversion_rate'] = (
-                month_data['sold_appointments'] / month_data['total_appointments'] * 100
-                if month_data['total_appointments'] > 0 else 0
-            )
-            
-            result.append(month_data)
+                'total_appointments': stats['total'],
+                'sold_appointments': stats['sold'],
+                'total_nominativi': stats['nominativi_raccolti'],
+                'total_personali': stats['appuntamenti_personali'],
+                'conversion_rate': StatsService.conversion_rate(stats['total'], stats['sold'])
+            })
         
-        return {'months': result[::-1]}  # Ordine cronologico
+        return {'months': result}  # Ordine cronologico
     
     @staticmethod
     def get_consultant_ranking(days: int = 30) -> List[Dict]:
         """Classifica consulenti per performance"""
         
-        date_from = datetime.now() - timedelta(days=days)
+        from services.stats_service import StatsService
         
-        consultants = db.session.query(
-            Consultant.id,
-            Consultant.nome,
-            db.func.count(Appointment.id).label('total_appointments'),
-            db.func.sum(db.case([(Appointment.venduto == True, 1)], else_=0)).label('sold_appointments'),
-            db.func.sum(Appointment.nominativi_raccolti).label('total_nominativi')
-        ).join(
-            Consultant.appointments
-        ).filter(
-            Appointment.data_appuntamento >= date_from
-        ).group_by(
-            Consultant.id
-        ).order_by(
-            db.text('sold_appointments DESC')
-        ).all()
+        ranking = StatsService.consultant_ranking(datetime.now() - timedelta(days=days))
         
-        result = []
-        for i, consultant in enumerate(consultants):
-            conversion_rate = (
-                consultant.sold_appointments / consultant.total_appointments * 100
-                if consultant.total_appointments > 0 else 0
-            )
-            
-            result.append({
-                'rank': i + 1,
-                'id': consultant.id,
-                'nome': consultant.nome,
-                'total_appointments': consultant.total_appointments,
-                'sold_appointments': consultant.sold_appointments,
-                'total_nominativi': consultant.total_nominativi or 0,
-                'conversion_rate': round(conversion_rate, 2)
-            })
+        # Solo consulenti con appuntamenti nel periodo
+        active = [entry for entry in ranking if entry['total_appointments']]
+        for i, entry in enumerate(active):
+            entry['rank'] = i + 1
         
-        return result
+        return active
 
 class ClientService:
     """Servizio per gestione clienti"""
@@ -303,18 +269,16 @@ class ClientService:
         if not client:
             raise ValueError("Cliente non trovato")
         
-        # Trova tutti gli appuntamenti correlati
-        appointments = Appointment.query.filter_by(
+        # Trova tutti gli appuntamenti correlati, con follow-up e consulenti caricati in blocco
+        appointments = Appointment.query.options(
+            selectinload(Appointment.followups),
+            selectinload(Appointment.consultants)
+        ).filter_by(
             numero_telefono=client.numero_telefono
         ).order_by(Appointment.data_appuntamento.desc()).all()
         
         # Follow-up correlati
-        followups = []
-        for appointment in appointments:
-            appointment_followups = FollowUp.query.filter_by(
-                appointment_id=appointment.id
-            ).all()
-            followups.extend(appointment_followups)
+        followups = [f for appointment in appointments for f in appointment.followups]
         
         return {
             'client': client.to_dict(),
@@ -0,0 +1,147 @@
+"""
+Dati del CRM per i prompt dell'assistente AI, letti in-process dal service layer
+
+Ogni esigenza individuata nel messaggio (clienti, appuntamenti, statistiche) produce un riepilogo
+testuale compatto; le esigenze di una richiesta vengono caricate in parallelo su un pool di thread,
+ognuno con il proprio contesto applicativo e la propria sessione.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+from flask import current_app
+from models.database import db, appointment_consultant
+from models.appointment import Appointment
+from models.client import Client
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEMS = 10
+FETCH_TIMEOUT = 10  # secondi massimi per l'insieme dei dati di una richiesta
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv('AI_DATA_WORKERS', 4)), thread_name_prefix='ai-data')
+
+class AIDataProvider:
+    """Riepiloghi di clienti, appuntamenti e statistiche visibili all'utente (consultant_id None = tutti)"""
+
+    TITLES = {
+        'clients': 'CLIENTI',
+        'appointments': 'PROSSIMI APPUNTAMENTI',
+        'appointments_today': 'APPUNTAMENTI DI OGGI',
+        'stats': 'STATISTICHE'
+    }
+
+    @staticmethod
+    def fetch(needs: Iterable[str], consultant_id: Optional[int] = None) -> Dict[str, str]:
+        """Riepiloghi delle esigenze indicate, calcolati in parallelo, nell'ordine richiesto"""
+        app = current_app._get_current_object()
+        loaders = {
+            'clients': AIDataProvider.clients_summary,
+            'appointments': AIDataProvider.upcoming_appointments_summary,
+            'appointments_today': AIDataProvider.today_appointments_summary,
+            'stats': AIDataProvider.stats_summary
+        }
+
+        futures = {
+            need: _executor.submit(_run_in_app_context, app, loaders[need], consultant_id)
+            for need in dict.fromkeys(needs) if need in loaders
+        }
+
+        deadline = datetime.now() + timedelta(seconds=FETCH_TIMEOUT)
+        summaries = {}
+        for need, future in futures.items():
+            try:
+                timeout = max(0, (deadline - datetime.now()).total_seconds())
+                summaries[need] = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                logger.warning(f"Dati AI '{need}' non pronti entro {FETCH_TIMEOUT}s")
+                summaries[need] = f"{AIDataProvider.TITLES[need]}: dati non disponibili al momento"
+            except Exception as e:
+                logger.error(f"Errore caricamento dati AI '{need}': {e}")
+                summaries[need] = f"{AIDataProvider.TITLES[need]}: dati non disponibili al momento"
+
+        return summaries
+
+    @staticmethod
+    def clients_summary(consultant_id: Optional[int] = None) -> str:
+        """Numero di clienti e ultimi registrati"""
+        query = Client.query
+        if consultant_id is not None:
+            query = query.filter(Client.id.in_(
+                db.select(Appointment.client_id)
+                .join(appointment_consultant, appointment_consultant.c.appointment_id == Appointment.id)
+                .where(appointment_consultant.c.consultant_id == consultant_id)
+            ))
+
+        total = query.order_by(None).count()
+        clients = query.order_by(Client.data_registrazione.desc()).limit(MAX_ITEMS).all()
+
+        lines = [f"CLIENTI ({total} totali, ultimi {len(clients)} registrati):"]
+        for client in clients:
+            purchases = 'ha acquistato' if client.has_purchases else 'nessun acquisto'
+            lines.append(f"- {client.nome} (tel. {client.numero_telefono or 'N/D'}, {purchases})")
+        return '\n'.join(lines)
+
+    @staticmethod
+    def upcoming_appointments_summary(consultant_id: Optional[int] = None) -> str:
+        """Prossimi appuntamenti da adesso"""
+        return AIDataProvider._appointments_summary('appointments', datetime.now(), None, consultant_id)
+
+    @staticmethod
+    def today_appointments_summary(consultant_id: Optional[int] = None) -> str:
+        """Appuntamenti della giornata corrente"""
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return AIDataProvider._appointments_summary('appointments_today', today, today + timedelta(days=1), consultant_id)
+
+    @staticmethod
+    def _appointments_summary(need: str, date_from: datetime, date_to: Optional[datetime],
+                              consultant_id: Optional[int]) -> str:
+        from services.appointment_service import AppointmentService
+
+        query = AppointmentService.build_filtered_query({'date_from': date_from, 'date_to': date_to}, consultant_id)
+        total = query.order_by(None).count()
+        appointments = query.limit(MAX_ITEMS).all()
+
+        lines = [f"{AIDataProvider.TITLES[need]} ({total}):"]
+        for appointment in appointments:
+            details = ', '.join(filter(None, [appointment.tipologia, appointment.stato,
+                                              'venduto' if appointment.venduto else None]))
+            consultants = ', '.join(c.nome for c in appointment.consultants)
+            lines.append(f"- {appointment.data_appuntamento.strftime('%d/%m %H:%M')} {appointment.nome_cliente}"
+                         f" ({details}){f' con {consultants}' if consultants else ''}")
+        if total > len(appointments):
+            lines.append(f"... e altri {total - len(appointments)}")
+        return '\n'.join(lines)
+
+    @staticmethod
+    def stats_summary(consultant_id: Optional[int] = None) -> str:
+        """Totali complessivi e andamento degli ultimi 30 giorni"""
+        from services.appointment_service import AppointmentService
+        from services.stats_service import StatsService
+
+        if consultant_id is not None:
+            totals = StatsService.consultant_summary(consultant_id)
+            overall = (f"appuntamenti {totals['total']}, venduti {totals['sold']} "
+                       f"(conversione {totals['conversion_rate']:.1f}%)")
+        else:
+            counts = StatsService.global_counts()
+            total, sold = counts['total_appointments'], counts['sold_appointments']
+            overall = (f"appuntamenti {total}, venduti {sold} "
+                       f"(conversione {StatsService.conversion_rate(total, sold):.1f}%), "
+                       f"consulenti {counts['total_consultants']}, clienti {counts['total_clients']}")
+
+        recent = AppointmentService.get_performance_metrics(consultant_id, days=30)
+        return '\n'.join([
+            "STATISTICHE:",
+            f"- Totale: {overall}",
+            f"- Ultimi 30 giorni: appuntamenti {recent['total_appointments']}, "
+            f"venduti {recent['sold_appointments']} (conversione {recent['conversion_rate']:.1f}%), "
+            f"nominativi raccolti {recent['total_nominativi']}"
+        ])
+
+def _run_in_app_context(app, loader, consultant_id):
+    """Esegue il caricamento nel thread del pool con un contesto applicativo proprio"""
+    with app.app_context():
+        return loader(consultant_id)
@@ -0,0 +1,106 @@
+"""
+Cache delle risposte dell'assistente AI (LRU con TTL, per processo)
+
+La chiave combina messaggio normalizzato, ruolo, consulente, pagina e le versioni delle tabelle
+da cui dipendono i dati del prompt: una scrittura su quelle tabelle rende obsolete le voci
+senza bisogno di invalidarle. Le risposte in cache vengono restituite come stream immediato.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, Generator, Optional
+from models.table_version import get_table_versions
+from utils.cache import MemoryCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tabelle i cui dati finiscono nei prompt (contesto, clienti, appuntamenti, statistiche)
+AI_RESPONSE_TABLES = {'appointment', 'appointment_consultant', 'consultant', 'client', 'follow_up'}
+
+DEFAULT_MAX_ENTRIES = int(os.getenv('AI_RESPONSE_CACHE_SIZE', 256))
+DEFAULT_TTL = int(os.getenv('AI_RESPONSE_CACHE_TTL', 600))
+
+SENTENCE = re.compile(r'[^.!?\n]*(?:[.!?\n]+\s*|$)')
+
+class AIResponseCache:
+    """Risposte generate indicizzate per richiesta e versione dei dati, con contatori hit/miss"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: int = DEFAULT_TTL):
+        self.ttl = ttl
+        self._cache = MemoryCache(max_entries)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        """Messaggio in minuscolo, senza punteggiatura e spazi ripetuti"""
+        return ' '.join(re.sub(r'[^\w\s]', ' ', message.lower()).split())
+
+    def make_key(self, message: str, context: Dict = None) -> Optional[str]:
+        """Chiave della richiesta per i dati attuali (None se le versioni non sono leggibili)"""
+        context = context or {}
+        try:
+            versions = get_table_versions(AI_RESPONSE_TABLES)
+        except Exception as e:
+            logger.warning(f"Versioni tabelle non disponibili, risposta AI non in cache: {e}")
+            return None
+
+        stamp = ','.join(f'{table}:{version}' for table, version in sorted(versions.items()))
+        raw = '|'.join([
+            self.normalize(message),
+            str(context.get('user_role') or ''),
+            str(context.get('consultant_id') or 0),
+            str(context.get('page_context') or ''),
+            stamp
+        ])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """Risposta in cache per la chiave, aggiornando i contatori"""
+        if key is None:
+            return None
+
+        found, response = self._cache.get(key)
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return response if found else None
+
+    def set(self, key: Optional[str], response: str) -> None:
+        if key is not None and response:
+            self._cache.set(key, response, self.ttl)
+
+    @staticmethod
+    def replay(response: str) -> Generator[str, None, None]:
+        """Risposta in cache come stream di frasi, senza attese"""
+        for match in SENTENCE.finditer(response):
+            if match.group():
+                yield match.group()
+
+    def clear(self) -> None:
+        self._cache.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict:
+        """Contatori per /ai/status"""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'entries': len(self._cache),
+            'max_entries': self._cache.max_entries,
+            'ttl': self.ttl,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups * 100, 1) if lookups else 0.0
+        }
+
+# Istanza condivisa dai servizi AI del processo
+response_cache = AIResponseCache()
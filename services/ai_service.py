@@ -6,18 +6,21 @@ Utilizza modelli IA completamente offline (quando disponibili)
 import json
 import logging
 import asyncio
+import hashlib
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Generator
+from typing import Dict, List, Optional, Generator, Tuple
 from flask import current_app, request
 from flask_login import current_user
 from io import BytesIO
 import base64
 import threading
 import queue
-import time
 import os
 import re
 import random
+import numpy as np
+from services.model_loader import ModelLoader
+from services.ai_response_cache import response_cache
 
 # Importa configurazione AI
 try:
@@ -38,37 +41,150 @@ except ImportError:
         'unknown': ['Non ho capito la richiesta.']
     }
 
-# Importa librerie per AI locale solo se disponibili
-if AI_CONFIG.get('speech_recognition', False):
-    try:
-        import speech_recognition as sr
-    except ImportError:
-        sr = None
-
-if AI_CONFIG.get('text_to_speech', False):
-    try:
-        import pyttsx3
-    except ImportError:
-        pyttsx3 = None
-
-if AI_CONFIG.get('local_ai', False):
-    try:
-        from transformers import (
-            AutoTokenizer, AutoModelForCausalLM, 
-            pipeline, set_seed
-        )
-        import torch
-    except ImportError:
-        AutoTokenizer = AutoModelForCausalLM = pipeline = set_seed = torch = None
+# Librerie per AI locale: importate dal thread di caricamento (torch e transformers richiedono secondi)
+sr = pyttsx3 = None
+AutoTokenizer = AutoModelForCausalLM = set_seed = torch = None
+TextIteratorStreamer = StoppingCriteria = StoppingCriteriaList = None
+SentenceTransformer = None
 
-if AI_CONFIG.get('embeddings', False):
-    try:
-        from sentence_transformers import SentenceTransformer
-    except ImportError:
-        SentenceTransformer = None
+def _import_local_libraries():
+    """Importa le librerie opzionali abilitate in AI_CONFIG"""
+    global sr, pyttsx3, AutoTokenizer, AutoModelForCausalLM, set_seed, torch
+    global TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList, SentenceTransformer
+    
+    if AI_CONFIG.get('speech_recognition', False):
+        try:
+            import speech_recognition as sr
+        except ImportError:
+            sr = None
+    
+    if AI_CONFIG.get('text_to_speech', False):
+        try:
+            import pyttsx3
+        except ImportError:
+            pyttsx3 = None
+    
+    if AI_CONFIG.get('local_ai', False):
+        try:
+            from transformers import (
+                AutoTokenizer, AutoModelForCausalLM, set_seed,
+                TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList
+            )
+            import torch
+        except ImportError:
+            AutoTokenizer = AutoModelForCausalLM = set_seed = torch = None
+            TextIteratorStreamer = StoppingCriteria = StoppingCriteriaList = None
+    
+    if AI_CONFIG.get('embeddings', False):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            SentenceTransformer = None
 
 logger = logging.getLogger(__name__)
 
+# Streaming dal modello locale
+STREAM_MAX_NEW_TOKENS = 200
+STREAM_TOKEN_TIMEOUT = 30      # secondi massimi di attesa per il token successivo
+STREAM_MIN_CHARS = 20          # testo trattenuto per scartare risposte troppo corte o generiche
+STREAM_MAX_CHARS = 500         # oltre questa lunghezza ci si ferma a fine frase
+
+# Inizio del turno dell'utente: la risposta si ferma qui
+TURN_MARKER = 'Utente:'
+
+UNWANTED_CHARS = re.compile(r'[^\w\s\.,!?\-:;()àèéìíîòóùú]')
+
+# Cache degli embedding della knowledge base (file .npy per hash del contenuto)
+EMBEDDINGS_CACHE_DIR = os.getenv(
+    'AI_EMBEDDINGS_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'embeddings')
+)
+KNOWLEDGE_MIN_SCORE = 0.5
+
+# Sezioni della knowledge base con risposte complete (domande di dominio e suggerimenti per ruolo)
+KNOWLEDGE_ANSWER_SECTIONS = ('domain_knowledge', 'tips')
+
+class KnowledgeIndex:
+    """Indice vettoriale della knowledge base: una riga normalizzata per voce, ricerca con un solo prodotto matrice-vettore"""
+    
+    def __init__(self, model, model_name: str, knowledge_base: Dict, cache_dir: str = EMBEDDINGS_CACHE_DIR):
+        self.model = model
+        self.entries = self.flatten(knowledge_base)
+        self.matrix = self._load_or_build(model_name, cache_dir)
+    
+    @staticmethod
+    def flatten(knowledge_base: Dict) -> List[Tuple[str, str]]:
+        """Coppie (testo da indicizzare, risposta) delle sezioni con risposte complete
+
+        Le chiavi (argomento, ruolo) entrano nel testo indicizzato ma non nella risposta;
+        greetings e analysis_prompts (aperture e intestazioni) non vengono indicizzati.
+        """
+        entries = []
+        
+        def collect(value, topics):
+            if isinstance(value, str):
+                entries.append((' '.join(topics + [value]), value))
+            elif isinstance(value, dict):
+                for key, item in value.items():
+                    collect(item, topics + [key])
+            elif isinstance(value, list):
+                for item in value:
+                    collect(item, topics)
+        
+        for section in KNOWLEDGE_ANSWER_SECTIONS:
+            collect(knowledge_base.get(section, {}), [])
+        return entries
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Embedding float32 normalizzati (norma 1) dei testi"""
+        vectors = np.asarray(self.model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+    
+    def _load_or_build(self, model_name: str, cache_dir: str) -> np.ndarray:
+        """Matrice degli embedding dalla cache (memory-mapped) o calcolata una volta e salvata"""
+        if not self.entries:
+            return np.zeros((0, 0), dtype=np.float32)
+        
+        content = json.dumps([model_name, [text for text, _ in self.entries]], ensure_ascii=False)
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(cache_dir, f'knowledge_{digest}.npy')
+        
+        if os.path.exists(path):
+            try:
+                matrix = np.load(path, mmap_mode='r')
+                if matrix.shape[0] == len(self.entries):
+                    return matrix
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cache embedding non leggibile, ricalcolo: {e}")
+        
+        matrix = self._encode([text for text, _ in self.entries])
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Scrittura atomica: più worker possono costruire la stessa cache contemporaneamente
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, matrix)
+            os.replace(tmp_path, path)
+            logger.info(f"Embedding knowledge base salvati in {path} ({len(self.entries)} voci)")
+        except OSError as e:
+            logger.warning(f"Impossibile salvare la cache embedding: {e}")
+        
+        return matrix
+    
+    def search(self, query: str, k: int = 1, min_score: float = KNOWLEDGE_MIN_SCORE) -> List[Tuple[float, str]]:
+        """Le k voci più simili (similarità coseno, decrescente) sopra la soglia"""
+        if not len(self.entries):
+            return []
+        
+        scores = self.matrix @ self._encode([query])[0]
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        return [(float(scores[i]), self.entries[i][1]) for i in top if scores[i] > min_score]
+
 class LocalAIService:
     """Servizio IA completamente locale (con fallback)"""
     
@@ -80,26 +196,59 @@ class LocalAIService:
         self.tokenizer = None
         self.model = None
         self.embedding_model = None
-        self.generator = None
+        self.knowledge_index = None
         self.speech_engine = None
         self.speech_recognizer = None
         
-        # Cache per risposte comuni
-        self.response_cache = {}
+        # Cache LRU delle risposte generate, per richiesta e versione dei dati
+        self.response_cache = response_cache
         self.knowledge_base = self._load_knowledge_base()
         
-        # Inizializza solo se i moduli sono disponibili
+        # Modelli e speech engine caricati in background al primo utilizzo (o con warmup)
+        enabled = any(AI_CONFIG.get(key, False) for key in ('local_ai', 'speech_recognition', 'text_to_speech'))
+        self.loader = ModelLoader('local', self._load_models, enabled=enabled)
+        if not enabled:
+            logger.info("AI locale e elaborazione vocale non disponibili - usando risposte fallback")
+            
+        logger.debug(f"LocalAI Service inizializzato con configurazione: {AI_CONFIG}")
+    
+    def _load_models(self):
+        """Importa le librerie e carica modelli e speech engine (thread di caricamento)"""
+        _import_local_libraries()
+        
         if AI_CONFIG.get('local_ai', False):
             self._init_models()
-        else:
-            logger.info("AI locale non disponibile - usando risposte fallback")
+            self._warmup_model()
             
         if AI_CONFIG.get('speech_recognition', False) or AI_CONFIG.get('text_to_speech', False):
             self._init_speech_engine()
-        else:
-            logger.info("Elaborazione vocale non disponibile")
-            
-        logger.info(f"LocalAI Service inizializzato con configurazione: {AI_CONFIG}")
+    
+    def _warmup_model(self):
+        """Prima generazione di prova: alloca i buffer del modello prima della prima richiesta reale"""
+        if not self.model:
+            return
+        
+        inputs = self.tokenizer("Ciao", return_tensors='pt').to(self.device)
+        self.model.generate(**inputs, max_new_tokens=1, pad_token_id=self.tokenizer.eos_token_id)
+    
+    def warmup(self, wait: Optional[float] = None) -> Dict:
+        """Avvia il caricamento dei modelli, attendendo al massimo wait secondi"""
+        self.loader.start()
+        if wait:
+            self.loader.wait(wait)
+        return self.get_status()
+    
+    def get_status(self) -> Dict:
+        """Stato di prontezza del servizio"""
+        return dict(
+            self.loader.status(),
+            backend='local',
+            model=self.model_name if self.model else None,
+            embeddings=self.knowledge_index is not None,
+            speech_recognition=self.speech_recognizer is not None,
+            text_to_speech=self.speech_engine is not None,
+            response_cache=self.response_cache.stats()
+        )
     
     def _init_models(self):
         """Inizializza modelli IA locali"""
@@ -129,23 +278,11 @@ class LocalAIService:
                 low_cpu_mem_usage=True
             ).to(self.device)
             
-            # Pipeline per generazione
-            self.generator = pipeline(
-                "text-generation",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                device=0 if self.device == "cuda" else -1,
-                do_sample=True,
-                temperature=0.7,
-                top_p=0.9,
-                max_length=512,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
-            
             # Carica modello embedding per similarity
             if AI_CONFIG.get('embeddings', False) and SentenceTransformer:
                 logger.info(f"Caricando embedding model: {self.embedding_model_name}")
                 self.embedding_model = SentenceTransformer(self.embedding_model_name)
+                self.knowledge_index = KnowledgeIndex(self.embedding_model, self.embedding_model_name, self.knowledge_base)
             
             logger.info("Modelli IA locali caricati con successo")
             
@@ -153,7 +290,6 @@ class LocalAIService:
             logger.error(f"Errore caricamento modelli IA: {e}")
             self.model = None
             self.tokenizer = None
-            self.generator = None
     
     def _load_knowledge_base(self) -> Dict:
         """Carica knowledge base specifica per AppointmentCRM"""
@@ -250,6 +386,7 @@ class LocalAIService:
     def process_voice_input(self, audio_data: bytes) -> str:
         """Elabora input vocale con riconoscimento locale"""
         if not self.speech_recognizer:
+            self.loader.start()
             return "Servizio riconoscimento vocale non disponibile"
         
         try:
@@ -281,82 +418,121 @@ class LocalAIService:
             return "Errore nell'elaborazione dell'audio."
     
     def generate_response_stream(self, message: str, context: Dict = None) -> Generator[str, None, None]:
-        """Genera risposta IA locale in streaming"""
+        """Genera risposta IA locale in streaming (token reali dal modello, altrimenti fallback intero)"""
         
         # Prepara il contesto
         system_prompt = self._build_system_prompt(context)
         
-        # Ottieni risposta dal modello locale
-        response_text = self._get_local_ai_response(message, system_prompt, context)
-        
-        # Simula streaming carattere per carattere
-        for char in response_text:
-            yield char
-            time.sleep(0.02)  # Velocità di typing realistica
-    
-    def _get_local_ai_response(self, message: str, system_prompt: str, context: Dict = None) -> str:
-        """Genera risposta usando IA locale o fallback intelligente"""
-        
-        # 1. Prova con modello locale se disponibile
-        if AI_CONFIG.get('local_ai', False) and self.generator and self.model:
+        # 1. Modello locale: i token vengono inoltrati appena generati.
+        #    Finché non è pronto il caricamento prosegue in background e si usa il fallback
+        if not self.loader.ready:
+            self.loader.start()
+        elif AI_CONFIG.get('local_ai', False) and self.model and self.tokenizer and TextIteratorStreamer:
+            cache_key = self.response_cache.make_key(message, context)
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                yield from self.response_cache.replay(cached_response)
+                return
+            
             try:
-                return self._generate_with_local_model(message, system_prompt, context)
+                chunks = []
+                for chunk in self._stream_with_local_model(message, system_prompt, context):
+                    chunks.append(chunk)
+                    yield chunk
+                # In cache solo il testo del modello di stream completati (non quelli interrotti dal client)
+                if chunks:
+                    self.response_cache.set(cache_key, ''.join(chunks))
+                    return
             except Exception as e:
                 logger.error(f"Errore modello locale: {e}")
                 # Continua con fallback
         
-        # 2. Fallback con risposte predefinite intelligenti
-        return self._get_intelligent_fallback_response(message, context)
+        # 2. Fallback con risposte predefinite intelligenti, senza ritardi artificiali
+        #    (anche quando il modello non ha prodotto testo utile)
+        yield self._get_intelligent_fallback_response(message, context)
     
-    def _generate_with_local_model(self, message: str, system_prompt: str, context: Dict) -> str:
-        """Genera risposta con modello locale Transformers"""
+    def _stream_with_local_model(self, message: str, system_prompt: str, context: Dict) -> Generator[str, None, None]:
+        """Generazione in un thread che alimenta un TextIteratorStreamer (coda di testo decodificato)
+
+        Produce solo testo del modello: nessun chunk se la risposta è troppo corta o generica.
+        """
         
         # Costruisci prompt conversazionale
         conversation_prompt = f"""Sistema: {system_prompt}
 
-Utente: {message}
+{TURN_MARKER} {message}
 Assistente:"""
         
-        # Genera con il modello locale
-        response = self.generator(
-            conversation_prompt,
-            max_new_tokens=200,
-            num_return_sequences=1,
-            temperature=0.7,
-            do_sample=True,
-            pad_token_id=self.tokenizer.eos_token_id
+        inputs = self.tokenizer(conversation_prompt, return_tensors='pt').to(self.device)
+        streamer = TextIteratorStreamer(
+            self.tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True,
+            timeout=STREAM_TOKEN_TIMEOUT
         )
+        cancelled = threading.Event()
         
-        # Estrai solo la risposta dell'assistente
-        full_text = response[0]['generated_text']
-        assistant_response = full_text.split("Assistente:")[-1].strip()
-        
-        # Pulisci e valida la risposta
-        assistant_response = self._clean_response(assistant_response)
+        class StopOnCancel(StoppingCriteria):
+            """Interrompe la generazione se il client chiude lo stream"""
+            def __call__(self, input_ids, scores, **kwargs):
+                return cancelled.is_set()
         
-        # Se la risposta è troppo corta o generica, usa fallback
-        if len(assistant_response) < 20 or self._is_generic_response(assistant_response):
-            return self._get_intelligent_fallback_response(message, context)
-        
-        return assistant_response
-    
-    def _clean_response(self, response: str) -> str:
-        """Pulisce e formatta la risposta del modello"""
-        
-        # Rimuovi caratteri indesiderati
-        response = re.sub(r'[^\w\s\.,!?\-:;()àèéìíîòóùú]', '', response)
-        
-        # Limita lunghezza
-        if len(response) > 500:
-            # Trova l'ultima frase completa
-            sentences = response.split('.')
-            response = '. '.join(sentences[:3]) + '.'
+        def run_generation():
+            try:
+                self.model.generate(
+                    **inputs,
+                    streamer=streamer,
+                    max_new_tokens=STREAM_MAX_NEW_TOKENS,
+                    do_sample=True,
+                    temperature=0.7,
+                    top_p=0.9,
+                    pad_token_id=self.tokenizer.eos_token_id,
+                    stopping_criteria=StoppingCriteriaList([StopOnCancel()])
+                )
+            except Exception as e:
+                logger.error(f"Errore generazione modello locale: {e}")
+                streamer.end()
         
-        # Capitalizza prima lettera
-        if response:
-            response = response[0].upper() + response[1:]
+        threading.Thread(target=run_generation, daemon=True).start()
         
-        return response.strip()
+        response = ''
+        sent = 0
+        try:
+            for text in streamer:
+                response += text
+                
+                # Il modello tende a proseguire il dialogo: ci si ferma al turno dell'utente
+                turn_end = response.find(TURN_MARKER)
+                if turn_end != -1:
+                    response = response[:turn_end].rstrip()
+                
+                if not sent:
+                    head = response.lstrip()
+                    if len(head) < STREAM_MIN_CHARS or self._is_generic_response(head):
+                        if turn_end != -1:
+                            break
+                        continue
+                    response = head[0].upper() + head[1:]
+                
+                # La coda lunga quanto il marcatore resta trattenuta: potrebbe esserne l'inizio (es. 'Ut')
+                ready = len(response) if turn_end != -1 else max(sent, len(response) - len(TURN_MARKER) + 1)
+                chunk = UNWANTED_CHARS.sub('', response[sent:ready])
+                sent = ready
+                if chunk:
+                    yield chunk
+                
+                if turn_end != -1 or (len(response) >= STREAM_MAX_CHARS and response.rstrip().endswith(('.', '!', '?'))):
+                    break
+        except queue.Empty:
+            logger.warning("Timeout in attesa del modello locale, risposta troncata")
+        finally:
+            cancelled.set()
+        
+        # Coda trattenuta a fine generazione
+        if sent:
+            chunk = UNWANTED_CHARS.sub('', response[sent:])
+            if chunk:
+                yield chunk
     
     def _is_generic_response(self, response: str) -> bool:
         """Verifica se la risposta è troppo generica"""
@@ -418,6 +594,11 @@ Assistente:"""
         if any(word in message_lower for word in ['vpn', 'sicurezza', 'connessione', 'rete']):
             return "Per la gestione VPN e sicurezza, verifica lo stato delle connessioni nella dashboard dealer o contatta l'amministratore per supporto tecnico."
         
+        # Corrispondenza semantica nella knowledge base (se il modello embedding è caricato)
+        knowledge_match = self._find_best_knowledge_match(message)
+        if knowledge_match:
+            return knowledge_match
+        
         # Aiuto generico
         if any(word in message_lower for word in ['aiuto', 'help', 'come', 'cosa', 'dove']):
             return "Sono qui per aiutarti! Puoi chiedermi informazioni su appuntamenti, clienti, consulenti, calendario, report, pagamenti e configurazioni. Cosa ti serve sapere?"
@@ -429,36 +610,14 @@ Assistente:"""
         # Risposta generica con suggerimenti
         return self._get_contextual_default_response(context)
     
-    def _find_best_knowledge_match(self, message: str) -> str:
-        """Trova la migliore corrispondenza nel knowledge base usando embeddings"""
+    def _find_best_knowledge_match(self, message: str) -> Optional[str]:
+        """Trova la migliore corrispondenza nel knowledge base usando l'indice degli embedding"""
+        if not self.knowledge_index:
+            return None
         
         try:
-            import numpy as np
-            
-            # Codifica il messaggio dell'utente
-            user_embedding = self.embeddings_model.encode([message])
-            
-            best_score = -1
-            best_response = None
-            
-            # Confronta con knowledge base
-            for category, items in self.knowledge_base.items():
-                for item in items:
-                    if 'keywords' in item:
-                        # Crea testo per l'embedding dal contenuto
-                        content_text = f"{' '.join(item['keywords'])} {item.get('content', '')}"
-                        content_embedding = self.embeddings_model.encode([content_text])
-                        
-                        # Calcola similarità coseno
-                        similarity = np.dot(user_embedding[0], content_embedding[0]) / (
-                            np.linalg.norm(user_embedding[0]) * np.linalg.norm(content_embedding[0])
-                        )
-                        
-                        if similarity > best_score and similarity > 0.5:  # Soglia di similarità
-                            best_score = similarity
-                            best_response = item.get('response', item.get('content', ''))
-            
-            return best_response
+            matches = self.knowledge_index.search(message, k=1)
+            return matches[0][1] if matches else None
             
         except Exception as e:
             logger.error(f"Errore in find_best_knowledge_match: {e}")
@@ -681,6 +840,7 @@ Su quale area vorresti che mi concentrassi maggiormente?"""
     def text_to_speech(self, text: str) -> bytes:
         """Converte testo in audio"""
         if not self.speech_engine:
+            self.loader.start()
             return b""
         
         try:
@@ -704,51 +864,56 @@ Su quale area vorresti che mi concentrassi maggiormente?"""
         
         return b""
     
+    @staticmethod
+    def _compute_context_stats(consultant=None) -> Dict:
+        """Statistiche generali e, per i dealer, personali del contesto AI"""
+        from services.stats_service import StatsService
+        
+        counts = StatsService.global_counts()
+        total_appointments = counts['total_appointments']
+        sold_appointments = counts['sold_appointments']
+        
+        result = {
+            'stats': {
+                'total_appointments': total_appointments,
+                'sold_appointments': sold_appointments,
+                'total_consultants': counts['total_consultants'],
+                'total_clients': counts['total_clients'],
+                'conversion_rate': (sold_appointments / total_appointments * 100) if total_appointments > 0 else 0,
+                'recent_appointments': min(total_appointments, 5)
+            }
+        }
+        
+        if consultant:
+            personal_stats = StatsService.consultant_summary(consultant.id)
+            result['personal_stats'] = {
+                'consultant_name': consultant.nome,
+                'total_appointments': personal_stats['total'],
+                'stats': personal_stats
+            }
+        
+        return result
+    
     def get_context_data(self, user_id: int = None) -> Dict:
         """Ottiene dati di contesto per l'AI"""
         
         context = {
             'timestamp': datetime.now().isoformat(),
-            'user_role': current_user.role if current_user.is_authenticated else 'guest'
+            'user_role': current_user.role if current_user.is_authenticated else 'guest',
+            'consultant_id': current_user.consultant_id if current_user.is_authenticated else None
         }
         
         try:
             # Importa qui per evitare circular imports
-            from models.appointment import Appointment
-            from models.consultant import Consultant
-            from models.client import Client
-            
-            # Statistiche generali
-            total_appointments = Appointment.query.count()
-            sold_appointments = Appointment.query.filter_by(venduto=True).count()
-            total_consultants = Consultant.query.count()
-            total_clients = Client.query.count()
-            
-            # Appuntamenti recenti
-            recent_appointments = Appointment.query.order_by(
-                Appointment.data_appuntamento.desc()
-            ).limit(5).all()
-            
-            context['stats'] = {
-                'total_appointments': total_appointments,
-                'sold_appointments': sold_appointments,
-                'total_consultants': total_consultants,
-                'total_clients': total_clients,
-                'conversion_rate': (sold_appointments / total_appointments * 100) if total_appointments > 0 else 0,
-                'recent_appointments': len(recent_appointments)
-            }
+            from utils.cache import cached
             
-            # Se utente dealer, filtra per suoi dati
+            # Se utente dealer, anche i suoi dati; in cache per ruolo/consulente, invalidata al commit
+            consultant = None
             if current_user.is_authenticated and current_user.is_dealer() and current_user.consultant:
                 consultant = current_user.consultant
-                personal_appointments = consultant.appointments
-                personal_stats = consultant.get_appointments_stats()
-                
-                context['personal_stats'] = {
-                    'consultant_name': consultant.nome,
-                    'total_appointments': len(personal_appointments),
-                    'stats': personal_stats
-                }
+            
+            key = f"{context['user_role']}:{consultant.id if consultant else 0}"
+            context.update(cached('ai_context', key, lambda: self._compute_context_stats(consultant)))
         
         except Exception as e:
             logger.error(f"Errore recupero context data: {e}")
@@ -6,17 +6,18 @@ Servizio AI avanzato con accesso API e auto-correzione
 import json
 import logging
 import asyncio
-import time
 import re
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Generator, Any
 from flask import current_app, request
 from flask_login import current_user
-import requests
 from io import BytesIO
 import base64
 import threading
 import queue
+from services.model_loader import ModelLoader
+from services.ai_data_provider import AIDataProvider
+from services.ai_response_cache import response_cache
 
 # Importa configurazione AI
 try:
@@ -32,90 +33,11 @@ except ImportError:
     SYSTEM_PROMPT = "Sei un assistente IA."
     CONTEXT_PROMPTS = {}
 
-# Importa moduli condizionalmente
-if AI_CONFIG.get('ollama_ai', False):
-    try:
-        import ollama
-    except ImportError:
-        ollama = None
-
-if AI_CONFIG.get('api_calls', False):
-    try:
-        import requests
-    except ImportError:
-        requests = None
+# Client Ollama importato dal thread di caricamento
+ollama = None
 
 logger = logging.getLogger(__name__)
 
-class APIClient:
-    """Client per interagire con le API del sistema"""
-    
-    def __init__(self, base_url: str = None, timeout: int = 30):
-        self.base_url = base_url or "http://localhost:5000"
-        self.timeout = timeout
-        self.session = requests.Session() if requests else None
-        
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
-        """Esegue una richiesta HTTP con gestione errori"""
-        if not self.session:
-            raise Exception("Requests non disponibile")
-            
-        url = f"{self.base_url}{endpoint}"
-        
-        try:
-            response = self.session.request(
-                method=method,
-                url=url,
-                timeout=self.timeout,
-                **kwargs
-            )
-            response.raise_for_status()
-            return {
-                'success': True,
-                'data': response.json() if response.content else None,
-                'status_code': response.status_code
-            }
-        except requests.exceptions.RequestException as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'status_code': getattr(e.response, 'status_code', 500) if hasattr(e, 'response') else 500
-            }
-    
-    def get_clients(self, limit: int = None) -> Dict[str, Any]:
-        """Ottieni lista clienti"""
-        params = {'limit': limit} if limit else {}
-        return self._make_request('GET', '/api/clients', params=params)
-    
-    def get_client(self, client_id: int) -> Dict[str, Any]:
-        """Ottieni dettagli cliente specifico"""
-        return self._make_request('GET', f'/api/clients/{client_id}')
-    
-    def get_appointments(self, date: str = None, status: str = None) -> Dict[str, Any]:
-        """Ottieni lista appuntamenti"""
-        params = {}
-        if date:
-            params['date'] = date
-        if status:
-            params['status'] = status
-        return self._make_request('GET', '/api/appointments', params=params)
-    
-    def get_appointments_today(self) -> Dict[str, Any]:
-        """Ottieni appuntamenti di oggi"""
-        return self._make_request('GET', '/api/appointments/today')
-    
-    def get_appointments_week(self) -> Dict[str, Any]:
-        """Ottieni appuntamenti della settimana"""
-        return self._make_request('GET', '/api/appointments/week')
-    
-    def get_stats_overview(self) -> Dict[str, Any]:
-        """Ottieni panoramica statistiche"""
-        return self._make_request('GET', '/api/stats/overview')
-    
-    def get_stats_revenue(self, period: str = 'month') -> Dict[str, Any]:
-        """Ottieni statistiche ricavi"""
-        return self._make_request('GET', '/api/stats/revenue', params={'period': period})
-
 class OllamaAIService:
     """Servizio AI con Ollama e Llama 3.2 3B"""
     
@@ -123,17 +45,37 @@ class OllamaAIService:
         self.client = None
         self.model = OLLAMA_CONFIG['model']
         self.host = OLLAMA_CONFIG['host']
-        self.api_client = APIClient()
         self.conversation_history = {}
+        self.response_cache = response_cache
         
-        # Inizializza client Ollama se disponibile
-        if AI_CONFIG.get('ollama_ai', False) and ollama:
-            try:
-                self.client = ollama.Client(host=self.host)
-                self._test_connection()
-            except Exception as e:
-                logger.error(f"Errore inizializzazione Ollama: {e}")
-                self.client = None
+        # Client, verifica del modello e warmup in background al primo utilizzo (o con warmup)
+        self.loader = ModelLoader('ollama', self._load_models, enabled=AI_CONFIG.get('ollama_ai', False))
+    
+    def _load_models(self):
+        """Crea il client Ollama, verifica il modello e lo carica in memoria (thread di caricamento)"""
+        global ollama
+        import ollama
+        
+        client = ollama.Client(host=self.host)
+        self.client = client
+        if not self._test_connection():
+            self.client = None
+            raise RuntimeError(f"Modello {self.model} non disponibile su {self.host}")
+        
+        # Una generazione vuota carica il modello senza produrre testo
+        client.generate(model=self.model, prompt='', keep_alive=OLLAMA_CONFIG.get('keep_alive', '30m'))
+    
+    def warmup(self, wait: Optional[float] = None) -> Dict[str, Any]:
+        """Avvia il caricamento del modello, attendendo al massimo wait secondi"""
+        self.loader.start()
+        if wait:
+            self.loader.wait(wait)
+        return self.get_status()
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Stato di prontezza del servizio"""
+        return dict(self.loader.status(), backend='ollama', model=self.model, host=self.host,
+                    response_cache=self.response_cache.stats())
     
     def _test_connection(self) -> bool:
         """Testa la connessione con Ollama"""
@@ -150,68 +92,6 @@ class OllamaAIService:
             logger.error(f"Test connessione Ollama fallito: {e}")
             return False
     
-    def _call_api_with_retry(self, api_func, *args, **kwargs) -> Dict[str, Any]:
-        """Chiama API con retry automatico"""
-        max_retries = AI_CONFIG.get('max_api_retries', 3)
-        
-        for attempt in range(max_retries):
-            try:
-                result = api_func(*args, **kwargs)
-                if result.get('success'):
-                    return result
-                else:
-                    # Analizza l'errore e prova correzione
-                    if attempt < max_retries - 1:
-                        error_code = result.get('status_code', 500)
-                        if error_code == 400:
-                            # Bad Request - prova con parametri modificati
-                            logger.info(f"Tentativo {attempt + 1}: Correzione parametri per errore 400")
-                            if 'params' in kwargs:
-                                # Rimuovi parametri problematici
-                                kwargs['params'] = {k: v for k, v in kwargs['params'].items() if v is not None}
-                        elif error_code == 404:
-                            # Not Found - prova endpoint alternativi
-                            logger.info(f"Tentativo {attempt + 1}: Risorsa non trovata")
-                            break  # Non ritentare per 404
-                        time.sleep(1)  # Attendi prima del retry
-                    
-            except Exception as e:
-                logger.error(f"Errore chiamata API (tentativo {attempt + 1}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(1)
-                
-        return {'success': False, 'error': 'Numero massimo di tentativi raggiunto'}
-    
-    def _format_api_data(self, data: Dict[str, Any], context: str) -> str:
-        """Formatta i dati API per il prompt"""
-        if not data.get('success'):
-            return f"ERRORE API: {data.get('error', 'Errore sconosciuto')}"
-        
-        api_data = data.get('data', [])
-        
-        if context == 'clients':
-            if isinstance(api_data, list):
-                return f"CLIENTI TROVATI ({len(api_data)}):\n" + "\n".join([
-                    f"- {client.get('name', 'N/A')} (ID: {client.get('id', 'N/A')})" 
-                    for client in api_data[:10]  # Limita a 10 per il prompt
-                ])
-            else:
-                return f"CLIENTE: {api_data.get('name', 'N/A')} - Dettagli: {json.dumps(api_data, indent=2)}"
-                
-        elif context == 'appointments':
-            if isinstance(api_data, list):
-                return f"APPUNTAMENTI TROVATI ({len(api_data)}):\n" + "\n".join([
-                    f"- {apt.get('client_name', 'N/A')} il {apt.get('date', 'N/A')} alle {apt.get('time', 'N/A')}" 
-                    for apt in api_data[:10]
-                ])
-            else:
-                return f"APPUNTAMENTO: {json.dumps(api_data, indent=2)}"
-                
-        elif context == 'stats':
-            return f"STATISTICHE: {json.dumps(api_data, indent=2)}"
-            
-        return f"DATI: {json.dumps(api_data, indent=2)}"
-    
     def _build_enhanced_prompt(self, user_message: str, context: Dict[str, Any]) -> str:
         """Costruisce un prompt avanzato con contesto e accesso API"""
         
@@ -231,30 +111,15 @@ class OllamaAIService:
         # Analizza la richiesta per determinare se servono dati API
         needs_api_data = self._analyze_request_for_api_needs(user_message)
         
-        if needs_api_data and AI_CONFIG.get('api_access', False):
+        # Dati visibili all'utente: tutti per l'admin, solo quelli del proprio consulente per gli altri ruoli
+        consultant_id = None if user_role == 'admin' else context.get('consultant_id')
+        
+        if needs_api_data and AI_CONFIG.get('api_access', False) and (user_role == 'admin' or consultant_id):
             prompt += "DATI DISPONIBILI:\n"
             
-            # Carica dati pertinenti
-            for api_need in needs_api_data:
-                try:
-                    if api_need == 'clients':
-                        api_result = self._call_api_with_retry(self.api_client.get_clients, limit=20)
-                        prompt += self._format_api_data(api_result, 'clients') + "\n\n"
-                    
-                    elif api_need == 'appointments_today':
-                        api_result = self._call_api_with_retry(self.api_client.get_appointments_today)
-                        prompt += self._format_api_data(api_result, 'appointments') + "\n\n"
-                    
-                    elif api_need == 'appointments':
-                        api_result = self._call_api_with_retry(self.api_client.get_appointments)
-                        prompt += self._format_api_data(api_result, 'appointments') + "\n\n"
-                    
-                    elif api_need == 'stats':
-                        api_result = self._call_api_with_retry(self.api_client.get_stats_overview)
-                        prompt += self._format_api_data(api_result, 'stats') + "\n\n"
-                        
-                except Exception as e:
-                    prompt += f"ERRORE CARICAMENTO {api_need}: {str(e)}\n\n"
+            # Riepiloghi letti in-process, in parallelo
+            for summary in AIDataProvider.fetch(needs_api_data, consultant_id).values():
+                prompt += summary + "\n\n"
         
         # Messaggio dell'utente
         prompt += f"RICHIESTA UTENTE: {user_message}\n\n"
@@ -290,12 +155,17 @@ class OllamaAIService:
     def generate_response_stream(self, message: str, context: Dict[str, Any]) -> Generator[str, None, None]:
         """Genera risposta in streaming con Ollama"""
         
-        if not self.client:
-            # Fallback response
-            fallback = self._get_fallback_response('error')
-            for char in fallback:
-                yield char
-                time.sleep(0.05)
+        if not self.loader.ready or not self.client:
+            # Modello non ancora pronto: caricamento in background e risposta di fallback immediata
+            state = self.loader.start()
+            yield self._get_fallback_response('loading' if state == ModelLoader.LOADING else 'error')
+            return
+        
+        # Stessa domanda, stesso utente e dati invariati: risposta dalla cache, senza prompt né generazione
+        cache_key = self.response_cache.make_key(message, context)
+        cached_response = self.response_cache.get(cache_key)
+        if cached_response is not None:
+            yield from self.response_cache.replay(cached_response)
             return
         
         try:
@@ -328,6 +198,8 @@ class OllamaAIService:
                     full_response += content
                     yield content
             
+            self.response_cache.set(cache_key, full_response)
+            
             # Salva nella cronologia conversazione
             user_id = getattr(current_user, 'id', 'anonymous')
             if user_id not in self.conversation_history:
@@ -365,20 +237,14 @@ class OllamaAIService:
                     correction_msg = FALLBACK_RESPONSES.get('correction', ['Risposta corretta:'])[0]
                     yield f"{correction_msg}\n\n"
                     
-                    response_text = simple_response.get('message', {}).get('content', '')
-                    for char in response_text:
-                        yield char
-                        time.sleep(0.02)
+                    yield simple_response.get('message', {}).get('content', '')
                     return
                         
                 except Exception as e2:
                     logger.error(f"Auto-correzione fallita: {e2}")
             
             # Fallback finale
-            fallback = self._get_fallback_response('error')
-            for char in fallback:
-                yield char
-                time.sleep(0.05)
+            yield self._get_fallback_response('error')
     
     def _get_fallback_response(self, response_type: str) -> str:
         """Ottieni risposta di fallback"""
@@ -392,6 +258,7 @@ class OllamaAIService:
             'timestamp': datetime.now().isoformat(),
             'user_role': getattr(current_user, 'role', 'viewer') if current_user.is_authenticated else 'anonymous',
             'user_id': getattr(current_user, 'id', 'anonymous') if current_user.is_authenticated else 'anonymous',
+            'consultant_id': getattr(current_user, 'consultant_id', None) if current_user.is_authenticated else None,
             'page_context': request.endpoint if request else 'unknown'
         }
 
@@ -2,7 +2,11 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from models.appointment import Appointment
 from models.consultant import Consultant
+from models.database import appointment_consultant
 from models.user import db
+from sqlalchemy.orm import selectinload
+from models.search import is_phone_query
+from services.search_service import SearchService, MIN_QUERY_LENGTH
 import logging
 
 logger = logging.getLogger(__name__)
@@ -224,35 +228,20 @@ class AppointmentService:
                               days: int = 30) -> Dict:
         """Calcola metriche di performance"""
         
-        date_from = datetime.now() - timedelta(days=days)
+        from services.stats_service import StatsService
         
-        query = Appointment.query.filter(Appointment.data_appuntamento >= date_from)
+        # Giorni interi: la finestra parte dalla mezzanotte per leggere l'aggregato giornaliero
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        stats = StatsService.period_stats(consultant_id, date_from=today - timedelta(days=days))
         
-        if consultant_id:
-            query = query.join(Appointment.consultants).filter(Consultant.id == consultant_id)
-        
-        appointments = query.all()
-        
-        if not appointments:
-            return {
-                'total_appointments': 0,
-                'sold_appointments': 0,
-                'conversion_rate': 0,
-                'avg_nominativi': 0,
-                'avg_appuntamenti_personali': 0,
-                'total_nominativi': 0,
-                'total_appuntamenti_personali': 0
-            }
-        
-        total = len(appointments)
-        sold = len([a for a in appointments if a.venduto])
-        total_nominativi = sum(a.nominativi_raccolti for a in appointments)
-        total_personali = sum(a.appuntamenti_personali for a in appointments)
+        total = stats['total']
+        total_nominativi = stats['nominativi_raccolti']
+        total_personali = stats['appuntamenti_personali']
         
         return {
             'total_appointments': total,
-            'sold_appointments': sold,
-            'conversion_rate': round((sold / total * 100) if total > 0 else 0, 2),
+            'sold_appointments': stats['sold'],
+            'conversion_rate': round(stats['conversion_rate'], 2),
             'avg_nominativi': round(total_nominativi / total, 2) if total > 0 else 0,
             'avg_appuntamenti_personali': round(total_personali / total, 2) if total > 0 else 0,
             'total_nominativi': total_nominativi,
@@ -261,9 +250,18 @@ class AppointmentService:
     
     @staticmethod
     def search_appointments(query: str, limit: int = 50) -> List[Appointment]:
-        """Ricerca appuntamenti per nome cliente o telefono"""
+        """Ricerca appuntamenti per nome cliente, indirizzo, note o telefono"""
+        
+        # Indice full-text globale (per prefisso dei termini); numeri di telefono e testi brevi
+        # restano sulla ricerca per sottostringa, che trova anche parti interne del numero
+        text = query.strip()
+        is_full_text = len(text) >= MIN_QUERY_LENGTH and not is_phone_query(text)
+        if is_full_text and SearchService.is_available():
+            ids = SearchService.search_ids(query, 'appointment', limit)
+            appointments = {a.id: a for a in Appointment.query.filter(Appointment.id.in_(ids)).all()} if ids else {}
+            return [appointments[i] for i in ids if i in appointments]
         
-        search_pattern = f"%{query.strip()}%"
+        search_pattern = f"%{text}%"
         
         return (Appointment.query
                 .filter(
@@ -275,3 +273,49 @@ class AppointmentService:
                 .order_by(Appointment.data_appuntamento.desc())
                 .limit(limit)
                 .all())
+    
+    @staticmethod
+    def build_filtered_query(filters: Dict, consultant_id: Optional[int] = None):
+        """Query appuntamenti con filtri applicati in SQL, ordinata per (data, id)"""
+        
+        query = Appointment.query.options(selectinload(Appointment.consultants))
+        
+        # Vincolo di visibilità (dealer) e filtro consulente esplicito
+        for cid in (consultant_id, filters.get('consultant_id')):
+            if cid:
+                query = query.filter(Appointment.id.in_(
+                    db.select(appointment_consultant.c.appointment_id)
+                    .where(appointment_consultant.c.consultant_id == cid)
+                ))
+        
+        if filters.get('date_from'):
+            query = query.filter(Appointment.data_appuntamento >= filters['date_from'])
+        if filters.get('date_to'):
+            query = query.filter(Appointment.data_appuntamento < filters['date_to'])
+        if filters.get('stato'):
+            query = query.filter(Appointment.stato == filters['stato'])
+        if filters.get('tipologia'):
+            query = query.filter(Appointment.tipologia == filters['tipologia'])
+        if filters.get('venduto') is not None:
+            query = query.filter(Appointment.venduto == filters['venduto'])
+        
+        return query.order_by(Appointment.data_appuntamento.asc(), Appointment.id.asc())
+    
+    @staticmethod
+    def apply_keyset(query, cursor: Optional[tuple]):
+        """Riprende la query dopo la riga (data_appuntamento, id) indicata dal cursore"""
+        
+        if not cursor:
+            return query
+        
+        last_date, last_id = cursor
+        return query.filter(db.or_(
+            Appointment.data_appuntamento > last_date,
+            db.and_(Appointment.data_appuntamento == last_date, Appointment.id > last_id)
+        ))
+    
+    @staticmethod
+    def iter_appointments(query, batch_size: int = 500):
+        """Itera la query con cursore lato server, caricando i consulenti a blocchi"""
+        
+        return query.yield_per(batch_size)
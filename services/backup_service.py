@@ -0,0 +1,139 @@
+"""
+Backup e statistiche del database, indipendenti dal backend (SQLite o PostgreSQL)
+
+- SQLite: copia con l'API di backup online (consistente anche in modalità WAL e con scritture in corso)
+- PostgreSQL: pg_dump in formato custom (ripristino con pg_restore)
+"""
+
+import os
+import glob
+import shutil
+import sqlite3
+import subprocess
+from datetime import datetime
+from typing import Dict, List
+from flask import current_app
+from models.database import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKUP_EXTENSIONS = ('.db', '.dump')
+
+class BackupService:
+    """Backup del database configurato e informazioni su dimensione e versione"""
+
+    @staticmethod
+    def backup_dir() -> str:
+        """Cartella dei backup (BACKUP_DIR, default 'backups')"""
+        return current_app.config.get('BACKUP_DIR', 'backups')
+
+    @staticmethod
+    def create_backup() -> str:
+        """Crea un backup del database e restituisce il nome del file"""
+        backup_dir = BackupService.backup_dir()
+        os.makedirs(backup_dir, exist_ok=True)
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        dialect = db.engine.dialect.name
+
+        if dialect == 'sqlite':
+            backup_filename = f'backup_{timestamp}.db'
+            BackupService._backup_sqlite(os.path.join(backup_dir, backup_filename))
+        elif dialect == 'postgresql':
+            backup_filename = f'backup_{timestamp}.dump'
+            BackupService._backup_postgresql(os.path.join(backup_dir, backup_filename))
+        else:
+            raise RuntimeError(f'Backup non supportato per il database {dialect}')
+
+        logger.info(f"Backup database creato: {backup_filename}")
+        return backup_filename
+
+    @staticmethod
+    def _backup_sqlite(backup_path: str) -> None:
+        """Backup online SQLite nel file indicato"""
+        db_path = db.engine.url.database
+        if not db_path or db_path == ':memory:' or not os.path.exists(db_path):
+            raise RuntimeError('Database non trovato')
+
+        source = sqlite3.connect(db_path)
+        target = sqlite3.connect(backup_path)
+        try:
+            with target:
+                source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+    @staticmethod
+    def _backup_postgresql(backup_path: str) -> None:
+        """Dump PostgreSQL con pg_dump (deve essere nel PATH o indicato da PG_DUMP)"""
+        pg_dump = current_app.config.get('PG_DUMP') or shutil.which('pg_dump')
+        if not pg_dump:
+            raise RuntimeError('pg_dump non disponibile: installare i client PostgreSQL')
+
+        url = db.engine.url
+        command = [pg_dump, '--format=custom', '--no-owner', f'--file={backup_path}']
+        if url.host:
+            command.append(f'--host={url.host}')
+        if url.port:
+            command.append(f'--port={url.port}')
+        if url.username:
+            command.append(f'--username={url.username}')
+        command.append(url.database)
+
+        env = dict(os.environ)
+        if url.password:
+            env['PGPASSWORD'] = url.password
+
+        result = subprocess.run(command, env=env, capture_output=True, text=True, timeout=600)
+        if result.returncode != 0:
+            if os.path.exists(backup_path):
+                os.remove(backup_path)
+            raise RuntimeError(f'pg_dump fallito: {result.stderr.strip()}')
+
+    @staticmethod
+    def list_backups() -> List[str]:
+        """Percorsi dei backup esistenti, dal più recente"""
+        backup_dir = BackupService.backup_dir()
+        if not os.path.exists(backup_dir):
+            return []
+
+        backups = [path for ext in BACKUP_EXTENSIONS for path in glob.glob(os.path.join(backup_dir, f'*{ext}'))]
+        backups.sort(key=os.path.getmtime, reverse=True)
+        return backups
+
+    @staticmethod
+    def database_stats() -> Dict:
+        """Backend, versione e dimensione del database corrente"""
+        dialect = db.engine.dialect.name
+
+        with db.engine.connect() as conn:
+            if dialect == 'sqlite':
+                version = conn.execute(db.text('SELECT sqlite_version()')).scalar()
+                page_count = conn.execute(db.text('PRAGMA page_count')).scalar()
+                page_size = conn.execute(db.text('PRAGMA page_size')).scalar()
+                size = page_count * page_size
+            elif dialect == 'postgresql':
+                version = conn.execute(db.text('SHOW server_version')).scalar()
+                size = conn.execute(db.text('SELECT pg_database_size(current_database())')).scalar()
+            else:
+                version, size = None, None
+
+        return {
+            'backend': dialect,
+            'version': version,
+            'size_bytes': size,
+            'size': BackupService.format_size(size)
+        }
+
+    @staticmethod
+    def format_size(size) -> str:
+        """Dimensione leggibile (es. '12.3 MB')"""
+        if size is None:
+            return 'N/A'
+
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024 or unit == 'GB':
+                return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+            size /= 1024
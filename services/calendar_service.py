@@ -0,0 +1,141 @@
+from datetime import datetime
+from typing import List, Dict
+from models.appointment import Appointment, OtherAppointment
+from models.followup import FollowUp
+from models.note_event import note_event
+from models.user import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Finestra massima richiedibile al feed (giorni)
+MAX_WINDOW_DAYS = 366
+
+# Colori FullCalendar per tipo di evento
+EVENT_COLORS = {
+    'appointment': '#007bff',
+    'other_appointment': '#17a2b8',
+    'note': '#28a745',
+    'followup': '#ffc107'
+}
+
+# Prefissi id per distinguere le sorgenti nel calendario
+EVENT_ID_PREFIXES = {
+    'appointment': 'app_',
+    'other_appointment': 'oapp_',
+    'note': 'note_',
+    'followup': 'fu_'
+}
+
+class CalendarService:
+    """Eventi del calendario letti con un'unica query UNION ALL"""
+
+    @staticmethod
+    def _event_rows(start: datetime, end: datetime) -> List:
+        """Tuple (kind, id, title, start_at, tipologia, note, numero, color) nell'intervallo [start, end)"""
+
+        appointments = db.select(
+            db.literal('appointment').label('kind'),
+            Appointment.id.label('id'),
+            Appointment.nome_cliente.label('title'),
+            Appointment.data_appuntamento.label('start_at'),
+            Appointment.tipologia.label('tipologia'),
+            Appointment.note.label('note'),
+            db.literal(None, db.Integer).label('numero'),
+            db.literal(None, db.String).label('color')
+        ).where(
+            Appointment.data_appuntamento >= start,
+            Appointment.data_appuntamento < end
+        )
+
+        other_appointments = db.select(
+            db.literal('other_appointment'),
+            OtherAppointment.id,
+            OtherAppointment.nome_cliente,
+            OtherAppointment.data_appuntamento,
+            OtherAppointment.tipologia,
+            OtherAppointment.note,
+            db.literal(None, db.Integer),
+            db.literal(None, db.String)
+        ).where(
+            OtherAppointment.data_appuntamento >= start,
+            OtherAppointment.data_appuntamento < end
+        )
+
+        notes = db.select(
+            db.literal('note'),
+            note_event.id,
+            note_event.note,
+            note_event.data,
+            db.literal('note'),
+            note_event.note,
+            db.literal(None, db.Integer),
+            note_event.colore
+        ).where(
+            note_event.data >= start,
+            note_event.data < end
+        )
+
+        followups = db.select(
+            db.literal('followup'),
+            FollowUp.id,
+            Appointment.nome_cliente,
+            FollowUp.data_prevista,
+            db.literal('followup'),
+            FollowUp.note,
+            FollowUp.numero,
+            db.literal(None, db.String)
+        ).join(
+            Appointment, Appointment.id == FollowUp.appointment_id
+        ).where(
+            FollowUp.data_prevista >= start,
+            FollowUp.data_prevista < end,
+            FollowUp.done == False
+        )
+
+        union = db.union_all(appointments, other_appointments, notes, followups).subquery()
+        query = db.select(union).order_by(union.c.start_at, union.c.kind, union.c.id)
+
+        return db.session.execute(query).all()
+
+    @staticmethod
+    def _title(row) -> str:
+        """Titolo visualizzato per una riga evento"""
+        if row.kind == 'followup':
+            return f"Follow-up {row.numero} - {row.title}"
+        return row.title
+
+    @staticmethod
+    def get_feed(start: datetime, end: datetime) -> List[Dict]:
+        """Eventi nel formato FullCalendar per la finestra visibile [start, end)"""
+        if end <= start:
+            raise ValueError("La data di fine deve essere successiva alla data di inizio")
+        if (end - start).days > MAX_WINDOW_DAYS:
+            raise ValueError(f"Intervallo massimo consentito: {MAX_WINDOW_DAYS} giorni")
+
+        return [{
+            'id': f"{EVENT_ID_PREFIXES[row.kind]}{row.id}",
+            'title': CalendarService._title(row),
+            'start': row.start_at.isoformat(),
+            'type': row.tipologia if row.kind in ('appointment', 'other_appointment') else row.kind,
+            'color': row.color or EVENT_COLORS[row.kind],
+            'textColor': '#fff'
+        } for row in CalendarService._event_rows(start, end)]
+
+    @staticmethod
+    def get_day_events(start: datetime, end: datetime) -> List[Dict]:
+        """Eventi di un giorno nel formato della lista giornaliera del calendario"""
+        events = []
+
+        for row in CalendarService._event_rows(start, end):
+            event = {
+                'id': f'f{row.id}' if row.kind == 'followup' else row.id,
+                'title': CalendarService._title(row),
+                'start': row.start_at.strftime('%Y-%m-%d'),
+                'type': row.tipologia if row.kind in ('appointment', 'other_appointment') else row.kind
+            }
+            if row.kind != 'followup':
+                event['note'] = row.note
+            events.append(event)
+
+        return events
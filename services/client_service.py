@@ -1,8 +1,10 @@
 from datetime import datetime
 from typing import List, Dict, Optional
-from models.client import Client
+from models.client import Client, normalize_phone
+from models.search import CLIENT_FTS, CLIENT_FTS_WEIGHTS, build_match_query, has_search_index, is_phone_query
 from models.appointment import Appointment
 from models.user import db
+from sqlalchemy.orm import selectinload
 import logging
 import re
 
@@ -22,7 +24,7 @@ class ClientService:
         phone = ClientService._normalize_phone(appointment.numero_telefono)
         
         # Verifica se cliente esiste già
-        existing_client = Client.query.filter_by(numero_telefono=phone).first()
+        existing_client = Client.query.filter_by(telefono_normalizzato=phone).first()
         if existing_client:
             # Aggiorna informazioni se necessario
             if not existing_client.nome or len(appointment.nome_cliente) > len(existing_client.nome):
@@ -69,7 +71,7 @@ class ClientService:
             raise ValueError("Numero di telefono non valido")
         
         # Verifica se cliente esiste già
-        existing_client = Client.query.filter_by(numero_telefono=phone).first()
+        existing_client = Client.query.filter_by(telefono_normalizzato=phone).first()
         if existing_client:
             raise ValueError(f"Cliente con telefono {phone} già esistente")
         
@@ -115,7 +117,7 @@ class ClientService:
             
             # Verifica se nuovo telefono è già in uso
             existing = Client.query.filter(
-                Client.numero_telefono == new_phone,
+                Client.telefono_normalizzato == new_phone,
                 Client.id != client_id
             ).first()
             if existing:
@@ -140,19 +142,18 @@ class ClientService:
         if not client:
             raise ValueError("Cliente non trovato")
         
-        # Trova tutti gli appuntamenti correlati per telefono
-        appointments = Appointment.query.filter_by(
+        # Appuntamenti correlati per telefono, con follow-up e consulenti caricati in blocco
+        appointments = Appointment.query.options(
+            selectinload(Appointment.followups),
+            selectinload(Appointment.consultants)
+        ).filter_by(
             numero_telefono=client.numero_telefono
         ).order_by(Appointment.data_appuntamento.desc()).all()
         
-        # Follow-up correlati
-        from models.followup import FollowUp
+        # Follow-up correlati (già in sessione, nessuna query aggiuntiva)
         followups = []
         for appointment in appointments:
-            appointment_followups = FollowUp.query.filter_by(
-                appointment_id=appointment.id
-            ).order_by(FollowUp.data_prevista.desc()).all()
-            followups.extend(appointment_followups)
+            followups.extend(sorted(appointment.followups, key=lambda f: f.data_prevista, reverse=True))
         
         # Statistiche
         stats = {
@@ -171,29 +172,54 @@ class ClientService:
         return {
             'client': client.to_dict(),
             'appointments': [a.to_dict() for a in appointments],
-            'followups': [f.to_dict() if hasattr(f, 'to_dict') else {
-                'id': f.id,
-                'numero': f.numero,
-                'data_prevista': f.data_prevista.isoformat(),
-                'done': f.done,
-                'note': f.note
-            } for f in followups],
+            'followups': [f.to_dict() for f in followups],
             'stats': stats
         }
     
     @staticmethod
-    def search_clients(query: str, limit: int = 50) -> List[Client]:
-        """Ricerca clienti per nome, telefono o email"""
-        
-        search_pattern = f"%{query.strip()}%"
+    def build_search_query(text: Optional[str] = None, venduto: Optional[bool] = None):
+        """Query clienti filtrata: ricerca full-text per prefisso ordinata per rilevanza (FTS5 se disponibile),
+        per sottostringa sul telefono se il testo è un numero"""
+        
+        query = Client.query
+        match = build_match_query(text)
+        
+        # Numeri di telefono: ricerca per sottostringa (l'indice full-text trova solo i prefissi)
+        if text and is_phone_query(text):
+            digits = re.sub(r'\D', '', text)
+            query = query.filter(db.or_(
+                Client.numero_telefono.ilike(f"%{text.strip()}%"),
+                Client.telefono_normalizzato.ilike(f"%{digits}%")
+            )).order_by(Client.nome.asc())
+        elif match and has_search_index(CLIENT_FTS):
+            fts = db.table(CLIENT_FTS, db.column('rowid'))
+            weights = ', '.join(str(weight) for weight in CLIENT_FTS_WEIGHTS)
+            query = query.join(fts, fts.c.rowid == Client.id).filter(
+                db.text(f"{CLIENT_FTS} MATCH :match").bindparams(match=match)
+            ).order_by(db.text(f"bm25({CLIENT_FTS}, {weights})"), Client.nome.asc())
+        else:
+            if text and text.strip():
+                search_pattern = f"%{text.strip()}%"
+                query = query.filter(db.or_(
+                    Client.nome.ilike(search_pattern),
+                    Client.indirizzo.ilike(search_pattern),
+                    Client.numero_telefono.ilike(search_pattern),
+                    Client.email.ilike(search_pattern),
+                    Client.note.ilike(search_pattern)
+                ))
+            query = query.order_by(Client.nome.asc())
+        
+        if venduto is not None:
+            query = query.filter(Client.has_purchases == venduto)
+        
+        return query
+    
+    @staticmethod
+    def search_clients(query: str, limit: int = 50, page: int = 1) -> List[Client]:
+        """Ricerca clienti per nome, indirizzo, telefono, email o note (per rilevanza, paginata)"""
         
-        return Client.query.filter(
-            db.or_(
-                Client.nome.ilike(search_pattern),
-                Client.numero_telefono.ilike(search_pattern),
-                Client.email.ilike(search_pattern)
-            )
-        ).order_by(Client.nome.asc()).limit(limit).all()
+        page = max(1, page)
+        return ClientService.build_search_query(query).offset((page - 1) * limit).limit(limit).all()
     
     @staticmethod
     def get_clients_by_status(status: str = 'active') -> List[Client]:
@@ -256,25 +282,7 @@ class ClientService:
     @staticmethod
     def _normalize_phone(phone: str) -> str:
         """Normalizza numero di telefono"""
-        if not phone:
-            return ''
-        
-        # Rimuovi spazi, trattini e altri caratteri
-        normalized = re.sub(r'[^\d+]', '', phone.strip())
-        
-        # Gestisci prefisso italiano
-        if normalized.startswith('00393'):
-            normalized = '+39' + normalized[5:]
-        elif normalized.startswith('0039'):
-            normalized = '+39' + normalized[4:]
-        elif normalized.startswith('393'):
-            normalized = '+39' + normalized[3:]
-        elif normalized.startswith('39') and len(normalized) > 5:
-            normalized = '+39' + normalized[2:]
-        elif normalized.startswith('3') and len(normalized) == 10:
-            normalized = '+39' + normalized
-        
-        return normalized
+        return normalize_phone(phone)
     
     @staticmethod
     def _validate_phone(phone: str) -> bool:
@@ -0,0 +1,220 @@
+import csv
+import io
+import os
+import tempfile
+import zlib
+from datetime import datetime
+from typing import List, Optional, Iterable, Iterator, Callable
+from models.appointment import Appointment
+from models.database import appointment_consultant
+from sqlalchemy.orm import selectinload
+from services.stats_service import StatsService
+from utils import DateUtils
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import xlsxwriter
+    XLSX_AVAILABLE = True
+except ImportError:
+    xlsxwriter = None
+    XLSX_AVAILABLE = False
+
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+# Righe lette dal database per blocco (cursore lato server dove supportato)
+YIELD_PER = 1000
+
+# Righe CSV accumulate prima di inviare un blocco al client
+CSV_FLUSH_ROWS = 500
+
+# Dimensione dei blocchi letti dal file XLSX temporaneo
+FILE_CHUNK_SIZE = 64 * 1024
+
+APPOINTMENT_HEADERS = [
+    'Cliente', 'Telefono', 'Indirizzo', 'Data', 'Tipologia', 'Stato', 'Venduto',
+    'Nominativi raccolti', 'Appuntamenti personali', 'Consulenti', 'Note'
+]
+
+PERFORMANCE_HEADERS = [
+    'Posizione', 'Consulente', 'Totale appuntamenti', 'Vendite',
+    'Tasso di conversione (%)', 'Nominativi raccolti', 'Appuntamenti personali'
+]
+
+def _csv_value(value):
+    """Valore di cella CSV (date in formato italiano, booleani Sì/No)"""
+    if isinstance(value, datetime):
+        return value.strftime('%d/%m/%Y %H:%M')
+    if isinstance(value, bool):
+        return 'Sì' if value else 'No'
+    return '' if value is None else value
+
+def _counting(rows, on_row):
+    """Inoltra le righe notificando il conteggio progressivo"""
+    for count, row in enumerate(rows, 1):
+        on_row(count)
+        yield row
+
+class ExportService:
+    """Esportazione CSV/XLSX in streaming di report ed elenchi appuntamenti"""
+
+    @staticmethod
+    def appointment_rows(date_from: datetime,
+                         date_to: datetime,
+                         include_excluded: bool = True,
+                         consultant_id: Optional[int] = None) -> Iterator[List]:
+        """Righe degli appuntamenti nell'intervallo [date_from, date_to), lette a blocchi"""
+
+        query = (Appointment.query
+                 .options(selectinload(Appointment.consultants))
+                 .filter(*DateUtils.range_filter(Appointment.data_appuntamento, date_from, date_to))
+                 .order_by(Appointment.data_appuntamento, Appointment.id))
+
+        if consultant_id:
+            query = query.join(
+                appointment_consultant,
+                appointment_consultant.c.appointment_id == Appointment.id
+            ).filter(appointment_consultant.c.consultant_id == consultant_id)
+
+        if not include_excluded:
+            query = query.filter(Appointment.include_in_reports == True)
+
+        for a in query.yield_per(YIELD_PER):
+            yield [
+                a.nome_cliente,
+                a.numero_telefono,
+                a.indirizzo,
+                a.data_appuntamento,
+                a.tipologia,
+                a.stato,
+                bool(a.venduto),
+                a.nominativi_raccolti or 0,
+                a.appuntamenti_personali or 0,
+                ', '.join(c.nome for c in a.consultants),
+                a.note
+            ]
+
+    @staticmethod
+    def performance_rows(date_from: datetime,
+                         date_to: datetime,
+                         include_excluded: bool = True) -> Iterator[List]:
+        """Righe della classifica consulenti nell'intervallo [date_from, date_to)"""
+
+        for entry in StatsService.consultant_ranking(date_from, date_to, include_excluded=include_excluded):
+            yield [
+                entry['rank'],
+                entry['nome'],
+                entry['total_appointments'],
+                entry['sold_appointments'],
+                entry['conversion_rate'],
+                entry['total_nominativi'],
+                entry['total_personali']
+            ]
+
+    @staticmethod
+    def stream_csv(headers: List[str], rows: Iterable[List]) -> Iterator[bytes]:
+        """CSV in UTF-8 (con BOM e separatore ';' per Excel in italiano) emesso a blocchi"""
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';')
+
+        buffer.write('\ufeff')
+        writer.writerow(headers)
+
+        for count, row in enumerate(rows, 1):
+            writer.writerow([_csv_value(value) for value in row])
+
+            if count % CSV_FLUSH_ROWS == 0:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue().encode('utf-8')
+
+    @staticmethod
+    def stream_xlsx(headers: List[str], rows: Iterable[List], sheet_name: str = 'Report') -> Iterator[bytes]:
+        """XLSX scritto riga per riga in modalità constant_memory, poi inviato a blocchi
+
+        Il formato zip richiede il file completo prima dell'invio: si usa un file temporaneo.
+        """
+
+        if not XLSX_AVAILABLE:
+            raise RuntimeError("XlsxWriter non installato: esportazione XLSX non disponibile")
+
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+
+        try:
+            workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+            worksheet = workbook.add_worksheet(sheet_name)
+            bold = workbook.add_format({'bold': True})
+            date_format = workbook.add_format({'num_format': 'dd/mm/yyyy hh:mm'})
+
+            worksheet.write_row(0, 0, headers, bold)
+
+            for row_index, row in enumerate(rows, 1):
+                for col_index, value in enumerate(row):
+                    if isinstance(value, datetime):
+                        worksheet.write_datetime(row_index, col_index, value, date_format)
+                    else:
+                        worksheet.write(row_index, col_index, _csv_value(value))
+
+            workbook.close()
+
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(FILE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(path)
+
+    @staticmethod
+    def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+        """Comprime al volo in formato gzip uno stream di blocchi"""
+
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    @staticmethod
+    def export_report(report_type: str,
+                      export_format: str,
+                      date_from: datetime,
+                      date_to: datetime,
+                      include_excluded: bool = True,
+                      on_row: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+        """Stream del report richiesto nel formato indicato ('csv' o 'xlsx')
+
+        on_row, se indicato, riceve il numero di righe scritte (progresso dei job in background).
+        """
+
+        if export_format not in EXPORT_MIMETYPES:
+            raise ValueError(f"Formato di esportazione non valido: {export_format}")
+
+        if report_type == 'appointments':
+            headers = APPOINTMENT_HEADERS
+            rows = ExportService.appointment_rows(date_from, date_to, include_excluded)
+        elif report_type == 'performance':
+            headers = PERFORMANCE_HEADERS
+            rows = ExportService.performance_rows(date_from, date_to, include_excluded)
+        else:
+            raise ValueError("Tipo di report non valido")
+
+        if on_row:
+            rows = _counting(rows, on_row)
+
+        if export_format == 'xlsx':
+            if not XLSX_AVAILABLE:
+                raise RuntimeError("XlsxWriter non installato: esportazione XLSX non disponibile")
+            return ExportService.stream_xlsx(headers, rows, sheet_name=report_type.capitalize())
+
+        return ExportService.stream_csv(headers, rows)
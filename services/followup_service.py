@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
-from models.followup import FollowUp
+from models.followup import FollowUp, bulk_schedule_followups
 from models.appointment import Appointment
 from models.consultant import Consultant
 from models.user import db
@@ -21,52 +21,50 @@ class FollowUpService:
         {'numero': 6, 'days': 360, 'title': 'Follow-up annuale'}
     ]
     
+    @staticmethod
+    def _automatic_note(appointment: Appointment) -> str:
+        """Nota dei follow-up automatici"""
+        return (f"Follow-up automatico per vendita del {appointment.data_appuntamento.strftime('%d/%m/%Y')}.\n"
+                f"Cliente: {appointment.nome_cliente}\nTelefono: {appointment.numero_telefono}")
+    
+    @staticmethod
+    def schedule_bulk_followups(appointments: List[Appointment]) -> List[Dict]:
+        """Pianifica i follow-up automatici mancanti per più appuntamenti venduti (senza commit)"""
+        
+        windows = [(schedule['numero'], timedelta(days=schedule['days']))
+                   for schedule in FollowUpService.DEFAULT_FOLLOWUP_SCHEDULE]
+        
+        # Non creare follow-up per date già passate (oltre 1 settimana)
+        inserted = bulk_schedule_followups(
+            appointments,
+            windows=windows,
+            note_for=FollowUpService._automatic_note,
+            not_before=datetime.now() - timedelta(days=7)
+        )
+        
+        logger.info(f"Creati {len(inserted)} follow-up automatici per {len(appointments)} appuntamenti")
+        return inserted
+    
     @staticmethod
     def schedule_automatic_followups(appointment: Appointment) -> List[FollowUp]:
-        """Pianifica follow-up automatici per appuntamento venduto"""
+        """Pianifica follow-up automatici per appuntamento venduto (il commit è del chiamante)"""
         
         if not appointment.venduto:
             logger.warning(f"Tentativo di pianificare follow-up per appuntamento non venduto: {appointment.id}")
             return []
         
-        created_followups = []
-        base_date = appointment.data_appuntamento
-        
-        for schedule in FollowUpService.DEFAULT_FOLLOWUP_SCHEDULE:
-            due_date = base_date + timedelta(days=schedule['days'])
-            
-            # Non creare follow-up per date già passate (oltre 1 settimana)
-            if due_date < datetime.now() - timedelta(days=7):
-                continue
-            
-            # Verifica se esiste già un follow-up simile per questo numero
-            existing = FollowUp.query.filter_by(
-                appointment_id=appointment.id,
-                numero=schedule['numero']
-            ).first()
-            
-            if existing:
-                continue
-            
-            followup = FollowUp(
-                appointment_id=appointment.id,
-                numero=schedule['numero'],
-                data_prevista=due_date,
-                done=False,
-                note=f"Follow-up automatico per vendita del {appointment.data_appuntamento.strftime('%d/%m/%Y')}.\nCliente: {appointment.nome_cliente}\nTelefono: {appointment.numero_telefono}"
-            )
-            
-            db.session.add(followup)
-            created_followups.append(followup)
+        if appointment.id is None:
+            db.session.flush()
         
-        try:
-            db.session.commit()
-            logger.info(f"Creati {len(created_followups)} follow-up automatici per appuntamento {appointment.id}")
-            return created_followups
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Errore creazione follow-up automatici: {e}")
-            raise
+        inserted = FollowUpService.schedule_bulk_followups([appointment])
+        if not inserted:
+            return []
+        
+        return (FollowUp.query
+                .filter(FollowUp.appointment_id == appointment.id,
+                        FollowUp.numero.in_([row['numero'] for row in inserted]))
+                .order_by(FollowUp.numero)
+                .all())
     
     @staticmethod
     def create_manual_followup(appointment_id: int, data: Dict, user_id: int) -> FollowUp:
@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+from flask import current_app
+from models.job import Job, JOB_QUEUED, JOB_RUNNING, JOB_COMPLETED, JOB_FAILED, JOB_ACTIVE_STATES
+from models.user import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Thread che eseguono i job (configurabile con JOB_WORKERS)
+DEFAULT_JOB_WORKERS = 2
+
+# Giorni di conservazione dei risultati su disco
+JOB_RESULT_TTL_DAYS = 7
+
+# Intervallo minimo tra due scritture del progresso dello stesso job sulla tabella job
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+_handlers: Dict[str, Callable] = {}
+_executor = None
+_executor_lock = threading.Lock()
+
+def _process_alive(pid: Optional[int]) -> bool:
+    """True se il processo indicato è ancora in esecuzione (nel dubbio True)"""
+    if not pid or pid == os.getpid():
+        return True
+
+    try:
+        import psutil
+        return psutil.pid_exists(pid)
+    except ImportError:
+        pass
+
+    if os.name == 'nt':
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobContext:
+    """Contesto passato agli handler: percorso del risultato e aggiornamento del progresso"""
+
+    def __init__(self, job_id: str, results_dir: str):
+        self.job_id = job_id
+        self.results_dir = results_dir
+        self._last_update = 0.0
+
+    def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None, force: bool = False):
+        """Aggiorna il progresso (done su total, oppure percentuale diretta se total è None)"""
+        now = datetime.now().timestamp()
+        if not force and now - self._last_update < PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_update = now
+
+        percent = done if total is None else (int(done * 100 / total) if total else 0)
+        values = {'progress': max(0, min(99, percent))}
+        if message is not None:
+            values['message'] = message[:200]
+
+        # Scritto sul record (transazione breve, WAL) perché lo legga qualunque worker risponda al polling
+        try:
+            JobService._update(self.job_id, **values)
+        except Exception as e:
+            logger.warning(f"Progresso del job {self.job_id} non salvato: {e}")
+
+    def result_path(self, extension: str) -> str:
+        """Percorso del file risultato del job"""
+        os.makedirs(self.results_dir, exist_ok=True)
+        return os.path.join(self.results_dir, f'{self.job_id}.{extension}')
+
+    def write_json(self, data, filename: str) -> Dict:
+        """Salva un risultato JSON e ne ritorna la descrizione"""
+        with open(self.result_path('json'), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        return {'path': self.result_path('json'), 'filename': filename, 'mimetype': 'application/json'}
+
+class JobService:
+    """Coda di job in background nel processo, con stato e progresso persistiti nella tabella job
+
+    Un job viene eseguito dal processo che lo ha accodato: se quel processo termina (riavvio, riciclo
+    del worker gunicorn con max_requests) il job risulta fallito alla prima lettura del suo stato.
+    """
+
+    @staticmethod
+    def register(kind: str, handler: Callable[[Dict, JobContext], Dict]) -> None:
+        """Registra l'handler di un tipo di job
+
+        L'handler riceve (params, context) e ritorna {'path', 'filename', 'mimetype'} del risultato.
+        """
+        _handlers[kind] = handler
+
+    @staticmethod
+    def _get_executor() -> ThreadPoolExecutor:
+        """Pool di thread condiviso, creato al primo job"""
+        global _executor
+        with _executor_lock:
+            if _executor is None:
+                workers = int(current_app.config.get('JOB_WORKERS', os.getenv('JOB_WORKERS', DEFAULT_JOB_WORKERS)))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+            return _executor
+
+    @staticmethod
+    def results_dir(app=None) -> str:
+        """Cartella dei risultati dei job (instance/jobs)"""
+        app = app or current_app
+        return app.config.get('JOB_RESULTS_DIR') or os.path.join(app.instance_path, 'jobs')
+
+    @staticmethod
+    def submit(kind: str, params: Dict, user_id: Optional[int] = None) -> Job:
+        """Accoda un job e ritorna subito il record persistito"""
+        if kind not in _handlers:
+            raise ValueError(f"Tipo di job sconosciuto: {kind}")
+
+        JobService.cleanup_expired()
+
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            params=params,
+            status=JOB_QUEUED,
+            owner_pid=os.getpid(),
+            created_by=user_id
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        app = current_app._get_current_object()
+        JobService._get_executor().submit(JobService._run, app, job.id)
+        logger.info(f"Job {job.id} ({kind}) accodato")
+        return job
+
+    @staticmethod
+    def _update(job_id: str, **values) -> None:
+        """Aggiorna il record del job con una transazione dedicata"""
+        with db.engine.begin() as conn:
+            conn.execute(Job.__table__.update().where(Job.__table__.c.id == job_id).values(**values))
+
+    @staticmethod
+    def _run(app, job_id: str) -> None:
+        """Esegue il job in un thread del pool"""
+        with app.app_context():
+            try:
+                job = db.session.get(Job, job_id)
+                params = dict(job.params or {})
+                handler = _handlers[job.kind]
+                db.session.remove()
+
+                JobService._update(job_id, status=JOB_RUNNING, started_at=datetime.utcnow())
+                context = JobContext(job_id, JobService.results_dir(app))
+                context.progress(0, message='Avviato', force=True)
+
+                result = handler(params, context)
+                db.session.remove()
+
+                JobService._update(
+                    job_id,
+                    status=JOB_COMPLETED,
+                    progress=100,
+                    message='Completato',
+                    result_path=result['path'],
+                    result_name=result['filename'],
+                    result_mimetype=result['mimetype'],
+                    finished_at=datetime.utcnow()
+                )
+                logger.info(f"Job {job_id} completato")
+
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Errore job {job_id}: {e}")
+                JobService._update(job_id, status=JOB_FAILED, error=str(e), finished_at=datetime.utcnow())
+
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def get_job(job_id: str) -> Optional[Job]:
+        """Job per id (segnato come fallito se il processo che lo eseguiva non esiste più)"""
+        job = db.session.get(Job, job_id)
+        if job is None:
+            return None
+
+        if job.is_active() and not _process_alive(job.owner_pid):
+            # Processo terminato (riavvio del server) con il job ancora aperto
+            job.status = JOB_FAILED
+            job.error = 'Job interrotto dal riavvio del server'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+        return job
+
+    @staticmethod
+    def cleanup_expired(days: int = JOB_RESULT_TTL_DAYS) -> int:
+        """Elimina job conclusi e risultati più vecchi di days giorni"""
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        expired = Job.query.filter(Job.created_at < cutoff, Job.status.notin_(JOB_ACTIVE_STATES)).all()
+
+        for job in expired:
+            if job.result_path and os.path.exists(job.result_path):
+                try:
+                    os.remove(job.result_path)
+                except OSError as e:
+                    logger.warning(f"Impossibile rimuovere il risultato del job {job.id}: {e}")
+            db.session.delete(job)
+
+        if expired:
+            db.session.commit()
+        return len(expired)
@@ -0,0 +1,102 @@
+"""
+Caricamento dei modelli AI in background
+
+I modelli vengono caricati in un thread al primo utilizzo (o con un warmup esplicito);
+finché non sono pronti i servizi AI rispondono con il percorso di fallback.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Dopo un errore di caricamento si riprova al primo utilizzo successivo a questo intervallo
+RETRY_AFTER_SECONDS = 60
+
+class ModelLoader:
+    """Esegue una funzione di caricamento una sola volta, in un thread, e ne espone lo stato"""
+
+    DISABLED = 'disabled'
+    IDLE = 'idle'
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, name: str, load: Callable[[], None], enabled: bool = True):
+        self.name = name
+        self._load = load
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self.state = self.IDLE if enabled else self.DISABLED
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._failed_at = 0.0
+        self._pid = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == self.READY
+
+    def start(self) -> str:
+        """Avvia il caricamento se non è già in corso o completato; restituisce lo stato"""
+        with self._lock:
+            # Caricamento avviato nel processo padre prima di un fork: il thread non esiste più qui
+            if self.state == self.LOADING and self._pid != os.getpid():
+                self.state = self.IDLE
+            if self.state == self.FAILED and time.monotonic() - self._failed_at < RETRY_AFTER_SECONDS:
+                return self.state
+            if self.state not in (self.IDLE, self.FAILED):
+                return self.state
+
+            self.state = self.LOADING
+            self.error = None
+            self.started_at = datetime.now()
+            self.finished_at = None
+            self._pid = os.getpid()
+            self._done.clear()
+
+        threading.Thread(target=self._run, name=f'model-loader-{self.name}', daemon=True).start()
+        return self.LOADING
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Attende la fine del caricamento in corso; True se i modelli sono pronti"""
+        if self.state == self.LOADING:
+            self._done.wait(timeout)
+        return self.ready
+
+    def _run(self) -> None:
+        started = time.monotonic()
+        try:
+            self._load()
+            state, error = self.READY, None
+            logger.info(f"Modelli AI '{self.name}' pronti in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            state, error = self.FAILED, str(e)
+            self._failed_at = time.monotonic()
+            logger.error(f"Caricamento modelli AI '{self.name}' fallito: {e}")
+
+        with self._lock:
+            self.state = state
+            self.error = error
+            self.finished_at = datetime.now()
+        self._done.set()
+
+    def status(self) -> Dict:
+        """Stato del caricamento per l'endpoint /ai/status"""
+        load_seconds = None
+        if self.started_at and self.finished_at:
+            load_seconds = round((self.finished_at - self.started_at).total_seconds(), 1)
+
+        return {
+            'name': self.name,
+            'state': self.state,
+            'ready': self.ready,
+            'error': self.error,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'load_seconds': load_seconds
+        }
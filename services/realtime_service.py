@@ -0,0 +1,264 @@
+"""
+Notifiche real-time via Socket.IO delle modifiche ad appuntamenti e follow-up
+
+Le modifiche vengono raccolte durante i flush e inviate solo dopo il commit, alle stanze:
+- 'role:<ruolo>' (es. role:admin, che riceve tutto)
+- 'consultant:<id>' (il dealer riceve solo gli eventi dei propri appuntamenti)
+"""
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, attributes
+from flask_login import current_user
+from models.database import db, appointment_consultant
+from models.appointment import Appointment
+from models.consultant import Consultant
+from models.table_version import on_tables_committed
+import logging
+
+logger = logging.getLogger(__name__)
+
+ADMIN_ROOM = 'role:admin'
+
+# Follow-up inseriti con INSERT in blocco (models.followup.bulk_schedule_followups), senza oggetti nel flush
+BULK_FOLLOWUPS_KEY = 'bulk_inserted_followups'
+
+# Tabelle i cui cambiamenti modificano i contatori della dashboard admin
+STATS_TABLES = {'appointment', 'appointment_consultant', 'consultant', 'user'}
+
+_socketio = None
+
+def consultant_room(consultant_id: int) -> str:
+    return f'consultant:{consultant_id}'
+
+class RealtimeService:
+    """Registrazione degli handler Socket.IO e invio degli eventi alle stanze"""
+
+    @staticmethod
+    def init_socketio(socketio) -> None:
+        """Collega l'istanza SocketIO e registra gli handler di connessione"""
+        global _socketio
+        _socketio = socketio
+
+        from flask_socketio import join_room
+
+        @socketio.on('connect')
+        def handle_connect(auth=None):
+            """Connessione Socket.IO: solo utenti autenticati, nelle stanze di ruolo e consulente"""
+            if not current_user.is_authenticated:
+                return False
+
+            join_room(f'role:{current_user.role}')
+            if current_user.consultant_id:
+                join_room(consultant_room(current_user.consultant_id))
+
+        @socketio.on('disconnect')
+        def handle_disconnect():
+            """Disconnessione Socket.IO (le stanze vengono lasciate automaticamente)"""
+            pass
+
+    @staticmethod
+    def broadcast(event_name: str, payload: dict, rooms) -> None:
+        """Invia l'evento alle stanze indicate, una sola volta a chi è in più stanze (i delta non vanno ripetuti)"""
+        if _socketio is None:
+            return
+
+        rooms = list(rooms)
+        try:
+            _socketio.emit(event_name, payload, to=rooms)
+        except Exception as e:
+            logger.warning(f"Invio evento {event_name} a {rooms} fallito: {e}")
+
+def _rooms(consultant_ids):
+    return [ADMIN_ROOM] + [consultant_room(cid) for cid in sorted(consultant_ids)]
+
+def _changed(obj, key):
+    return attributes.get_history(obj, key).has_changes()
+
+def _appointment_change(session, obj):
+    """Evento di un appuntamento inserito, modificato o eliminato nel flush"""
+    # Consulenti attuali e rimossi, senza caricare la relazione se non è in memoria
+    consultants = attributes.get_history(obj, 'consultants', passive=attributes.PASSIVE_NO_INITIALIZE)
+    consultant_ids = {c.id for c in consultants.sum() if c.id}
+    added_ids = sorted(c.id for c in consultants.added if c.id) if obj in session.dirty else []
+    removed_ids = sorted(c.id for c in consultants.deleted if c.id) if obj in session.dirty else []
+
+    if obj in session.deleted:
+        action = 'deleted'
+        delta = {'appointments': -1, 'sold': -1 if obj.venduto else 0}
+    elif obj in session.new:
+        action = 'created'
+        delta = {'appointments': 1, 'sold': 1 if obj.venduto else 0}
+    else:
+        action = 'updated'
+        delta = {'appointments': 0, 'sold': 0}
+        if _changed(obj, 'venduto'):
+            delta['sold'] = 1 if obj.venduto else -1
+
+    return {
+        'event': 'appointment_changed',
+        'appointment_id': obj.id,
+        'consultant_ids': consultant_ids,
+        'payload': {
+            'action': action,
+            'id': obj.id,
+            'nome_cliente': obj.nome_cliente,
+            'tipologia': obj.tipologia,
+            'stato': obj.stato,
+            'venduto': bool(obj.venduto),
+            'data_appuntamento': obj.data_appuntamento.isoformat() if obj.data_appuntamento else None,
+            'consultants': [],
+            # Assegnazioni cambiate: per il dealer l'appuntamento entra o esce dalla propria dashboard
+            'added_consultant_ids': added_ids,
+            'removed_consultant_ids': removed_ids,
+            'delta': delta
+        }
+    }
+
+def _followup_change(session, obj):
+    """Evento di un follow-up inserito, completato, rinviato o eliminato nel flush"""
+    if obj in session.deleted:
+        action = 'deleted'
+    elif obj in session.new:
+        action = 'created'
+    elif _changed(obj, 'done') and obj.done:
+        action = 'completed'
+    elif _changed(obj, 'data_prevista'):
+        action = 'postponed'
+    else:
+        action = 'updated'
+
+    return _followup_event(action, obj.id, obj.appointment_id, obj.numero, obj.done, obj.data_prevista)
+
+def _followup_event(action, followup_id, appointment_id, numero, done, data_prevista):
+    return {
+        'event': 'followup_changed',
+        'appointment_id': appointment_id,
+        'consultant_ids': set(),
+        'payload': {
+            'action': action,
+            'id': followup_id,
+            'appointment_id': appointment_id,
+            'nome_cliente': None,
+            'numero_telefono': None,
+            'numero': numero,
+            'done': bool(done),
+            'data_prevista': data_prevista.isoformat() if data_prevista else None
+        }
+    }
+
+# Raccolta delle modifiche: attiva solo se Socket.IO è stato inizializzato
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    """Annota gli eventi degli appuntamenti e follow-up scritti nel flush"""
+    if _socketio is None:
+        return
+
+    changes = session.info.setdefault('realtime_changes', [])
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table == 'appointment':
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            changes.append(_appointment_change(session, obj))
+        elif table == 'follow_up':
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            changes.append(_followup_change(session, obj))
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _resolve_consultants(session, flush_context):
+    """Completa gli eventi del flush con consulenti e dati del cliente"""
+    changes = session.info.get('realtime_changes')
+    if changes:
+        _resolve_changes(session, changes)
+
+@event.listens_for(Session, 'before_commit')
+def _collect_bulk_followups(session):
+    """Eventi 'created' per i follow-up inseriti in blocco nella transazione"""
+    if session.in_nested_transaction():
+        return
+
+    rows = session.info.pop(BULK_FOLLOWUPS_KEY, None)
+    if not rows or _socketio is None:
+        return
+
+    changes = [_followup_event('created', row['id'], row['appointment_id'], row['numero'],
+                               row['done'], row['data_prevista']) for row in rows]
+    _resolve_changes(session, changes)
+    session.info.setdefault('realtime_changes', []).extend(changes)
+
+def _resolve_changes(session, changes):
+    """Completa consulenti e dati del cliente degli eventi con query sulle tabelle collegate"""
+    appointment_ids = {c['appointment_id'] for c in changes if c['appointment_id']}
+    if not appointment_ids:
+        return
+
+    connection = session.connection()
+    rows = connection.execute(
+        db.select(appointment_consultant.c.appointment_id, Consultant.id, Consultant.nome)
+        .join(Consultant, Consultant.id == appointment_consultant.c.consultant_id)
+        .where(appointment_consultant.c.appointment_id.in_(appointment_ids))
+    )
+    by_appointment = {}
+    names = {}
+    for appointment_id, consultant_id, nome in rows:
+        by_appointment.setdefault(appointment_id, set()).add(consultant_id)
+        names.setdefault(appointment_id, []).append(nome)
+
+    # Cliente dei follow-up, per le righe della dashboard
+    followup_appointments = {c['appointment_id'] for c in changes if c['event'] == 'followup_changed'}
+    clients = {}
+    if followup_appointments:
+        clients = {row.id: row for row in connection.execute(
+            db.select(Appointment.id, Appointment.nome_cliente, Appointment.numero_telefono)
+            .where(Appointment.id.in_(followup_appointments))
+        )}
+
+    for change in changes:
+        payload = change['payload']
+        if change['event'] == 'appointment_changed':
+            payload['consultants'] = sorted(names.get(change['appointment_id'], []))
+        elif change['appointment_id'] in clients:
+            client = clients[change['appointment_id']]
+            payload['nome_cliente'], payload['numero_telefono'] = client.nome_cliente, client.numero_telefono
+
+    # Appuntamenti eliminati: consulenti letti dagli oggetti prima della cancellazione
+    for change in changes:
+        if change['event'] == 'appointment_changed':
+            by_appointment.setdefault(change['appointment_id'], set()).update(change['consultant_ids'])
+
+    for change in changes:
+        change['consultant_ids'] |= by_appointment.get(change['appointment_id'], set())
+
+@event.listens_for(Session, 'after_commit')
+def _send_changes(session):
+    """Invia gli eventi della transazione confermata"""
+    if session.in_nested_transaction():
+        return  # Savepoint: si invia al commit della transazione esterna
+
+    changes = session.info.pop('realtime_changes', None)
+    if not changes:
+        return
+
+    for change in changes:
+        payload = dict(change['payload'], consultant_ids=sorted(change['consultant_ids']))
+        RealtimeService.broadcast(change['event'], payload, _rooms(change['consultant_ids']))
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    """Nessun evento se la transazione viene annullata"""
+    if not session.in_nested_transaction():
+        session.info.pop('realtime_changes', None)
+        session.info.pop(BULK_FOLLOWUPS_KEY, None)
+
+@on_tables_committed
+def _notify_stats_changed(tables):
+    """Avvisa le dashboard admin che i contatori sono cambiati
+
+    I contatori degli appuntamenti sono aggiornati dal delta di appointment_changed;
+    la dashboard rilegge le metriche solo per consulenti e utenti.
+    """
+    changed = STATS_TABLES & tables
+    if changed and _socketio is not None:
+        RealtimeService.broadcast('stats_changed', {'tables': sorted(changed)}, [ADMIN_ROOM])
@@ -0,0 +1,101 @@
+from typing import List, Dict, Optional, Iterable
+from models.search import SEARCH_FTS, SEARCH_KIND_CODES, build_match_query, has_search_index
+from models.user import db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Codice sorgente → tipo del risultato
+SEARCH_KINDS = {code: kind for kind, code in SEARCH_KIND_CODES.items()}
+
+# Limiti per la ricerca type-ahead
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MIN_QUERY_LENGTH = 2
+
+class SearchService:
+    """Ricerca globale full-text su appuntamenti, clienti, note e follow-up"""
+
+    @staticmethod
+    def is_available() -> bool:
+        """True se l'indice globale di ricerca è presente"""
+        return has_search_index(SEARCH_FTS)
+
+    @staticmethod
+    def search(text: str,
+               types: Optional[Iterable[str]] = None,
+               consultant_id: Optional[int] = None,
+               limit: int = DEFAULT_LIMIT) -> List[Dict]:
+        """Risultati tipizzati: prima le corrispondenze nel titolo, poi nel testo, dai più recenti
+
+        Con consultant_id appuntamenti e follow-up sono limitati a quelli del consulente.
+        """
+        return SearchService._search(text, types, consultant_id, min(max(1, limit), MAX_LIMIT))
+
+    @staticmethod
+    def _search(text: str, types: Optional[Iterable[str]], consultant_id: Optional[int], limit: int) -> List[Dict]:
+        """Ricerca senza il limite massimo della type-ahead"""
+        match = build_match_query(text)
+        if not match or len(text.strip()) < MIN_QUERY_LENGTH:
+            return []
+
+        if not SearchService.is_available():
+            raise RuntimeError("Indice di ricerca non disponibile")
+
+        codes = [SEARCH_KIND_CODES[kind] for kind in (types or SEARCH_KIND_CODES)]
+
+        where = []
+        params = {}
+
+        if len(codes) < len(SEARCH_KIND_CODES):
+            where.append(f"(rowid % 4) IN ({', '.join(str(code) for code in codes)})")
+
+        if consultant_id:
+            # Appuntamenti e follow-up solo del consulente (l'id sorgente è rowid / 4)
+            where.append(f"""(
+                (rowid % 4) NOT IN (0, 3)
+                OR ((rowid % 4) = 0 AND rowid / 4 IN (
+                    SELECT appointment_id FROM appointment_consultant WHERE consultant_id = :consultant_id))
+                OR ((rowid % 4) = 3 AND rowid / 4 IN (
+                    SELECT follow_up.id FROM follow_up
+                    JOIN appointment_consultant ON appointment_consultant.appointment_id = follow_up.appointment_id
+                    WHERE appointment_consultant.consultant_id = :consultant_id))
+            )""")
+            params['consultant_id'] = consultant_id
+
+        # Ordinamento per rowid decrescente: FTS5 legge solo le prime righe utili
+        # (niente bm25, che richiede di contare tutte le corrispondenze di ogni termine)
+        results = []
+        seen = set()
+        for matched_in, expression in (('title', f'title : ({match})'), ('text', match)):
+            conditions = [f"{SEARCH_FTS} MATCH :match"] + where
+            if seen:
+                conditions.append(f"rowid NOT IN ({', '.join(str(rowid) for rowid in seen)})")
+
+            rows = db.session.execute(db.text(f"""
+                SELECT rowid, title, snippet({SEARCH_FTS}, -1, '', '', '…', 12) AS snippet
+                FROM {SEARCH_FTS}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY rowid DESC
+                LIMIT :limit
+            """), dict(params, match=expression, limit=limit - len(results))).all()
+
+            for row in rows:
+                seen.add(row.rowid)
+                results.append({
+                    'type': SEARCH_KINDS[row.rowid % 4],
+                    'id': row.rowid // 4,
+                    'title': row.title,
+                    'snippet': row.snippet,
+                    'matched_in': matched_in
+                })
+
+            if len(results) >= limit:
+                break
+
+        return results
+
+    @staticmethod
+    def search_ids(text: str, kind: str, limit: int = DEFAULT_LIMIT) -> List[int]:
+        """Id della sorgente indicata, nello stesso ordine dei risultati di ricerca (limit non limitato a MAX_LIMIT)"""
+        return [hit['id'] for hit in SearchService._search(text, [kind], None, max(1, limit))]
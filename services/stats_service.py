@@ -0,0 +1,349 @@
+from datetime import datetime
+from typing import List, Dict, Optional
+from models.appointment import Appointment
+from models.consultant import Consultant
+from models.database import appointment_consultant
+from models.daily_stats import DailyStats, ALL_CONSULTANTS
+from models.user import db
+from utils.cache import cached
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tipologie note e relativa chiave nei dizionari di statistiche
+TIPOLOGIE = {
+    'Assistenza': 'assistenza',
+    'Dimostrazione': 'dimostrazione',
+    'Consumabili': 'consumabili'
+}
+
+class StatsService:
+    """Aggregazioni statistiche calcolate in SQL (GROUP BY bucket × tipologia × venduto)
+
+    Gli intervalli a giorni interi leggono l'aggregato daily_stats invece degli appuntamenti.
+    """
+
+    BUCKET_FORMATS = {
+        'day': ('%Y-%m-%d', 'YYYY-MM-DD'),
+        'month': ('%Y-%m', 'YYYY-MM'),
+        'year': ('%Y', 'YYYY')
+    }
+
+    @staticmethod
+    def _bucket_expr(column, granularity: str):
+        """Espressione SQL che tronca la data al bucket richiesto"""
+        sqlite_fmt, pg_fmt = StatsService.BUCKET_FORMATS[granularity]
+
+        if db.engine.dialect.name == 'sqlite':
+            return db.func.strftime(sqlite_fmt, column)
+        return db.func.to_char(column, pg_fmt)
+
+    @staticmethod
+    def grouped_counts(consultant_id: Optional[int] = None,
+                       date_from: Optional[datetime] = None,
+                       date_to: Optional[datetime] = None,
+                       granularity: Optional[str] = None,
+                       include_excluded: bool = True) -> List:
+        """Righe compatte (bucket, tipologia, venduto, total, nominativi, personali)
+
+        L'intervallo date è semiaperto: [date_from, date_to).
+        """
+
+        if StatsService.is_day_aligned(date_from) and StatsService.is_day_aligned(date_to):
+            return StatsService._rollup_grouped_counts(consultant_id, date_from, date_to,
+                                                       granularity, include_excluded)
+
+        bucket = (StatsService._bucket_expr(Appointment.data_appuntamento, granularity).label('bucket')
+                  if granularity else db.literal(None).label('bucket'))
+
+        query = db.session.query(
+            bucket,
+            Appointment.tipologia,
+            Appointment.venduto,
+            db.func.count(Appointment.id).label('total'),
+            db.func.coalesce(db.func.sum(Appointment.nominativi_raccolti), 0).label('nominativi'),
+            db.func.coalesce(db.func.sum(Appointment.appuntamenti_personali), 0).label('personali')
+        )
+
+        if consultant_id:
+            query = query.join(
+                appointment_consultant,
+                appointment_consultant.c.appointment_id == Appointment.id
+            ).filter(appointment_consultant.c.consultant_id == consultant_id)
+
+        if date_from:
+            query = query.filter(Appointment.data_appuntamento >= date_from)
+        if date_to:
+            query = query.filter(Appointment.data_appuntamento < date_to)
+        if not include_excluded:
+            query = query.filter(Appointment.include_in_reports == True)
+
+        group_by = [Appointment.tipologia, Appointment.venduto]
+        if granularity:
+            group_by.insert(0, bucket)
+
+        return query.group_by(*group_by).all()
+
+    @staticmethod
+    def is_day_aligned(value: Optional[datetime]) -> bool:
+        """True se la data è assente o a mezzanotte (confine di giorno dell'aggregato)"""
+        return value is None or value.time() == datetime.min.time()
+
+    @staticmethod
+    def rollup_query(*columns,
+                     consultant_id: Optional[int] = None,
+                     per_consultant: bool = False,
+                     date_from: Optional[datetime] = None,
+                     date_to: Optional[datetime] = None,
+                     include_excluded: bool = True):
+        """Query sull'aggregato daily_stats nell'intervallo di giorni [date_from, date_to)
+
+        Senza consultant_id né per_consultant usa le righe totali (ogni appuntamento una volta).
+        """
+        query = db.session.query(*columns)
+
+        if consultant_id:
+            query = query.filter(DailyStats.consultant_id == consultant_id)
+        elif per_consultant:
+            query = query.filter(DailyStats.consultant_id != ALL_CONSULTANTS)
+        else:
+            query = query.filter(DailyStats.consultant_id == ALL_CONSULTANTS)
+
+        if date_from:
+            query = query.filter(DailyStats.day >= date_from.date())
+        if date_to:
+            query = query.filter(DailyStats.day < date_to.date())
+        if not include_excluded:
+            query = query.filter(DailyStats.include_in_reports == True)
+
+        return query
+
+    @staticmethod
+    def _rollup_grouped_counts(consultant_id: Optional[int],
+                               date_from: Optional[datetime],
+                               date_to: Optional[datetime],
+                               granularity: Optional[str],
+                               include_excluded: bool) -> List:
+        """Come grouped_counts, ma dall'aggregato giornaliero"""
+
+        bucket = (StatsService._bucket_expr(DailyStats.day, granularity).label('bucket')
+                  if granularity else db.literal(None).label('bucket'))
+
+        query = StatsService.rollup_query(
+            bucket,
+            DailyStats.tipologia,
+            DailyStats.venduto,
+            db.func.sum(DailyStats.appointments).label('total'),
+            db.func.sum(DailyStats.nominativi_raccolti).label('nominativi'),
+            db.func.sum(DailyStats.appuntamenti_personali).label('personali'),
+            consultant_id=consultant_id,
+            date_from=date_from,
+            date_to=date_to,
+            include_excluded=include_excluded
+        )
+
+        group_by = [DailyStats.tipologia, DailyStats.venduto]
+        if granularity:
+            group_by.insert(0, bucket)
+
+        return query.group_by(*group_by).all()
+
+    @staticmethod
+    def status_counts(date_from: datetime,
+                      date_to: datetime,
+                      consultant_id: Optional[int] = None,
+                      include_excluded: bool = True) -> Dict[str, Dict]:
+        """Conteggi per stato {stato: {'total', 'sold'}} nell'intervallo di giorni [date_from, date_to)"""
+
+        rows = StatsService.rollup_query(
+            DailyStats.stato,
+            DailyStats.venduto,
+            db.func.sum(DailyStats.appointments).label('total'),
+            consultant_id=consultant_id,
+            date_from=date_from,
+            date_to=date_to,
+            include_excluded=include_excluded
+        ).group_by(DailyStats.stato, DailyStats.venduto).all()
+
+        result = {}
+        for row in rows:
+            counts = result.setdefault(row.stato, {'total': 0, 'sold': 0})
+            counts['total'] += row.total
+            counts['sold'] += row.total if row.venduto else 0
+        return result
+
+    @staticmethod
+    def _consultant_counts_query(date_from: Optional[datetime],
+                                 date_to: Optional[datetime],
+                                 include_excluded: bool):
+        """Query (consultant_id, total, sold, nominativi, personali) raggruppata per consulente
+
+        A giorni interi legge daily_stats, altrimenti aggrega appointment_consultant ⨝ appointment.
+        """
+
+        if StatsService.is_day_aligned(date_from) and StatsService.is_day_aligned(date_to):
+            return StatsService.rollup_query(
+                DailyStats.consultant_id.label('consultant_id'),
+                db.func.sum(DailyStats.appointments).label('total'),
+                db.func.sum(db.case((DailyStats.venduto == True, DailyStats.appointments), else_=0)).label('sold'),
+                db.func.sum(DailyStats.nominativi_raccolti).label('nominativi'),
+                db.func.sum(DailyStats.appuntamenti_personali).label('personali'),
+                per_consultant=True,
+                date_from=date_from,
+                date_to=date_to,
+                include_excluded=include_excluded
+            ).group_by(DailyStats.consultant_id)
+
+        query = db.session.query(
+            appointment_consultant.c.consultant_id.label('consultant_id'),
+            db.func.count(Appointment.id).label('total'),
+            db.func.sum(db.case((Appointment.venduto == True, 1), else_=0)).label('sold'),
+            db.func.coalesce(db.func.sum(Appointment.nominativi_raccolti), 0).label('nominativi'),
+            db.func.coalesce(db.func.sum(Appointment.appuntamenti_personali), 0).label('personali')
+        ).join(Appointment, Appointment.id == appointment_consultant.c.appointment_id)
+
+        if date_from:
+            query = query.filter(Appointment.data_appuntamento >= date_from)
+        if date_to:
+            query = query.filter(Appointment.data_appuntamento < date_to)
+        if not include_excluded:
+            query = query.filter(Appointment.include_in_reports == True)
+
+        return query.group_by(appointment_consultant.c.consultant_id)
+
+    @staticmethod
+    def consultant_ranking(date_from: Optional[datetime] = None,
+                           date_to: Optional[datetime] = None,
+                           include_excluded: bool = True) -> List[Dict]:
+        """Classifica di tutti i consulenti nell'intervallo [date_from, date_to) con una sola query
+
+        Ordine: vendite, poi appuntamenti, poi nome; i consulenti senza appuntamenti restano in coda.
+        """
+
+        counts = StatsService._consultant_counts_query(date_from, date_to, include_excluded).subquery()
+        total = db.func.coalesce(counts.c.total, 0)
+        sold = db.func.coalesce(counts.c.sold, 0)
+
+        rows = (db.session.query(
+                    Consultant.id,
+                    Consultant.nome,
+                    total.label('total_appointments'),
+                    sold.label('sold_appointments'),
+                    db.func.coalesce(counts.c.nominativi, 0).label('total_nominativi'),
+                    db.func.coalesce(counts.c.personali, 0).label('total_personali'))
+                .outerjoin(counts, counts.c.consultant_id == Consultant.id)
+                .order_by(sold.desc(), total.desc(), Consultant.nome)
+                .all())
+
+        return [{
+            'rank': i + 1,
+            'id': row.id,
+            'nome': row.nome,
+            'total_appointments': row.total_appointments,
+            'sold_appointments': row.sold_appointments,
+            'total_nominativi': row.total_nominativi,
+            'total_personali': row.total_personali,
+            'conversion_rate': round(StatsService.conversion_rate(row.total_appointments, row.sold_appointments), 2)
+        } for i, row in enumerate(rows)]
+
+    @staticmethod
+    def empty_bucket() -> Dict:
+        """Statistiche a zero per un bucket senza appuntamenti"""
+        stats = {
+            'total': 0,
+            'sold': 0,
+            'nominativi_raccolti': 0,
+            'appuntamenti_personali': 0,
+            'by_type': {key: {'total': 0, 'sold': 0} for key in TIPOLOGIE.values()}
+        }
+        stats.update({key: 0 for key in TIPOLOGIE.values()})
+        return stats
+
+    @staticmethod
+    def summarize(rows: List) -> Dict[Optional[str], Dict]:
+        """Raggruppa le righe aggregate per bucket"""
+        buckets = {}
+
+        for row in rows:
+            stats = buckets.setdefault(row.bucket, StatsService.empty_bucket())
+            sold = row.total if row.venduto else 0
+
+            stats['total'] += row.total
+            stats['sold'] += sold
+            stats['nominativi_raccolti'] += row.nominativi or 0
+            stats['appuntamenti_personali'] += row.personali or 0
+
+            type_key = TIPOLOGIE.get(row.tipologia)
+            if type_key:
+                stats[type_key] += row.total
+                stats['by_type'][type_key]['total'] += row.total
+                stats['by_type'][type_key]['sold'] += sold
+
+        return buckets
+
+    @staticmethod
+    def period_stats(consultant_id: Optional[int] = None,
+                     date_from: Optional[datetime] = None,
+                     date_to: Optional[datetime] = None,
+                     include_excluded: bool = True) -> Dict:
+        """Statistiche complessive di un periodo con una sola query"""
+        rows = StatsService.grouped_counts(consultant_id, date_from, date_to,
+                                           include_excluded=include_excluded)
+        stats = StatsService.summarize(rows).get(None, StatsService.empty_bucket())
+        stats['conversion_rate'] = StatsService.conversion_rate(stats['total'], stats['sold'])
+        return stats
+
+    @staticmethod
+    def bucketed_stats(consultant_id: Optional[int],
+                       date_from: datetime,
+                       date_to: datetime,
+                       granularity: str) -> Dict[str, Dict]:
+        """Statistiche per bucket (giorno/mese/anno) nell'intervallo [date_from, date_to)"""
+        rows = StatsService.grouped_counts(consultant_id, date_from, date_to, granularity)
+        return StatsService.summarize(rows)
+
+    @staticmethod
+    def bucket_key(date: datetime, granularity: str) -> str:
+        """Chiave del bucket corrispondente a una data (stesso formato dell'SQL)"""
+        return date.strftime(StatsService.BUCKET_FORMATS[granularity][0])
+
+    @staticmethod
+    def conversion_rate(total: int, sold: int) -> float:
+        """Tasso di conversione percentuale"""
+        return (sold / total * 100) if total > 0 else 0
+
+    @staticmethod
+    def global_counts() -> Dict:
+        """Contatori globali (appuntamenti, venduti, consulenti, clienti, utenti) in cache"""
+
+        def compute():
+            from models.client import Client
+            from models.user import User
+
+            row = db.session.query(
+                db.select(db.func.count(Appointment.id)).scalar_subquery().label('total_appointments'),
+                db.select(db.func.count(Appointment.id)).where(Appointment.venduto == True)
+                  .scalar_subquery().label('sold_appointments'),
+                db.select(db.func.count(Consultant.id)).scalar_subquery().label('total_consultants'),
+                db.select(db.func.count(Client.id)).scalar_subquery().label('total_clients'),
+                db.select(db.func.count(User.id)).scalar_subquery().label('total_users')
+            ).one()
+            return dict(row._mapping)
+
+        return cached('counts', 'global', compute)
+
+    @staticmethod
+    def consultant_summary(consultant_id: int) -> Dict:
+        """Totali del consulente nel formato di Consultant.get_appointments_stats, in cache"""
+
+        def compute():
+            stats = StatsService.period_stats(consultant_id)
+            summary = {
+                'total': stats['total'],
+                'sold': stats['sold'],
+                'conversion_rate': stats['conversion_rate']
+            }
+            summary.update({key: stats[key] for key in TIPOLOGIE.values()})
+            return summary
+
+        return cached('dashboard', f'consultant:{consultant_id}', compute)
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from models.appointment import Appointment
+from models.client import Client
+from models.database import appointment_consultant
+from models.followup import FollowUp
+from models.note_event import note_event
+from models.sync import SyncTombstone, purge_tombstones
+from models.user import db
+from sqlalchemy.orm import selectinload
+from utils import CursorPaginationHelper
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Margine sottratto all'istante di sincronizzazione: copre le transazioni con updated_at
+# già assegnato ma non ancora confermate. Le righe nel margine vengono reinviate (upsert idempotente).
+SYNC_OVERLAP_SECONDS = 30
+
+# Conservazione delle tracce di eliminazione; token più vecchi richiedono una sincronizzazione completa
+TOMBSTONE_TTL_DAYS = 90
+
+class SyncService:
+    """Sincronizzazione incrementale dei dati di un consulente per la dashboard mobile"""
+
+    @staticmethod
+    def encode_token(watermark: datetime, consultant_id: int) -> str:
+        """Token opaco di sincronizzazione legato al consulente"""
+        return CursorPaginationHelper.encode(watermark, consultant_id)
+
+    @staticmethod
+    def decode_token(token: Optional[str], consultant_id: int) -> Optional[datetime]:
+        """Istante di un token, solleva ValueError se non valido o di un altro consulente"""
+        if not token:
+            return None
+
+        try:
+            watermark, token_consultant = CursorPaginationHelper.decode(token)
+        except ValueError:
+            raise ValueError("Token di sincronizzazione non valido")
+
+        if token_consultant != consultant_id:
+            raise ValueError("Token di sincronizzazione non valido")
+        return watermark
+
+    @staticmethod
+    def changes(consultant_id: int, user_id: int, since: Optional[datetime] = None) -> Dict:
+        """Righe modificate ed eliminate dopo since (tutte se since è None) e nuovo token
+
+        Le righe sono complete (upsert lato client): il client applica prima 'deleted' (rimuovendo
+        anche i follow-up degli appuntamenti eliminati) e poi le righe ricevute.
+        """
+        started_at = datetime.utcnow()
+
+        full = since is None or since < started_at - timedelta(days=TOMBSTONE_TTL_DAYS)
+        if full:
+            since = None
+
+        own_appointment_ids = (db.select(appointment_consultant.c.appointment_id)
+                               .where(appointment_consultant.c.consultant_id == consultant_id))
+
+        # Appuntamenti del consulente modificati (incluse le nuove assegnazioni)
+        appointments_query = (Appointment.query
+                              .options(selectinload(Appointment.consultants))
+                              .filter(Appointment.id.in_(own_appointment_ids)))
+        if since:
+            appointments_query = appointments_query.filter(Appointment.updated_at > since)
+        appointments = appointments_query.order_by(Appointment.id).all()
+        changed_ids = [a.id for a in appointments]
+        changed_client_ids = {a.client_id for a in appointments if a.client_id}
+
+        # Follow-up modificati, più tutti quelli degli appuntamenti appena modificati o assegnati
+        followups_query = (FollowUp.query
+                           .options(selectinload(FollowUp.appointment))
+                           .filter(FollowUp.appointment_id.in_(own_appointment_ids)))
+        if since:
+            followups_query = followups_query.filter(db.or_(FollowUp.updated_at > since,
+                                                            FollowUp.appointment_id.in_(changed_ids)))
+        followups = followups_query.order_by(FollowUp.id).all()
+
+        # Clienti degli appuntamenti del consulente
+        own_client_ids = (db.select(Appointment.client_id)
+                          .where(Appointment.id.in_(own_appointment_ids), Appointment.client_id.isnot(None)))
+        clients_query = Client.query.filter(Client.id.in_(own_client_ids))
+        if since:
+            clients_query = clients_query.filter(db.or_(Client.updated_at > since,
+                                                        Client.id.in_(changed_client_ids)))
+        clients = clients_query.order_by(Client.id).all()
+
+        # Eventi dell'utente e condivisi
+        events_query = note_event.query.filter(db.or_(note_event.user_id == user_id, note_event.user_id.is_(None)))
+        if since:
+            events_query = events_query.filter(note_event.updated_at > since)
+        events = events_query.order_by(note_event.id).all()
+
+        deleted = []
+        if since:
+            deleted = (SyncTombstone.query
+                       .filter(SyncTombstone.deleted_at > since,
+                               db.or_(SyncTombstone.consultant_id.is_(None),
+                                      SyncTombstone.consultant_id == consultant_id))
+                       .order_by(SyncTombstone.id)
+                       .all())
+
+        watermark = started_at - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+
+        return {
+            'full': full,
+            'token': SyncService.encode_token(watermark, consultant_id),
+            'server_time': started_at.isoformat(),
+            'appointments': [a.to_dict() for a in appointments],
+            'followups': [f.to_dict() for f in followups],
+            'clients': [c.to_dict() for c in clients],
+            'events': [e.to_dict() for e in events],
+            'deleted': [t.to_dict() for t in deleted]
+        }
+
+    @staticmethod
+    def purge_expired_tombstones(days: int = TOMBSTONE_TTL_DAYS) -> int:
+        """Elimina le tracce di eliminazione scadute
+
+        days non può essere inferiore a TOMBSTONE_TTL_DAYS: i token fino a quell'età ricevono una
+        sincronizzazione incrementale, che senza le tracce perderebbe le eliminazioni.
+        """
+        if days < TOMBSTONE_TTL_DAYS:
+            raise ValueError(f"Le tracce vanno conservate per almeno {TOMBSTONE_TTL_DAYS} giorni")
+
+        with db.engine.begin() as conn:
+            return purge_tombstones(conn, datetime.utcnow() - timedelta(days=days))
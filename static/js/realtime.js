@@ -0,0 +1,128 @@
+/**
+ * Eventi real-time via Socket.IO (appuntamenti, follow-up, contatori dashboard)
+ *
+ * connectRealtime(handlers, options):
+ *  - handlers: { nomeEvento: funzione(payload) }
+ *  - options.poll: funzione di aggiornamento usata solo se il socket non è connesso
+ *    (e una volta alla riconnessione, per recuperare gli eventi persi)
+ *  - options.pollInterval: intervallo del polling di riserva in ms (default 5 minuti)
+ *
+ * upsertRealtimeRow(container, id, html, sortValue, options): aggiorna le righe delle dashboard
+ * escapeRealtime(testo), formatRealtimeDate(iso): testo sicuro per innerHTML e date gg/mm/aaaa hh:mm
+ */
+(function () {
+    function connectRealtime(handlers, options) {
+        options = options || {};
+        let pollTimer = null;
+        let wasConnected = false;
+
+        function startPolling() {
+            if (!options.poll || pollTimer) return;
+            pollTimer = setInterval(options.poll, options.pollInterval || 300000);
+        }
+
+        function stopPolling() {
+            if (pollTimer) {
+                clearInterval(pollTimer);
+                pollTimer = null;
+            }
+        }
+
+        if (typeof io === 'undefined') {
+            // Client Socket.IO non caricato: si resta sul polling
+            startPolling();
+            return null;
+        }
+
+        const socket = io({ transports: ['websocket', 'polling'] });
+
+        socket.on('connect', function () {
+            stopPolling();
+            if (wasConnected && options.poll) {
+                options.poll();
+            }
+            wasConnected = true;
+        });
+        socket.on('disconnect', startPolling);
+        socket.on('connect_error', startPolling);
+
+        Object.keys(handlers || {}).forEach(function (name) {
+            socket.on(name, handlers[name]);
+        });
+
+        window.addEventListener('beforeunload', function () {
+            stopPolling();
+            socket.close();
+        });
+
+        return socket;
+    }
+
+    function debounce(fn, wait) {
+        let timer = null;
+        return function () {
+            const args = arguments;
+            clearTimeout(timer);
+            timer = setTimeout(function () { fn.apply(null, args); }, wait);
+        };
+    }
+
+    function escapeHtml(value) {
+        const div = document.createElement('div');
+        div.textContent = value == null ? '' : String(value);
+        return div.innerHTML;
+    }
+
+    // Data ISO del server (ora locale, senza fuso) → { date: 'gg/mm/aaaa', time: 'hh:mm' }
+    function formatDate(iso) {
+        const parts = (iso || '').split('T');
+        const ymd = parts[0].split('-');
+        return {
+            date: ymd.length === 3 ? ymd[2] + '/' + ymd[1] + '/' + ymd[0] : '',
+            time: (parts[1] || '').slice(0, 5)
+        };
+    }
+
+    /**
+     * Inserisce, aggiorna o (con html null) rimuove la riga con data-realtime-id = id.
+     * Le righe sono ordinate per data-sort (decrescente, crescente con options.ascending) e
+     * limitate a options.max: una nuova riga oltre l'ultima mostrata non viene aggiunta.
+     */
+    function upsertRow(container, id, html, sortValue, options) {
+        options = options || {};
+        const existing = container.querySelector('[data-realtime-id="' + id + '"]');
+        if (existing) {
+            existing.remove();
+        }
+        if (html === null) {
+            return;
+        }
+
+        const template = document.createElement('template');
+        template.innerHTML = html.trim();
+        const row = template.content.firstElementChild;
+        row.dataset.realtimeId = id;
+        row.dataset.sort = sortValue || '';
+
+        const rows = Array.from(container.querySelectorAll('[data-realtime-id]'));
+        const next = rows.find(function (el) {
+            return options.ascending ? el.dataset.sort > row.dataset.sort : el.dataset.sort < row.dataset.sort;
+        });
+        const max = options.max || Infinity;
+        if (!existing && !next && rows.length >= max) {
+            return;
+        }
+
+        container.insertBefore(row, next || null);
+        const shown = container.querySelectorAll('[data-realtime-id]');
+        for (let i = max; i < shown.length; i++) {
+            shown[i].remove();
+        }
+    }
+
+    window.connectRealtime = connectRealtime;
+    window.debounceRealtime = debounce;
+    window.escapeRealtime = escapeHtml;
+    window.formatRealtimeDate = formatDate;
+    window.upsertRealtimeRow = upsertRow;
+})();
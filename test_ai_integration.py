@@ -7,6 +7,7 @@ Verifica tutte le funzionalità dell'assistente IA
 import sys
 import os
 import json
+import tempfile
 import time
 import requests
 from datetime import datetime
@@ -113,44 +114,73 @@ def test_ai_service():
         print(f"❌ Errore servizio AI: {e}")
         return False
 
-def test_api_integration():
-    """Test integrazione API"""
-    print("\n🧪 Test 4: Integrazione API...")
+def test_api_integration(tmp_path):
+    """Test integrazione dati (letti in-process, senza che l'app sia in esecuzione)"""
+    print("\n🧪 Test 4: Integrazione dati...")
     
-    try:
-        sys.path.append('/opt/smart_control')
-        from services.ai_service_new import APIClient
-        
-        # Inizializza client API
-        api_client = APIClient(base_url="http://localhost:8000")
-        
-        # Test connessione (potrebbero fallire se app non è in esecuzione)
-        print("🔄 Test connessioni API...")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from flask import Flask
+    from models.user import db
+    from models.appointment import Appointment
+    from models.client import Client
+    from models.consultant import Consultant, Position
+    from services.ai_data_provider import AIDataProvider
+    
+    # Database su file: i riepiloghi vengono letti dai thread del pool, ognuno con la propria connessione
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(str(tmp_path), 'ai_data.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    
+    with app.app_context():
+        db.create_all()
         
-        test_endpoints = [
-            ('/api/clients', 'Clienti'),
-            ('/api/appointments/today', 'Appuntamenti oggi'),
-            ('/api/stats/overview', 'Statistiche')
-        ]
+        position = Position(nome='Consulente')
+        mario = Consultant(nome='Mario Rossi', posizione=position)
+        giulia = Consultant(nome='Giulia Bianchi', posizione=position)
+        verdi = Client(nome='Luca Verdi', numero_telefono='3331111111')
+        neri = Client(nome='Anna Neri', numero_telefono='3332222222')
+        db.session.add_all([mario, giulia, verdi, neri])
+        db.session.flush()
         
-        working_apis = 0
-        for endpoint, name in test_endpoints:
-            try:
-                result = api_client._make_request('GET', endpoint)
-                if result.get('success'):
-                    print(f"✅ API {name} funzionante")
-                    working_apis += 1
-                else:
-                    print(f"⚠️ API {name} non risponde (normale se app non è in esecuzione)")
-            except Exception as e:
-                print(f"⚠️ API {name} errore: {str(e)[:50]}...")
+        today = datetime.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        for client, consultant, venduto in ((verdi, mario, True), (neri, giulia, False)):
+            appointment = Appointment(nome_cliente=client.nome, numero_telefono=client.numero_telefono,
+                                      data_appuntamento=today, tipologia='Dimostrazione',
+                                      stato='Confermato', venduto=venduto, client_id=client.id)
+            appointment.consultants.append(consultant)
+            db.session.add(appointment)
+        db.session.commit()
         
-        print(f"📊 API funzionanti: {working_apis}/{len(test_endpoints)}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Errore test API: {e}")
-        return False
+        print("🔄 Test riepiloghi dati...")
+        needs = ['clients', 'appointments_today', 'stats']
+        summaries = AIDataProvider.fetch(needs)
+        dealer_summaries = AIDataProvider.fetch(needs, consultant_id=mario.id)
+    
+    for need, summary in summaries.items():
+        print(f"✅ {need}: {summary.splitlines()[0]}")
+    
+    assert list(summaries) == needs
+    assert not any('dati non disponibili' in summary for summary in summaries.values())
+    assert summaries['clients'].startswith('CLIENTI (2 totali')
+    assert '- Luca Verdi (tel. 3331111111, ha acquistato)' in summaries['clients']
+    assert summaries['appointments_today'].startswith('APPUNTAMENTI DI OGGI (2):')
+    assert 'Luca Verdi (Dimostrazione, Confermato, venduto) con Mario Rossi' in summaries['appointments_today']
+    assert 'Anna Neri (Dimostrazione, Confermato) con Giulia Bianchi' in summaries['appointments_today']
+    assert '- Totale: appuntamenti 2, venduti 1 (conversione 50.0%), consulenti 2, clienti 2' in summaries['stats']
+    
+    # Dealer: solo clienti, appuntamenti e statistiche del proprio consulente
+    assert not any('dati non disponibili' in summary for summary in dealer_summaries.values())
+    assert dealer_summaries['clients'].startswith('CLIENTI (1 totali')
+    assert 'Anna Neri' not in dealer_summaries['clients']
+    assert dealer_summaries['appointments_today'].startswith('APPUNTAMENTI DI OGGI (1):')
+    assert 'Luca Verdi' in dealer_summaries['appointments_today']
+    assert 'Anna Neri' not in dealer_summaries['appointments_today']
+    assert '- Totale: appuntamenti 1, venduti 1 (conversione 100.0%)' in dealer_summaries['stats']
+
+def run_api_integration():
+    """Test 4 fuori da pytest, con una cartella temporanea per il database"""
+    test_api_integration(tempfile.mkdtemp())
 
 def test_ai_with_api_simulation():
     """Test AI con simulazione API"""
@@ -215,7 +245,7 @@ def main():
         test_ollama_service,
         test_ai_config,
         test_ai_service,
-        test_api_integration,
+        run_api_integration,
         test_ai_with_api_simulation
     ]
     
@@ -224,7 +254,7 @@ def main():
     
     for test_func in tests:
         try:
-            if test_func():
+            if test_func() is not False:
                 passed += 1
             else:
                 failed += 1
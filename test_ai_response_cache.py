@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test della cache delle risposte AI (chiave per versione dei dati, LRU/TTL, contatori e risposte di fallback)
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import db
+from models.appointment import Appointment
+import services.ai_service as ai_service
+from services.ai_response_cache import AIResponseCache
+
+CONTEXT = {'user_role': 'admin', 'consultant_id': None, 'page_context': 'dashboard'}
+
+@pytest.fixture
+def app(make_app):
+    """Applicazione minima con database SQLite in memoria e tabella delle versioni"""
+    return make_app(table_versions=True)
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Orologio monotono controllato dal test per le scadenze della cache in memoria"""
+    now = [1000.0]
+    monkeypatch.setattr('utils.cache.time', SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    return now
+
+def test_key_changes_when_table_version_changes(app):
+    """Una scrittura su una tabella del prompt cambia la chiave; il messaggio è normalizzato"""
+    cache = AIResponseCache()
+    key = cache.make_key('Quanti appuntamenti ho?', CONTEXT)
+    assert cache.make_key('  quanti   APPUNTAMENTI ho ', CONTEXT) == key
+    assert cache.make_key('Quanti appuntamenti ho?', dict(CONTEXT, user_role='dealer')) != key
+
+    db.session.add(Appointment(nome_cliente='Mario Rossi', numero_telefono='3331234567',
+                               data_appuntamento=datetime(2025, 1, 1, 9, 0),
+                               tipologia='Vendita', stato='Confermato'))
+    db.session.commit()
+
+    assert cache.make_key('Quanti appuntamenti ho?', CONTEXT) != key
+
+def test_least_recently_used_entry_is_evicted(clock):
+    """Oltre max_entries viene eliminata la voce letta meno di recente"""
+    cache = AIResponseCache(max_entries=2, ttl=60)
+    cache.set('a', 'Risposta A.')
+    cache.set('b', 'Risposta B.')
+    assert cache.get('a') == 'Risposta A.'
+
+    cache.set('c', 'Risposta C.')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'Risposta A.'
+    assert cache.get('c') == 'Risposta C.'
+
+def test_entries_expire_after_ttl(clock):
+    """Le voci scadono dopo ttl secondi"""
+    cache = AIResponseCache(ttl=60)
+    cache.set('a', 'Risposta A.')
+
+    clock[0] += 59
+    assert cache.get('a') == 'Risposta A.'
+    clock[0] += 2
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+
+def test_hits_and_misses_are_counted(clock):
+    """Le letture aggiornano i contatori; chiavi None e risposte vuote non vengono conteggiate né salvate"""
+    cache = AIResponseCache()
+    cache.set('a', 'Risposta A.')
+    cache.set('vuota', '')
+    cache.get('a')
+    cache.get('a')
+    cache.get('b')
+    cache.get(None)
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 1, 1)
+    assert stats['hit_rate'] == 66.7
+
+    cache.clear()
+    assert (cache.hits, cache.misses) == (0, 0)
+
+@pytest.fixture
+def service(app, monkeypatch):
+    """Servizio locale con modello pronto (finto) e cache dedicata"""
+    monkeypatch.setitem(ai_service.AI_CONFIG, 'local_ai', True)
+    monkeypatch.setattr(ai_service, 'TextIteratorStreamer', object)
+    service = ai_service.LocalAIService()
+    service.model = service.tokenizer = object()
+    service.loader = SimpleNamespace(ready=True, start=lambda: None)
+    service.response_cache = AIResponseCache()
+    return service
+
+def test_model_response_is_cached(service, monkeypatch):
+    """Il testo del modello va in cache e la richiesta successiva lo riproduce senza generare"""
+    calls = []
+    def stream(message, system_prompt, context):
+        calls.append(message)
+        yield 'Hai tre appuntamenti oggi. '
+        yield 'Il primo alle nove.'
+    monkeypatch.setattr(service, '_stream_with_local_model', stream)
+
+    first = ''.join(service.generate_response_stream('Appuntamenti di oggi?', CONTEXT))
+    second = ''.join(service.generate_response_stream('Appuntamenti di oggi?', CONTEXT))
+
+    assert first == second == 'Hai tre appuntamenti oggi. Il primo alle nove.'
+    assert len(calls) == 1
+    assert service.response_cache.stats()['entries'] == 1
+
+def test_fallback_response_is_not_cached(service, monkeypatch):
+    """Se il modello non produce testo utile si risponde col fallback, che non va in cache"""
+    monkeypatch.setattr(service, '_stream_with_local_model', lambda message, system_prompt, context: iter(()))
+
+    response = ''.join(service.generate_response_stream('Appuntamenti di oggi?', CONTEXT))
+
+    assert response == service._get_intelligent_fallback_response('Appuntamenti di oggi?', CONTEXT)
+    assert service.response_cache.stats()['entries'] == 0
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test della paginazione keyset di /api/appointments (cursore, pari merito sulla data, streaming NDJSON)
+"""
+
+import base64
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from flask_login import LoginManager
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import db, User
+from models.appointment import Appointment
+from utils import CursorPaginationHelper
+
+@pytest.fixture
+def app(make_app):
+    """Applicazione minima con il blueprint API e il login, su file (richieste dal client di test)"""
+    from routes.api import bp as api_bp
+
+    app = make_app(file_db=True, table_versions=True, SECRET_KEY='test', TESTING=True)
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(api_bp, url_prefix='/api')
+    return app
+
+@pytest.fixture
+def client(app):
+    admin = User(username='admin', email='admin@example.com', password_hash='x', role='admin')
+    db.session.add(admin)
+    db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+    return client
+
+@pytest.fixture
+def appointment_ids(app):
+    """Sette appuntamenti, quattro alla stessa ora (inseriti fuori ordine), nell'ordine atteso dall'API"""
+    dates = [
+        datetime(2025, 1, 2, 9, 0),
+        datetime(2025, 1, 1, 9, 0),
+        datetime(2025, 1, 2, 9, 0),
+        datetime(2025, 1, 3, 9, 0),
+        datetime(2025, 1, 2, 9, 0),
+        datetime(2025, 1, 2, 9, 0),
+        datetime(2025, 1, 1, 8, 0),
+    ]
+    appointments = [Appointment(nome_cliente=f'Cliente {i}', numero_telefono=f'33300000{i:02d}',
+                                data_appuntamento=date, tipologia='Vendita', stato='Confermato')
+                    for i, date in enumerate(dates)]
+    db.session.add_all(appointments)
+    db.session.commit()
+    return [a.id for a in sorted(appointments, key=lambda a: (a.data_appuntamento, a.id))]
+
+def _pages(client, limit):
+    pages, cursor = [], None
+    while True:
+        params = {'limit': limit}
+        if cursor:
+            params['cursor'] = cursor
+        response = client.get('/api/appointments', query_string=params)
+        assert response.status_code == 200
+        body = response.get_json()
+        pages.append([a['id'] for a in body['appointments']])
+        cursor = body['next_cursor']
+        assert body['has_more'] is (cursor is not None)
+        if not cursor:
+            return pages
+
+def test_cursor_round_trip():
+    """Il cursore è opaco (base64 senza padding) e restituisce data e id codificati"""
+    cursor = CursorPaginationHelper.encode(datetime(2025, 1, 2, 9, 30, 15), 42)
+
+    assert '=' not in cursor
+    assert CursorPaginationHelper.decode(cursor) == (datetime(2025, 1, 2, 9, 30, 15), 42)
+    assert CursorPaginationHelper.decode(None) is None
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 6])
+def test_pages_cover_ties_without_duplicates_or_gaps(client, appointment_ids, limit):
+    """Con più appuntamenti alla stessa ora a cavallo di due pagine nessuna riga è ripetuta o saltata"""
+    pages = _pages(client, limit)
+
+    assert [appointment_id for page in pages for appointment_id in page] == appointment_ids
+    assert all(len(page) == limit for page in pages[:-1])
+
+def test_next_cursor_points_at_last_row(client, appointment_ids):
+    """next_cursor codifica data e id dell'ultima riga della pagina"""
+    body = client.get('/api/appointments', query_string={'limit': 3}).get_json()
+    last = db.session.get(Appointment, body['appointments'][-1]['id'])
+
+    assert CursorPaginationHelper.decode(body['next_cursor']) == (last.data_appuntamento, last.id)
+
+def test_ndjson_stream_resumes_after_cursor(client, appointment_ids):
+    """Lo streaming NDJSON parte dalla riga successiva al cursore, fino alla fine"""
+    last = db.session.get(Appointment, appointment_ids[2])
+    cursor = CursorPaginationHelper.encode(last.data_appuntamento, last.id)
+
+    response = client.get('/api/appointments', query_string={'format': 'ndjson', 'cursor': cursor})
+
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['id'] for row in rows] == appointment_ids[3:]
+
+@pytest.mark.parametrize('cursor', [
+    'non-un-cursore!',
+    base64.urlsafe_b64encode(b'2025-01-02T09:00:00').decode(),
+    base64.urlsafe_b64encode(b'ieri|12').decode(),
+    base64.urlsafe_b64encode(b'2025-01-02T09:00:00|dodici').decode(),
+    base64.urlsafe_b64encode(b'\xff\xfe|1').decode(),
+])
+def test_malformed_cursor_is_rejected(client, appointment_ids, cursor):
+    """Un cursore malformato dà 400, sia in JSON sia in NDJSON"""
+    for params in ({'cursor': cursor}, {'cursor': cursor, 'format': 'ndjson'}):
+        response = client.get('/api/appointments', query_string=params)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Cursore di paginazione non valido'
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test dell'invalidazione della cache delle statistiche al commit (backend in memoria e SQLite)
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import db
+from models.appointment import Appointment
+from models.followup import FollowUp
+from utils.cache import MemoryCache, SQLiteCache, cached, init_cache
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def app(request, make_app, tmp_path):
+    """Applicazione minima con la cache del backend indicato"""
+    app = make_app(table_versions=True, CACHE_BACKEND=request.param,
+                   CACHE_SQLITE_PATH=str(tmp_path / 'cache' / 'cache.db'))
+    init_cache(app)
+    assert isinstance(app.extensions['stats_cache'], {'memory': MemoryCache, 'sqlite': SQLiteCache}[request.param])
+    return app
+
+@pytest.fixture
+def producers(app):
+    """Conteggio dei ricalcoli per namespace: un valore rimasto in cache non viene ricalcolato"""
+    calls = {'counts': 0, 'dashboard': 0}
+
+    def read():
+        for namespace in calls:
+            def produce(namespace=namespace):
+                calls[namespace] += 1
+                return {'namespace': namespace}
+            assert cached(namespace, 'admin', produce) == {'namespace': namespace}
+        return dict(calls)
+
+    read()
+    return read
+
+def _appointment() -> Appointment:
+    appointment = Appointment(nome_cliente='Mario Rossi', numero_telefono='3331234567',
+                              data_appuntamento=datetime(2025, 1, 1, 9, 0),
+                              tipologia='Vendita', stato='Confermato')
+    db.session.add(appointment)
+    return appointment
+
+def test_values_are_served_from_cache(producers):
+    """Senza scritture la seconda lettura usa la cache"""
+    assert producers() == {'counts': 1, 'dashboard': 1}
+
+def test_commit_to_dependency_table_drops_entries(producers):
+    """Il commit di un appuntamento invalida counts e dashboard"""
+    _appointment()
+    db.session.commit()
+
+    assert producers() == {'counts': 2, 'dashboard': 2}
+
+def test_rollback_keeps_entries(producers):
+    """Una transazione annullata, anche dopo il flush, non invalida nulla"""
+    _appointment()
+    db.session.flush()
+    db.session.rollback()
+
+    assert producers() == {'counts': 1, 'dashboard': 1}
+
+def test_commit_to_unrelated_table_keeps_entries(app):
+    """Il commit di un follow-up (tabella fuori da counts e dashboard) lascia le voci in cache"""
+    appointment = _appointment()
+    db.session.commit()
+
+    calls = []
+    cached('counts', 'admin', lambda: calls.append(1) or 1)
+
+    db.session.add(FollowUp(appointment_id=appointment.id, numero=1, data_prevista=datetime(2025, 1, 8)))
+    db.session.commit()
+    cached('counts', 'admin', lambda: calls.append(1) or 1)
+
+    assert calls == [1]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test numero di query dello storico cliente (regressioni N+1)
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import db
+from models.appointment import Appointment
+from models.client import Client
+from models.consultant import Consultant, Position
+from models.followup import FollowUp
+from services.client_service import ClientService
+
+def _create_client(phone: str, appointments: int) -> int:
+    """Cliente con N appuntamenti venduti, ognuno con consulente e follow-up"""
+    position = Position(nome=f'Posizione {phone}')
+    db.session.add(position)
+    db.session.flush()
+
+    consultant = Consultant(nome=f'Consulente {phone}', posizione_id=position.id)
+    client = Client(nome=f'Cliente {phone}', numero_telefono=phone)
+    db.session.add_all([consultant, client])
+
+    base = datetime(2025, 1, 1, 9, 0)
+    for i in range(appointments):
+        appointment = Appointment(
+            nome_cliente=client.nome,
+            numero_telefono=phone,
+            stato='concluso',
+            tipologia='Dimostrazione',
+            venduto=True,
+            data_appuntamento=base + timedelta(days=i)
+        )
+        appointment.consultants.append(consultant)
+        db.session.add(appointment)
+        db.session.flush()
+
+        for numero in (1, 2, 3):
+            db.session.add(FollowUp(
+                appointment_id=appointment.id,
+                numero=numero,
+                data_prevista=appointment.data_appuntamento + timedelta(days=numero)
+            ))
+
+    db.session.commit()
+    return client.id
+
+def _count_queries(func, *args):
+    """Esegue func contando le query SQL emesse"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = func(*args)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    return result, len(statements)
+
+def test_client_history_query_count_is_constant(app):
+    """Il numero di query non cresce con appuntamenti e follow-up del cliente"""
+    small_id = _create_client('3330000001', appointments=1)
+    large_id = _create_client('3330000002', appointments=25)
+    db.session.expire_all()
+
+    small, small_queries = _count_queries(ClientService.get_client_history, small_id)
+    db.session.expire_all()
+    large, large_queries = _count_queries(ClientService.get_client_history, large_id)
+
+    assert len(large['appointments']) == 25
+    assert len(large['followups']) == 75
+    assert all(f['client_name'] == 'Cliente 3330000002' for f in large['followups'])
+    assert all(a['consultants'] for a in large['appointments'])
+
+    assert large_queries == small_queries
+    assert large_queries <= 6
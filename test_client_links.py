@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test del collegamento automatico appuntamento → cliente (telefono e nome normalizzati)
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import db
+from models.appointment import Appointment
+from models.client import Client
+from migrate_client_links import fill_match_keys, link_appointments
+
+def _appointment(nome: str, telefono: str) -> Appointment:
+    appointment = Appointment(
+        nome_cliente=nome,
+        numero_telefono=telefono,
+        data_appuntamento=datetime(2025, 1, 1, 9, 0),
+        tipologia='Vendita',
+        stato='Confermato'
+    )
+    db.session.add(appointment)
+    db.session.commit()
+    return appointment
+
+@pytest.mark.parametrize('client_phone, appointment_phone', [
+    ('3331234567', '+39 333 123 4567'),
+    ('333 123 4567', '3331234567'),
+    ('+393331234567', '333-123 4567'),
+])
+def test_new_appointment_links_by_normalized_phone(app, client_phone, appointment_phone):
+    """Il telefono del cliente e quello dell'appuntamento vengono confrontati normalizzati"""
+    client = Client(nome='Mario Rossi', numero_telefono=client_phone)
+    db.session.add(client)
+    db.session.commit()
+
+    appointment = _appointment('Altro Nome', appointment_phone)
+
+    assert appointment.client_id == client.id
+
+def test_new_appointment_links_by_normalized_name(app):
+    """Senza telefono corrispondente il nome viene confrontato senza maiuscole e spazi ripetuti"""
+    client = Client(nome='Mario  Rossi', numero_telefono='3330000000')
+    db.session.add(client)
+    db.session.commit()
+
+    appointment = _appointment(' mario rossi ', '3339999999')
+
+    assert appointment.client_id == client.id
+
+def test_new_client_links_existing_appointments(app):
+    """Un nuovo cliente collega gli appuntamenti esistenti con telefono scritto diversamente"""
+    by_phone = _appointment('Nome Diverso', '333 123 4567')
+    by_name = _appointment('MARIO ROSSI', '3339999999')
+    other = _appointment('Luigi Bianchi', '3338888888')
+
+    client = Client(nome='Mario Rossi', numero_telefono='+393331234567')
+    db.session.add(client)
+    db.session.commit()
+
+    assert by_phone.client_id == client.id
+    assert by_name.client_id == client.id
+    assert other.client_id is None
+
+def test_migration_matches_live_linking(app):
+    """La migrazione ricalcola le chiavi normalizzate e collega come il collegamento automatico"""
+    client = Client(nome='Mario Rossi', numero_telefono='333 123 4567')
+    db.session.add(client)
+    db.session.commit()
+    appointment = _appointment('Nome Diverso', '+39 3331234567')
+
+    # Database precedente alla migrazione: chiavi e collegamenti assenti
+    for table in (Client.__table__, Appointment.__table__):
+        db.session.execute(table.update().values(telefono_normalizzato=None, nome_normalizzato=None))
+    db.session.execute(Appointment.__table__.update().values(client_id=None))
+    db.session.commit()
+
+    connection = db.session.connection()
+    assert fill_match_keys(connection, Client.__table__, 'nome') == 1
+    assert fill_match_keys(connection, Appointment.__table__, 'nome_cliente') == 1
+    assert link_appointments(connection, Appointment) == 1
+    db.session.commit()
+
+    db.session.refresh(appointment)
+    assert appointment.client_id == client.id
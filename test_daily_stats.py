@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test dell'aggregato giornaliero per consulente (daily_stats) rispetto al conteggio diretto
+"""
+
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import db
+from models.appointment import Appointment
+from models.consultant import Consultant, Position
+from services.stats_service import StatsService
+
+def _consultant_and_appointment():
+    position = Position(nome='Posizione')
+    db.session.add(position)
+    db.session.flush()
+
+    consultant = Consultant(nome='Consulente', posizione_id=position.id)
+    appointment = Appointment(
+        nome_cliente='Cliente',
+        numero_telefono='3330000001',
+        data_appuntamento=datetime(2025, 1, 1, 9, 0),
+        tipologia='Vendita',
+        stato='Confermato'
+    )
+    db.session.add_all([consultant, appointment])
+    db.session.commit()
+    return consultant, appointment
+
+def test_consultant_side_append_and_remove(app):
+    """Collegamenti modificati da consultant.appointments aggiornano l'aggregato del consulente"""
+    consultant, appointment = _consultant_and_appointment()
+
+    consultant.appointments.append(appointment)
+    db.session.commit()
+    assert StatsService.period_stats(consultant.id)['total'] == 1
+
+    consultant.appointments.remove(appointment)
+    db.session.commit()
+    assert StatsService.period_stats(consultant.id)['total'] == 0
+
+def test_consultant_delete_removes_rollup(app):
+    """L'eliminazione di un consulente toglie i suoi appuntamenti dall'aggregato"""
+    consultant, appointment = _consultant_and_appointment()
+    appointment.consultants.append(consultant)
+    db.session.commit()
+    consultant_id = consultant.id
+    assert StatsService.period_stats(consultant_id)['total'] == 1
+
+    db.session.delete(consultant)
+    db.session.commit()
+
+    assert StatsService.period_stats(consultant_id)['total'] == 0
+    assert StatsService.period_stats()['total'] == 1
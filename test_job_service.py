@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test dei job in background: progresso leggibile da qualunque processo tramite la tabella job
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import db
+from models.job import Job, JOB_COMPLETED
+from services.job_service import JobService
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    """Applicazione minima su un file SQLite (i job scrivono con connessioni proprie)"""
+    return make_app(file_db=True, JOB_RESULTS_DIR=str(tmp_path / 'jobs'))
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+def test_progress_is_persisted_while_running(app):
+    """Il progresso del job in esecuzione è nel record, non solo nella memoria del processo"""
+    halfway = threading.Event()
+    release = threading.Event()
+
+    def handler(params, context):
+        context.progress(5, 10, message='Metà', force=True)
+        halfway.set()
+        release.wait(5)
+        return context.write_json({'ok': True}, 'risultato.json')
+
+    JobService.register('test_progress', handler)
+    job_id = JobService.submit('test_progress', {}).id
+    assert halfway.wait(5)
+
+    try:
+        # Lettura diretta della tabella, come farebbe un altro worker
+        with db.engine.connect() as conn:
+            row = conn.execute(db.select(Job.progress, Job.message).where(Job.id == job_id)).one()
+        assert tuple(row) == (50, 'Metà')
+
+        db.session.remove()
+        job = JobService.get_job(job_id)
+        assert (job.progress, job.message) == (50, 'Metà')
+        assert not db.session.dirty
+    finally:
+        release.set()
+
+    def completed():
+        db.session.remove()
+        return JobService.get_job(job_id).status == JOB_COMPLETED
+
+    assert _wait_for(completed)
+    assert JobService.get_job(job_id).progress == 100
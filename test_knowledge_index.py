@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test dell'indice vettoriale della knowledge base (costruzione, cache memory-mapped, ordinamento top-k)
+"""
+
+import os
+import re
+import sys
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.ai_service import KnowledgeIndex, LocalAIService
+
+class BagOfWordsEncoder:
+    """Encoder deterministico al posto di SentenceTransformer: conteggio delle parole su 64 dimensioni"""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), 64), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r'\w+', text.lower()):
+                vectors[row, zlib.crc32(word.encode('utf-8')) % 64] += 1
+        return vectors
+
+def _knowledge_base():
+    return LocalAIService._load_knowledge_base(None)
+
+def test_flatten_indexes_answer_sections_only():
+    """Conoscenze di dominio e suggerimenti sono indicizzati, aperture e intestazioni no"""
+    knowledge_base = _knowledge_base()
+    answers = [answer for _, answer in KnowledgeIndex.flatten(knowledge_base)]
+
+    assert len(answers) == len(knowledge_base['domain_knowledge']) + sum(map(len, knowledge_base['tips'].values()))
+    assert knowledge_base['domain_knowledge']['crm'] in answers
+    assert knowledge_base['tips']['dealer'][0] in answers
+    assert not set(answers) & set(knowledge_base['greetings'])
+    assert not set(answers) & set(knowledge_base['analysis_prompts'].values())
+
+def test_build_saves_normalized_matrix(tmp_path):
+    """La prima costruzione calcola gli embedding una volta e li salva in .npy"""
+    encoder = BagOfWordsEncoder()
+    index = KnowledgeIndex(encoder, 'stub', _knowledge_base(), cache_dir=str(tmp_path))
+
+    assert index.matrix.shape == (len(index.entries), 64)
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1)
+    assert len(encoder.encoded) == len(index.entries)
+    assert len(list(tmp_path.glob('knowledge_*.npy'))) == 1
+
+def test_reload_uses_memory_mapped_cache(tmp_path):
+    """Un nuovo indice con gli stessi contenuti legge la cache senza ricalcolare gli embedding"""
+    first = KnowledgeIndex(BagOfWordsEncoder(), 'stub', _knowledge_base(), cache_dir=str(tmp_path))
+    encoder = BagOfWordsEncoder()
+    second = KnowledgeIndex(encoder, 'stub', _knowledge_base(), cache_dir=str(tmp_path))
+
+    assert encoder.encoded == []
+    assert isinstance(second.matrix, np.memmap)
+    assert np.array_equal(np.asarray(second.matrix), first.matrix)
+
+def test_search_returns_top_k_by_decreasing_score(tmp_path):
+    """Le k voci più simili in ordine decrescente, la più pertinente per prima"""
+    knowledge_base = _knowledge_base()
+    index = KnowledgeIndex(BagOfWordsEncoder(), 'stub', knowledge_base, cache_dir=str(tmp_path))
+
+    matches = index.search('Tecniche vincenti: ascolto attivo e gestione obiezioni', k=3, min_score=0)
+
+    assert len(matches) == 3
+    assert matches[0][1] == knowledge_base['domain_knowledge']['sales']
+    scores = [score for score, _ in matches]
+    assert scores == sorted(scores, reverse=True)
+    assert index.search('parole assenti xyz', k=3, min_score=0.99) == []
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test degli eventi real-time di appuntamenti e follow-up (payload e stanze)
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import db
+from models.appointment import Appointment
+from models.consultant import Consultant, Position
+from models.followup import FollowUp, FOLLOWUP_WINDOWS, bulk_schedule_followups, schedule_followups
+import services.realtime_service as realtime_service
+
+class RecordingSocketIO:
+    """SocketIO che registra gli eventi invece di inviarli"""
+
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, event_name, payload, to=None):
+        self.emitted.append((event_name, payload, to))
+
+    def events(self, event_name):
+        return [(payload, room) for name, payload, room in self.emitted if name == event_name]
+
+@pytest.fixture
+def socketio(monkeypatch):
+    recorder = RecordingSocketIO()
+    monkeypatch.setattr(realtime_service, '_socketio', recorder)
+    return recorder
+
+@pytest.fixture
+def app(socketio, make_app):
+    """Applicazione minima, creata dopo aver collegato il SocketIO di registrazione"""
+    return make_app()
+
+@pytest.fixture
+def consultants(app):
+    position = Position(nome='Consulente')
+    mario, giulia = Consultant(nome='Mario', posizione=position), Consultant(nome='Giulia', posizione=position)
+    db.session.add_all([mario, giulia])
+    db.session.commit()
+    return mario, giulia
+
+def _appointment(consultant) -> Appointment:
+    appointment = Appointment(
+        nome_cliente='Luca Verdi',
+        numero_telefono='3331234567',
+        data_appuntamento=datetime(2025, 1, 1, 9, 0),
+        tipologia='Vendita',
+        stato='Confermato'
+    )
+    appointment.consultants.append(consultant)
+    db.session.add(appointment)
+    db.session.commit()
+    return appointment
+
+def test_created_appointment_carries_row_data(consultants, socketio):
+    """L'evento contiene i dati della riga e il delta dei contatori"""
+    mario, _ = consultants
+    _appointment(mario)
+
+    events = socketio.events('appointment_changed')
+    assert len(events) == 1
+    payload, rooms = events[0]
+    assert rooms == ['role:admin', f'consultant:{mario.id}']
+    assert payload['action'] == 'created'
+    assert payload['consultants'] == ['Mario']
+    assert payload['tipologia'] == 'Vendita'
+    assert payload['delta'] == {'appointments': 1, 'sold': 0}
+
+def test_reassignment_lists_added_and_removed_consultants(consultants, socketio):
+    """Una riassegnazione indica chi riceve e chi perde l'appuntamento"""
+    mario, giulia = consultants
+    appointment = _appointment(mario)
+    socketio.emitted.clear()
+
+    appointment.consultants = [giulia]
+    db.session.commit()
+
+    payload, _ = socketio.events('appointment_changed')[0]
+    assert payload['added_consultant_ids'] == [giulia.id]
+    assert payload['removed_consultant_ids'] == [mario.id]
+    assert payload['consultants'] == ['Giulia']
+
+def test_followup_carries_client(consultants, socketio):
+    """Il follow-up riporta il cliente dell'appuntamento"""
+    mario, _ = consultants
+    appointment = _appointment(mario)
+    socketio.emitted.clear()
+
+    db.session.add(FollowUp(appointment_id=appointment.id, numero=1, data_prevista=datetime(2025, 1, 8)))
+    db.session.commit()
+
+    payload, _ = socketio.events('followup_changed')[0]
+    assert payload['nome_cliente'] == 'Luca Verdi'
+    assert payload['numero_telefono'] == '3331234567'
+
+def test_bulk_scheduled_followups_are_announced(consultants, socketio):
+    """I follow-up pianificati in blocco (INSERT senza oggetti ORM) generano eventi 'created'"""
+    mario, _ = consultants
+    appointment = _appointment(mario)
+    appointment.venduto = True
+    db.session.commit()
+    socketio.emitted.clear()
+
+    schedule_followups(appointment)
+
+    events = socketio.events('followup_changed')
+    ids = {followup.id for followup in FollowUp.query.all()}
+    assert len(events) == len(FOLLOWUP_WINDOWS) == len(ids)
+    assert {payload['id'] for payload, _ in events} == ids
+    payload, rooms = events[0]
+    assert payload['action'] == 'created'
+    assert payload['nome_cliente'] == 'Luca Verdi'
+    assert rooms == ['role:admin', f'consultant:{mario.id}']
+
+def test_rolled_back_bulk_followups_are_not_announced(consultants, socketio):
+    """Nessun evento per i follow-up di una transazione annullata"""
+    mario, _ = consultants
+    appointment = _appointment(mario)
+    appointment.venduto = True
+    db.session.commit()
+    socketio.emitted.clear()
+
+    bulk_schedule_followups([appointment])
+    db.session.rollback()
+    db.session.commit()
+
+    assert socketio.events('followup_changed') == []
+
+def test_savepoint_waits_for_outer_commit(consultants, socketio):
+    """Gli eventi di un savepoint partono al commit della transazione esterna"""
+    mario, _ = consultants
+    appointment = _appointment(mario)
+    socketio.emitted.clear()
+
+    savepoint = db.session.begin_nested()
+    appointment.venduto = True
+    savepoint.commit()
+    assert socketio.events('appointment_changed') == []
+
+    db.session.commit()
+    assert socketio.events('appointment_changed')[0][0]['delta'] == {'appointments': 0, 'sold': 1}
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test della ricerca appuntamenti (indice full-text FTS5 e ricerca per sottostringa)
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import db
+from models.appointment import Appointment
+from models.search import build_match_query
+from models.client import Client
+from services.appointment_service import AppointmentService
+from services.client_service import ClientService
+
+@pytest.fixture
+def app(make_app):
+    """Applicazione minima con database SQLite in memoria e indici full-text"""
+    return make_app(search=True)
+
+def _appointments(count: int, nome: str = 'Giovanni Rossi', telefono: str = '3331234567') -> None:
+    base = datetime(2025, 1, 1, 9, 0)
+    for i in range(count):
+        db.session.add(Appointment(
+            nome_cliente=nome,
+            numero_telefono=telefono,
+            data_appuntamento=base + timedelta(hours=i),
+            tipologia='Vendita',
+            stato='Confermato'
+        ))
+    db.session.commit()
+
+def test_match_query_prefixes_every_term():
+    """Ogni termine è cercato per prefisso, anche se più lungo dei prefissi pre-indicizzati"""
+    assert build_match_query('Giovann Rossi') == '"Giovann"* "Rossi"*'
+
+def test_long_finished_term_is_prefix_matched(app):
+    """'Giovann Rossi' trova 'Giovanni Rossi'"""
+    _appointments(1)
+
+    results = AppointmentService.search_appointments('Giovann Rossi')
+
+    assert [a.nome_cliente for a in results] == ['Giovanni Rossi']
+
+@pytest.mark.parametrize('query', ['1234567', '4567', 'G'])
+def test_phone_infix_and_short_queries_use_substring_search(app, query):
+    """Parti interne del telefono e query di un carattere trovano come la ricerca per sottostringa"""
+    _appointments(1, telefono='333 1234567')
+
+    assert len(AppointmentService.search_appointments(query)) == 1
+
+def test_limit_is_not_capped(app):
+    """Il limite richiesto non viene ridotto al massimo della ricerca type-ahead"""
+    _appointments(60)
+
+    assert len(AppointmentService.search_appointments('Rossi', limit=60)) == 60
+
+@pytest.mark.parametrize('query', ['4567', '123 4567', '+39 333'])
+def test_client_phone_tail_and_infix(app, query):
+    """Le ricerche clienti per numero trovano anche fine e parti interne del telefono"""
+    db.session.add(Client(nome='Giovanni Rossi', numero_telefono='333 1234567'))
+    db.session.commit()
+
+    assert [c.nome for c in ClientService.search_clients(query)] == ['Giovanni Rossi']
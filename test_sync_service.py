@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Test della sincronizzazione incrementale per la dashboard mobile (token, tracce, sincronizzazione completa)
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from flask_login import LoginManager
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import db, User
+from models.appointment import Appointment
+from models.consultant import Consultant, Position
+from models.sync import SyncTombstone
+from services.sync_service import SyncService, SYNC_OVERLAP_SECONDS, TOMBSTONE_TTL_DAYS
+
+@pytest.fixture
+def app(make_app):
+    """Applicazione minima con il blueprint dealer e il login, su file (richieste dal client di test)"""
+    from routes.dealer import bp as dealer_bp
+
+    app = make_app(file_db=True, SECRET_KEY='test', TESTING=True)
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(dealer_bp, url_prefix='/dealer')
+    return app
+
+@pytest.fixture
+def consultants(app):
+    position = Position(nome='Consulente')
+    mario, giulia = Consultant(nome='Mario', posizione=position), Consultant(nome='Giulia', posizione=position)
+    db.session.add_all([mario, giulia])
+    db.session.commit()
+    return mario, giulia
+
+def _appointment(*consultants, nome: str = 'Luca Verdi') -> Appointment:
+    appointment = Appointment(
+        nome_cliente=nome,
+        numero_telefono='3331234567',
+        data_appuntamento=datetime(2025, 1, 1, 9, 0),
+        tipologia='Vendita',
+        stato='Confermato'
+    )
+    appointment.consultants.extend(consultants)
+    db.session.add(appointment)
+    db.session.commit()
+    return appointment
+
+def _backdate(appointment: Appointment, when: datetime) -> None:
+    """Sposta updated_at nel passato senza passare dal tracciamento della sessione"""
+    db.session.execute(db.update(Appointment).where(Appointment.id == appointment.id).values(updated_at=when))
+    db.session.commit()
+
+def _client(app, consultant):
+    user = User(username=consultant.nome.lower(), email=f'{consultant.nome.lower()}@example.com',
+                password_hash='x', consultant_id=consultant.id)
+    db.session.add(user)
+    db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+    return client
+
+def test_token_round_trip(consultants):
+    """Il token restituisce l'istante e il consulente con cui è stato creato"""
+    mario, _ = consultants
+    watermark = datetime(2025, 3, 1, 10, 30, 15)
+    token = SyncService.encode_token(watermark, mario.id)
+
+    assert SyncService.decode_token(token, mario.id) == watermark
+    assert SyncService.decode_token(None, mario.id) is None
+
+def test_token_of_another_consultant_is_rejected(app, consultants):
+    """Un token di un altro consulente (o malformato) non è accettato, né dal servizio né dall'API"""
+    mario, giulia = consultants
+    token = SyncService.encode_token(datetime.utcnow(), giulia.id)
+
+    with pytest.raises(ValueError):
+        SyncService.decode_token(token, mario.id)
+    with pytest.raises(ValueError):
+        SyncService.decode_token('non-un-token', mario.id)
+
+    response = _client(app, mario).get('/dealer/api/sync', query_string={'since': token})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_incremental_sync_returns_only_changes_after_token(app, consultants):
+    """La prima sincronizzazione è completa, la successiva riceve solo le righe modificate dopo il token"""
+    mario, giulia = consultants
+    old = _appointment(mario, nome='Vecchio')
+    _appointment(giulia, nome='Di Giulia')
+    _backdate(old, datetime.utcnow() - timedelta(hours=1))
+
+    client = _client(app, mario)
+    first = client.get('/dealer/api/sync').get_json()
+    assert first['full'] is True
+    assert [a['nome_cliente'] for a in first['appointments']] == ['Vecchio']
+
+    # Il token cade SYNC_OVERLAP_SECONDS prima dell'istante del server
+    since = SyncService.decode_token(first['token'], mario.id)
+    assert since == datetime.fromisoformat(first['server_time']) - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+
+    _appointment(mario, nome='Nuovo')
+    second = client.get('/dealer/api/sync', query_string={'since': first['token']}).get_json()
+    assert second['full'] is False
+    assert [a['nome_cliente'] for a in second['appointments']] == ['Nuovo']
+
+def test_deleted_appointment_leaves_tombstone_for_everyone(consultants):
+    """L'eliminazione lascia una traccia senza consulente, ricevuta da tutti"""
+    mario, giulia = consultants
+    appointment = _appointment(mario, giulia)
+    appointment_id = appointment.id
+    since = datetime.utcnow() - timedelta(minutes=5)
+
+    db.session.delete(appointment)
+    db.session.commit()
+
+    tombstone = SyncTombstone.query.one()
+    assert (tombstone.table_name, tombstone.row_id, tombstone.consultant_id) == ('appointment', appointment_id, None)
+    for consultant in consultants:
+        deleted = SyncService.changes(consultant.id, None, since)['deleted']
+        assert [(d['table'], d['id']) for d in deleted] == [('appointment', appointment_id)]
+
+def test_unassigned_appointment_leaves_tombstone_for_removed_consultant(consultants):
+    """La rimozione di un consulente lascia la traccia solo a lui; chi resta riceve l'appuntamento aggiornato"""
+    mario, giulia = consultants
+    appointment = _appointment(mario, giulia)
+    since = datetime.utcnow() - timedelta(minutes=5)
+
+    appointment.consultants.remove(giulia)
+    db.session.commit()
+
+    tombstone = SyncTombstone.query.one()
+    assert tombstone.consultant_id == giulia.id
+
+    removed = SyncService.changes(giulia.id, None, since)
+    assert [(d['table'], d['id']) for d in removed['deleted']] == [('appointment', appointment.id)]
+    assert removed['appointments'] == []
+
+    kept = SyncService.changes(mario.id, None, since)
+    assert kept['deleted'] == []
+    assert [a['id'] for a in kept['appointments']] == [appointment.id]
+
+def test_token_older_than_tombstone_ttl_forces_full_sync(consultants):
+    """Oltre TOMBSTONE_TTL_DAYS le tracce possono essere state eliminate: sincronizzazione completa"""
+    mario, _ = consultants
+    appointment = _appointment(mario)
+    _backdate(appointment, datetime.utcnow() - timedelta(days=TOMBSTONE_TTL_DAYS + 10))
+    deleted = _appointment(mario, nome='Eliminato')
+    db.session.delete(deleted)
+    db.session.commit()
+
+    recent = SyncService.changes(mario.id, None, datetime.utcnow() - timedelta(days=TOMBSTONE_TTL_DAYS - 1))
+    assert recent['full'] is False
+    assert recent['appointments'] == []
+    assert len(recent['deleted']) == 1
+
+    expired = SyncService.changes(mario.id, None, datetime.utcnow() - timedelta(days=TOMBSTONE_TTL_DAYS + 1))
+    assert expired['full'] is True
+    assert expired['deleted'] == []
+    assert [a['id'] for a in expired['appointments']] == [appointment.id]
+
+def test_purge_keeps_tombstones_within_ttl(consultants):
+    """La pulizia rifiuta conservazioni inferiori al TTL ed elimina solo le tracce scadute"""
+    now = datetime.utcnow()
+    db.session.add_all([
+        SyncTombstone(table_name='appointment', row_id=1, deleted_at=now - timedelta(days=TOMBSTONE_TTL_DAYS + 1)),
+        SyncTombstone(table_name='appointment', row_id=2, deleted_at=now - timedelta(days=TOMBSTONE_TTL_DAYS - 1))
+    ])
+    db.session.commit()
+
+    with pytest.raises(ValueError):
+        SyncService.purge_expired_tombstones(TOMBSTONE_TTL_DAYS - 1)
+    assert SyncTombstone.query.count() == 2
+
+    assert SyncService.purge_expired_tombstones() == 1
+    assert [t.row_id for t in SyncTombstone.query.all()] == [2]
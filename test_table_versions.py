@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test delle versioni per tabella (ETag, cache e chiavi della cache AI)
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.user import db
+from models.appointment import Appointment
+from models.client import Client
+from models.table_version import get_table_versions, on_tables_committed, _commit_listeners
+
+@pytest.fixture
+def app(make_app):
+    """Applicazione minima con database SQLite in memoria e tabella delle versioni"""
+    return make_app(table_versions=True)
+
+def _appointment(**values) -> Appointment:
+    appointment = Appointment(
+        nome_cliente='Mario Rossi',
+        numero_telefono='+393331234567',
+        data_appuntamento=datetime(2025, 1, 1, 9, 0),
+        tipologia='Vendita',
+        stato='Confermato',
+        **values
+    )
+    db.session.add(appointment)
+    return appointment
+
+def test_purchase_flag_update_bumps_client(app):
+    """Vendere un appuntamento aggiorna has_purchases e quindi la versione di client"""
+    client = Client(nome='Mario Rossi', numero_telefono='+393331234567')
+    db.session.add(client)
+    db.session.commit()
+    appointment = _appointment()
+    db.session.commit()
+    before = get_table_versions({'client'})['client']
+
+    appointment.venduto = True
+    db.session.commit()
+
+    assert client.has_purchases is True
+    assert get_table_versions({'client'})['client'] == before + 1
+
+def test_new_client_linking_bumps_appointment(app):
+    """Un nuovo cliente che collega appuntamenti esistenti incrementa la versione di appointment"""
+    appointment = _appointment()
+    db.session.commit()
+    before = get_table_versions({'appointment'})['appointment']
+
+    db.session.add(Client(nome='Mario Rossi', numero_telefono='+393331234567'))
+    db.session.commit()
+
+    assert appointment.client_id is not None
+    assert get_table_versions({'appointment'})['appointment'] == before + 1
+
+def test_versions_bumped_once_per_transaction(app):
+    """Più flush nella stessa transazione incrementano la versione una sola volta"""
+    before = get_table_versions({'appointment'})['appointment']
+
+    for _ in range(3):
+        _appointment()
+        db.session.flush()
+    db.session.commit()
+
+    assert get_table_versions({'appointment'})['appointment'] == before + 1
+
+def test_savepoint_commit_notifies_on_outer_commit(app):
+    """Le tabelle scritte in un savepoint vengono notificate solo al commit esterno"""
+    notified = []
+    listener = on_tables_committed(notified.append)
+    try:
+        savepoint = db.session.begin_nested()
+        _appointment()
+        savepoint.commit()
+        assert notified == []
+
+        db.session.commit()
+        assert 'appointment' in notified[0]
+    finally:
+        _commit_listeners.remove(listener)
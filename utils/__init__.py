@@ -2,6 +2,7 @@
 Utilities e helper functions per l'applicazione
 """
 
+import base64
 import hashlib
 import secrets
 import string
@@ -148,6 +149,24 @@ class DateUtils:
         monday = date - timedelta(days=days_since_monday)
         sunday = monday + timedelta(days=6)
         return monday, sunday
+    
+    @staticmethod
+    def day_range(day) -> tuple:
+        """Intervallo semiaperto [inizio giorno, inizio giorno successivo)"""
+        start = datetime(day.year, day.month, day.day)
+        return start, start + timedelta(days=1)
+    
+    @staticmethod
+    def month_range(year: int, month: int) -> tuple:
+        """Intervallo semiaperto [primo del mese, primo del mese successivo)"""
+        start = datetime(year, month, 1)
+        end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+        return start, end
+    
+    @staticmethod
+    def range_filter(column, start: datetime, end: datetime) -> tuple:
+        """Condizioni sargabili column >= start AND column < end (usano l'indice sulla colonna)"""
+        return column >= start, column < end
 
 class StringUtils:
     """Utilities per manipolazione stringhe"""
@@ -227,6 +246,29 @@ class PaginationHelper:
             'next_num': self.page + 1 if self.has_next else None
         }
 
+class CursorPaginationHelper:
+    """Helper per paginazione keyset (cursore opaco su data + id)"""
+
+    @staticmethod
+    def encode(sort_value: datetime, row_id: int) -> str:
+        """Codifica la posizione dell'ultima riga in un cursore opaco"""
+        raw = f"{sort_value.isoformat()}|{row_id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode(cursor: Optional[str]) -> Optional[tuple]:
+        """Decodifica un cursore in (datetime, id), solleva ValueError se non valido"""
+        if not cursor:
+            return None
+
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+            sort_value, row_id = raw.rsplit('|', 1)
+            return datetime.fromisoformat(sort_value), int(row_id)
+        except (ValueError, UnicodeError):
+            raise ValueError("Cursore di paginazione non valido")
+
 class FlashMessageHelper:
     """Helper per messaggi flash categorizzati"""
     
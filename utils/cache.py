@@ -0,0 +1,197 @@
+"""
+Cache con TTL per statistiche e dashboard, invalidata al commit dei modelli collegati
+
+Backend configurabili con CACHE_BACKEND:
+- 'memory' (default): LRU in memoria del singolo processo
+- 'sqlite': file SQLite condiviso tra più worker (CACHE_SQLITE_PATH)
+- 'null': cache disattivata
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from models.table_version import on_tables_committed
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 1024
+
+# Namespace in cache → tabelle da cui dipendono i valori
+CACHE_DEPENDENCIES = {
+    'counts': {'appointment', 'consultant', 'client', 'user'},
+    'dashboard': {'appointment', 'appointment_consultant', 'consultant', 'client', 'user'},
+    'ai_context': {'appointment', 'appointment_consultant', 'consultant', 'client'},
+}
+
+def _namespace(key: str) -> str:
+    """Namespace di una chiave 'namespace:resto'"""
+    return key.split(':', 1)[0]
+
+class MemoryCache:
+    """LRU in memoria con scadenza per voce (valido per un solo processo)"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str):
+        """(trovato, valore serializzato)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return False, None
+
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, namespaces) -> None:
+        with self._lock:
+            for key in [k for k in self._data if _namespace(k) in namespaces]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+class SQLiteCache:
+    """Cache condivisa tra processi in un file SQLite (una connessione per operazione)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_namespace ON cache (namespace)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return False, None
+        return True, row[0]
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache (key, namespace, value, expires_at) VALUES (?, ?, ?, ?)",
+                         (key, _namespace(key), value, time.time() + ttl))
+            # Pulizia opportunistica delle voci scadute
+            conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def invalidate(self, namespaces) -> None:
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM cache WHERE namespace = ?", [(ns,) for ns in namespaces])
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache")
+
+class NullCache:
+    """Cache disattivata"""
+
+    def get(self, key):
+        return False, None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def invalidate(self, namespaces):
+        pass
+
+    def clear(self):
+        pass
+
+# Cache usata fuori da un'applicazione inizializzata con init_cache
+_fallback_cache = MemoryCache()
+
+def init_cache(app) -> None:
+    """Crea il backend di cache configurato per l'applicazione"""
+    backend = app.config.get('CACHE_BACKEND', 'memory')
+
+    if backend == 'sqlite':
+        path = app.config.get('CACHE_SQLITE_PATH') or os.path.join(app.instance_path, 'cache.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cache = SQLiteCache(path)
+    elif backend == 'null':
+        cache = NullCache()
+    else:
+        cache = MemoryCache(app.config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+
+    app.extensions['stats_cache'] = cache
+
+def get_cache():
+    """Backend di cache dell'applicazione corrente"""
+    if has_app_context():
+        return current_app.extensions.get('stats_cache', _fallback_cache)
+    return _fallback_cache
+
+def cached(namespace: str, key, producer, ttl: int = None):
+    """Valore in cache per (namespace, key), calcolato con producer() se assente o scaduto
+
+    I valori devono essere serializzabili in JSON; ogni lettura ritorna una copia.
+    """
+    if namespace not in CACHE_DEPENDENCIES:
+        raise ValueError(f"Namespace di cache sconosciuto: {namespace}")
+
+    cache = get_cache()
+    full_key = f'{namespace}:{key}'
+
+    try:
+        found, payload = cache.get(full_key)
+        if found:
+            return json.loads(payload)
+    except Exception as e:
+        logger.warning(f"Lettura cache {full_key} fallita: {e}")
+
+    value = producer()
+
+    if ttl is None:
+        ttl = current_app.config.get('CACHE_DEFAULT_TTL', DEFAULT_TTL) if has_app_context() else DEFAULT_TTL
+    try:
+        cache.set(full_key, json.dumps(value), ttl)
+    except Exception as e:
+        logger.warning(f"Scrittura cache {full_key} fallita: {e}")
+
+    return value
+
+def invalidate(*namespaces) -> None:
+    """Invalida tutte le voci dei namespace indicati"""
+    if namespaces:
+        get_cache().invalidate(set(namespaces))
+
+def invalidate_tables(tables) -> None:
+    """Invalida i namespace che dipendono dalle tabelle indicate"""
+    tables = set(tables)
+    invalidate(*[ns for ns, deps in CACHE_DEPENDENCIES.items() if deps & tables])
+
+# Invalidazione al commit delle transazioni che scrivono le tabelle collegate
+on_tables_committed(invalidate_tables)
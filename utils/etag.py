@@ -0,0 +1,55 @@
+"""
+GET condizionali (ETag / 304 Not Modified) per le API JSON
+
+L'ETag di una risorsa deriva dalle versioni delle tabelle da cui dipende (tabella table_version),
+dall'utente e dalla query string: se il client ha già la versione corrente la vista non viene eseguita.
+"""
+
+import hashlib
+from functools import wraps
+from flask import request, make_response
+from flask_login import current_user
+from models.table_version import get_table_versions
+
+# Risorsa → tabelle i cui cambiamenti modificano la risposta
+RESOURCE_TABLES = {
+    'appointments': {'appointment', 'appointment_consultant'},
+    'consultants': {'consultant', 'position', 'appointment', 'appointment_consultant'},
+    'clients': {'client', 'appointment', 'other_appointment'},
+    'dashboard': {'appointment', 'appointment_consultant', 'consultant', 'client', 'user'},
+}
+
+def resource_etag(resource: str) -> str:
+    """ETag della risorsa per l'utente e la richiesta correnti"""
+    if resource not in RESOURCE_TABLES:
+        raise ValueError(f"Risorsa sconosciuta: {resource}")
+
+    versions = get_table_versions(RESOURCE_TABLES[resource])
+    user = f'{current_user.id}:{current_user.role}' if current_user.is_authenticated else 'anon'
+    parts = [resource, user, request.full_path, request.headers.get('Accept', '')]
+    parts.extend(f'{table}={version}' for table, version in sorted(versions.items()))
+
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+def conditional_get(resource: str):
+    """Decorator: risponde 304 se If-None-Match coincide con l'ETag corrente, altrimenti lo imposta"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET':
+                return f(*args, **kwargs)
+
+            etag = resource_etag(resource)
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator